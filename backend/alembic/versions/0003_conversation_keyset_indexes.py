@@ -0,0 +1,22 @@
+"""add keyset pagination indexes to conversations
+
+Revision ID: 0003_keyset_indexes
+Revises: 0002_add_fields
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0003_keyset_indexes'
+down_revision = '0002_add_fields'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # /api/conversations pages on (created_at, id) descending, optionally per user
+    op.create_index('ix_conversations_created_at_id', 'conversations', ['created_at', 'id'])
+    op.create_index('ix_conversations_user_id_created_at_id', 'conversations', ['user_id', 'created_at', 'id'])
+
+def downgrade():
+    op.drop_index('ix_conversations_user_id_created_at_id', table_name='conversations')
+    op.drop_index('ix_conversations_created_at_id', table_name='conversations')
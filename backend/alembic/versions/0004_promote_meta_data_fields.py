@@ -0,0 +1,106 @@
+"""promote crop, language, disease and gps from meta_data to typed columns
+
+Revision ID: 0004_promote_meta_fields
+Revises: 0003_keyset_indexes
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_promote_meta_fields'
+down_revision = '0003_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+LANGUAGE_MAX_LENGTH = 8  # conversations.language is varchar(8)
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def _normalized(value, max_length=None):
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip().lower()
+    # Longer values are not language codes; truncating would invent one
+    return value if max_length is None or len(value) <= max_length else None
+
+def _backfill_generic(bind):
+    # Dialect-agnostic fallback (e.g. SQLite): parse meta_data in Python, in batches
+    conversations = sa.table(
+        'conversations',
+        sa.column('id', sa.Integer), sa.column('meta_data', sa.JSON),
+        sa.column('crop', sa.String), sa.column('language', sa.String),
+        sa.column('disease', sa.String), sa.column('lat', sa.Float), sa.column('lon', sa.Float),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(conversations.c.id, conversations.c.meta_data)
+            .where(conversations.c.id > last_id)
+            .order_by(conversations.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, meta in rows:
+            # meta_data is free-form JSON: any level may be a list, string or number
+            meta = meta if isinstance(meta, dict) else {}
+            gps = meta.get('gps') if isinstance(meta.get('gps'), dict) else {}
+            vision = meta.get('vision_result') if isinstance(meta.get('vision_result'), dict) else {}
+            disease = vision.get('disease')
+            bind.execute(
+                conversations.update().where(conversations.c.id == row_id).values(
+                    crop=_normalized(meta.get('crop')),
+                    language=_normalized(meta.get('language'), LANGUAGE_MAX_LENGTH),
+                    disease=disease if isinstance(disease, str) else None,
+                    lat=_to_float(gps.get('lat')),
+                    lon=_to_float(gps.get('lon')),
+                )
+            )
+        last_id = rows[-1][0]
+
+def upgrade():
+    op.add_column('conversations', sa.Column('crop', sa.String(), nullable=True))
+    op.add_column('conversations', sa.Column('language', sa.String(length=8), nullable=True))
+    op.add_column('conversations', sa.Column('disease', sa.String(), nullable=True))
+    op.add_column('conversations', sa.Column('lat', sa.Float(), nullable=True))
+    op.add_column('conversations', sa.Column('lon', sa.Float(), nullable=True))
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # meta_data is plain JSON, so ->> works without a JSONB cast (and yields NULL
+        # where a level is not an object). Languages longer than varchar(8) are dropped.
+        op.execute("""
+            UPDATE conversations SET
+                crop = NULLIF(lower(btrim(meta_data->>'crop')), ''),
+                language = CASE WHEN length(btrim(meta_data->>'language')) BETWEEN 1 AND 8
+                                THEN lower(btrim(meta_data->>'language')) END,
+                disease = meta_data->'vision_result'->>'disease',
+                lat = CASE WHEN meta_data->'gps'->>'lat' ~ '^-?[0-9]+([.][0-9]+)?$'
+                           THEN (meta_data->'gps'->>'lat')::double precision END,
+                lon = CASE WHEN meta_data->'gps'->>'lon' ~ '^-?[0-9]+([.][0-9]+)?$'
+                           THEN (meta_data->'gps'->>'lon')::double precision END
+            WHERE meta_data IS NOT NULL
+        """)
+    else:
+        _backfill_generic(bind)
+
+    # Trailing (created_at, id) keeps these usable for keyset pagination in /api/conversations
+    op.create_index('ix_conversations_crop_language_created_at', 'conversations', ['crop', 'language', 'created_at', 'id'])
+    op.create_index('ix_conversations_language_created_at', 'conversations', ['language', 'created_at', 'id'])
+    op.create_index('ix_conversations_disease_created_at', 'conversations', ['disease', 'created_at', 'id'])
+
+def downgrade():
+    op.drop_index('ix_conversations_disease_created_at', table_name='conversations')
+    op.drop_index('ix_conversations_language_created_at', table_name='conversations')
+    op.drop_index('ix_conversations_crop_language_created_at', table_name='conversations')
+    op.drop_column('conversations', 'lon')
+    op.drop_column('conversations', 'lat')
+    op.drop_column('conversations', 'disease')
+    op.drop_column('conversations', 'language')
+    op.drop_column('conversations', 'crop')
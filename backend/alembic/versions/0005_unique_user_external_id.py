@@ -0,0 +1,36 @@
+"""make users.external_id unique
+
+Revision ID: 0005_unique_external_id
+Revises: 0004_promote_meta_fields
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0005_unique_external_id'
+down_revision = '0004_promote_meta_fields'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # 0001 never created the unique index declared on the model, so concurrent first
+    # requests may have created duplicate users. Keep the oldest row per external_id.
+    op.execute("""
+        UPDATE conversations SET user_id = (
+            SELECT MIN(keep.id) FROM users dup JOIN users keep ON keep.external_id = dup.external_id
+            WHERE dup.id = conversations.user_id
+        )
+        WHERE user_id IN (
+            SELECT u.id FROM users u
+            WHERE u.id > (SELECT MIN(k.id) FROM users k WHERE k.external_id = u.external_id)
+        )
+    """)
+    op.execute("""
+        DELETE FROM users
+        WHERE id > (SELECT MIN(k.id) FROM users k WHERE k.external_id = users.external_id)
+    """)
+    # Required by the INSERT ... ON CONFLICT (external_id) upsert in app/users.py
+    op.create_index('ix_users_external_id', 'users', ['external_id'], unique=True)
+
+def downgrade():
+    op.drop_index('ix_users_external_id', table_name='users')
@@ -0,0 +1,219 @@
+"""
+Admission control for pipeline requests.
+
+/api/upload_audio, /api/upload_image and /api/chat each run the full LangGraph
+pipeline (STT, LLM, vision, TTS). Accepting every request during a burst makes
+all of them slow until clients time out, which wastes the LLM work already spent
+on them. The controller lets ADMISSION_MAX_CONCURRENT runs execute per worker
+and up to ADMISSION_MAX_QUEUE wait for a slot. It keeps an EWMA of run
+duration, and the estimated wait for a new request is
+(waiting + 1) * avg_run_seconds / ADMISSION_MAX_CONCURRENT. A request is
+rejected right away with 503 and Retry-After when:
+
+- the queue is full, or
+- the estimated wait exceeds ADMISSION_MAX_WAIT, or
+- it does not get a slot within ADMISSION_MAX_WAIT.
+
+Once ADMISSION_DEGRADE_AT runs are running or waiting, newly admitted runs are
+degraded: weather lookup and TTS are skipped, so the text reply comes back
+sooner.
+
+admission_middleware admits pipeline requests before their body is parsed or
+any dependency (database session, replica check) runs, so a rejected request
+costs next to nothing; endpoints read the granted `Admission` through
+`Depends(admit)`. Counters (rejection rate, goodput within
+ADMISSION_SLO_SECONDS) are at GET /metrics.
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+load_dotenv()
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 16))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 32))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 20))  # seconds a request may queue
+ADMISSION_DEGRADE_AT = int(os.getenv("ADMISSION_DEGRADE_AT", 12))  # running + waiting
+ADMISSION_SLO_SECONDS = float(os.getenv("ADMISSION_SLO_SECONDS", 30))  # "good" response time
+ADMISSION_INITIAL_ESTIMATE = float(os.getenv("ADMISSION_INITIAL_ESTIMATE", 8))  # s per run before any finished
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", 60))
+EWMA_ALPHA = 0.2
+# Endpoints that run the LangGraph pipeline
+PIPELINE_PATHS = {"/api/upload_audio", "/api/upload_image", "/api/chat"}
+
+
+class Overloaded(Exception):
+    """Request rejected by admission control; sent as 503 with Retry-After."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server overloaded ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Admission:
+    """One admitted pipeline run."""
+    __slots__ = ("degraded", "started", "queued_seconds")
+
+    def __init__(self, degraded: bool, started: float, queued_seconds: float):
+        self.degraded = degraded
+        self.started = started
+        self.queued_seconds = queued_seconds
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = ADMISSION_MAX_CONCURRENT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        degrade_at: int = ADMISSION_DEGRADE_AT,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.degrade_at = degrade_at
+        self.avg_run_seconds = ADMISSION_INITIAL_ESTIMATE
+        self.running = 0
+        self.waiting = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.stats = {
+            "admitted": 0,
+            "degraded": 0,
+            "rejected_queue_full": 0,
+            "rejected_wait": 0,
+            "rejected_timeout": 0,
+            "completed": 0,
+            "completed_within_slo": 0,
+        }
+
+    def estimated_wait(self) -> float:
+        """Seconds a request arriving now would wait for a slot."""
+        if self.running < self.max_concurrent and not self.waiting:
+            return 0.0
+        return (self.waiting + 1) * self.avg_run_seconds / self.max_concurrent
+
+    def _retry_after(self) -> int:
+        # Time for the current backlog to drain
+        backlog = (self.running + self.waiting) * self.avg_run_seconds / self.max_concurrent
+        return max(1, min(ADMISSION_RETRY_AFTER_MAX, math.ceil(backlog)))
+
+    def _reject(self, reason: str):
+        self.stats[f"rejected_{reason}"] += 1
+        raise Overloaded(reason, self._retry_after())
+
+    async def acquire(self) -> Admission:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        arrived = time.monotonic()
+        degraded = self.running + self.waiting + 1 > self.degrade_at
+        if not self._slots.locked():
+            # A free slot is taken without suspending
+            await self._slots.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self._reject("queue_full")
+            if self.estimated_wait() > self.max_wait:
+                self._reject("wait")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self._reject("timeout")
+            finally:
+                self.waiting -= 1
+        self.running += 1
+        self.stats["admitted"] += 1
+        self.stats["degraded"] += degraded
+        now = time.monotonic()
+        return Admission(degraded, now, now - arrived)
+
+    def release(self, admission: Admission):
+        self.running -= 1
+        self._slots.release()
+        run_seconds = time.monotonic() - admission.started
+        self.avg_run_seconds += EWMA_ALPHA * (run_seconds - self.avg_run_seconds)
+        self.stats["completed"] += 1
+        self.stats["completed_within_slo"] += admission.queued_seconds + run_seconds <= ADMISSION_SLO_SECONDS
+
+    def snapshot(self) -> dict:
+        stats = dict(self.stats)
+        rejected = stats["rejected_queue_full"] + stats["rejected_wait"] + stats["rejected_timeout"]
+        offered = stats["admitted"] + rejected
+        return {
+            "enabled": True,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "degrade_at": self.degrade_at,
+            "running": self.running,
+            "waiting": self.waiting,
+            "avg_run_seconds": round(self.avg_run_seconds, 3),
+            "estimated_wait_seconds": round(self.estimated_wait(), 3),
+            **stats,
+            "rejected": rejected,
+            "rejection_rate": round(rejected / offered, 3) if offered else None,
+            # Share of offered requests answered within the SLO
+            "goodput": round(stats["completed_within_slo"] / offered, 3) if offered else None,
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """The per-worker admission controller, or None when disabled"""
+    global _controller
+    if not ADMISSION_ENABLED:
+        return None
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+
+def overloaded_response(exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        {
+            "error": "overloaded",
+            "reply_text": "The service is busy right now. Please try again in a moment.",
+            "retry_after": exc.retry_after,
+        },
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def admission_middleware(request: Request, call_next):
+    """HTTP middleware: hold an admission slot for pipeline requests, rejecting before the body is read."""
+    if request.method != "POST" or request.url.path not in PIPELINE_PATHS:
+        return await call_next(request)
+    controller = get_admission_controller()
+    if controller is None:
+        request.state.admission = Admission(False, time.monotonic(), 0.0)
+        return await call_next(request)
+    try:
+        admission = await controller.acquire()
+    except Overloaded as exc:
+        return overloaded_response(exc)
+    request.state.admission = admission
+    try:
+        return await call_next(request)
+    finally:
+        controller.release(admission)
+
+
+def admit(request: Request) -> Admission:
+    """FastAPI dependency: the Admission granted to this request by admission_middleware."""
+    admission = getattr(request.state, "admission", None)
+    return admission if admission is not None else Admission(False, time.monotonic(), 0.0)
+
+
+def admission_snapshot() -> dict:
+    controller = get_admission_controller()
+    return controller.snapshot() if controller is not None else {"enabled": False}
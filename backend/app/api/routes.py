@@ -1,46 +1,141 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from sqlalchemy.exc import OperationalError
-from app.db import get_db
-from app.models.db_models import Conversation
+from sqlalchemy import select, delete, tuple_
+from app.db import CONNECTION_ERRORS, get_db, get_read_db, execute_read
+from app.models.db_models import Conversation, User
+from app.preload import get_preloader
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+# Columns exposed by /conversations, keyed by their name in the API response.
+# "metadata" maps to Conversation.meta_data (full weather forecasts etc.) and is
+# only read from the database when the caller asks for it in ?fields=.
+CONVERSATION_FIELDS = {
+    "id": Conversation.id,
+    "user_id": Conversation.user_id,
+    "transcript": Conversation.transcript,
+    "confidence": Conversation.confidence,
+    "media_url": Conversation.media_url,
+    "tts_path": Conversation.tts_path,
+    "crop": Conversation.crop,
+    "language": Conversation.language,
+    "disease": Conversation.disease,
+    "lat": Conversation.lat,
+    "lon": Conversation.lon,
+    "metadata": Conversation.meta_data,
+    "created_at": Conversation.created_at,
+}
+DEFAULT_FIELDS = [name for name in CONVERSATION_FIELDS if name != "metadata"]
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _encode_cursor(created_at: datetime, conv_id: int) -> str:
+    """Encode the (created_at, id) keyset position as an opaque URL-safe token."""
+    raw = json.dumps([created_at.isoformat(), conv_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of _encode_cursor. Raises HTTPException(400) on malformed input."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, conv_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(conv_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Resolve the comma-separated ?fields= projection (default: every field but metadata)."""
+    if not fields:
+        return list(DEFAULT_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in CONVERSATION_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
 @router.get("/conversations")
-async def get_conversations(db: AsyncSession = Depends(get_db)):
+async def get_conversations(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    crop: Optional[str] = None,
+    language: Optional[str] = None,
+    disease: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Get all conversations from the database, ordered by created_at descending.
-    Returns conversations with id, user_id, transcript, confidence, and media_url.
+    Get conversations ordered by created_at descending, one page at a time.
+
+    Pagination is keyset-based on (created_at, id): pages hold ?limit= rows
+    (default DEFAULT_PAGE_SIZE); pass the X-Next-Cursor header of the previous
+    page as ?cursor= to get the next one. The header is absent on the last page.
+    Optional filters: user_id (farmer external id), a since/until created_at
+    range, and crop/language/disease, which hit the indexed columns promoted
+    from meta_data rather than the JSON itself.
+    ?fields=id,transcript,... limits the returned fields; only the selected
+    columns are loaded. The large meta_data JSON is skipped unless "metadata"
+    is listed explicitly. Served from the read replica when one is configured.
     Gracefully handles database connection errors.
     """
-    # Check if database connection is available
-    if db is None:
-        print("Database not available - returning empty conversations list")
-        return []
-    
+    selected = _parse_fields(fields)
+    position = _decode_cursor(cursor) if cursor else None
+
     try:
-        result = await db.execute(
-            select(Conversation).order_by(Conversation.created_at.desc())
-        )
-        conversations = result.scalars().all()
-        return [
-            {
-                "id": conv.id,
-                "user_id": conv.user_id,
-                "transcript": conv.transcript,
-                "confidence": conv.confidence,
-                "media_url": conv.media_url,
-                "tts_path": conv.tts_path,
-                "metadata": conv.meta_data,  # Using meta_data from model, but returning as metadata in API
-                "created_at": conv.created_at.isoformat() if conv.created_at else None
-            }
-            for conv in conversations
-        ]
-    except (OperationalError, ConnectionRefusedError, Exception) as e:
+        # id and created_at are always loaded since they make up the cursor
+        load = dict.fromkeys(["id", "created_at", *selected])
+        query = select(*[CONVERSATION_FIELDS[name].label(name) for name in load])
+        if user_id:
+            query = query.where(
+                Conversation.user_id == select(User.id).where(User.external_id == user_id).scalar_subquery()
+            )
+        if since:
+            query = query.where(Conversation.created_at >= since)
+        if until:
+            query = query.where(Conversation.created_at < until)
+        if crop:
+            query = query.where(Conversation.crop == crop.strip().lower())
+        if language:
+            query = query.where(Conversation.language == language.strip().lower())
+        if disease:
+            query = query.where(Conversation.disease == disease)
+        if position:
+            query = query.where(tuple_(Conversation.created_at, Conversation.id) < tuple_(*position))
+        query = query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit + 1)
+
+        rows = (await execute_read(db, query)).mappings().all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            if last["created_at"] is not None:
+                response.headers["X-Next-Cursor"] = _encode_cursor(last["created_at"], last["id"])
+
+        conversations = []
+        for row in rows:
+            item = {name: row[name] for name in selected}
+            if item.get("created_at") is not None:
+                item["created_at"] = item["created_at"].isoformat()
+            conversations.append(item)
+        return conversations
+    except CONNECTION_ERRORS as e:
         # Database not available - return empty list instead of crashing
-        print(f"Database connection error (conversations endpoint): {e}")
-        print("Returning empty conversations list - database may not be running")
+        logger.warning("Database connection error (conversations endpoint): %s", e)
+        logger.warning("Returning empty conversations list - database may not be running")
         return []
 
 @router.delete("/conversations/{conversation_id}")
@@ -49,10 +144,6 @@ async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(g
     Delete a specific conversation by ID.
     Gracefully handles database connection errors.
     """
-    # Check if database connection is available
-    if db is None:
-        raise HTTPException(status_code=503, detail="Database not available")
-    
     try:
         # Check if conversation exists
         result = await db.execute(
@@ -69,18 +160,27 @@ async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(g
         )
         await db.commit()
         
-        print(f"Successfully deleted conversation {conversation_id}")
+        logger.info("Successfully deleted conversation %s", conversation_id)
         return {"message": "Conversation deleted successfully", "id": conversation_id}
         
     except HTTPException:
         raise
-    except (OperationalError, ConnectionRefusedError) as e:
+    except CONNECTION_ERRORS as e:
         await db.rollback()
-        print(f"Database connection error (delete conversation): {e}")
+        logger.warning("Database connection error (delete conversation): %s", e)
         raise HTTPException(status_code=503, detail="Database not available")
     except Exception as e:
         await db.rollback()
-        print(f"Error deleting conversation: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error deleting conversation: %s", e)
         raise HTTPException(status_code=500, detail=f"Error deleting conversation: {str(e)}")
+
+@router.get("/ready")
+async def readiness():
+    """
+    Readiness probe for load balancers: 503 until startup preloading (model
+    load + warmup, DB connections, storage client) has finished, then 200.
+    The body reports total and per-step preload time.
+    """
+    preloader = get_preloader()
+    body = {"ready": preloader.ready, **preloader.stats}
+    return JSONResponse(body, status_code=200 if preloader.ready else 503)
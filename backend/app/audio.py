@@ -0,0 +1,179 @@
+"""
+Audio normalization before speech-to-text.
+
+Voice notes arrive as whatever the client recorded (often 48 kHz stereo
+webm/m4a). Speech recognition needs far less: audio is transcoded with ffmpeg to
+16 kHz mono Opus in an Ogg container, typically 5-10x smaller, before it is
+sent to the STT provider. Normalized files are cached by the SHA-256 of the
+source audio under UPLOAD_DIR/normalized (uploads are already content
+addressed, so the digest usually comes from the file name), and a re-sent
+recording reuses the cached file. When ffmpeg is missing or transcoding fails,
+the original file is used unchanged.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from app.api.utils import UPLOAD_DIR
+from app.media_store import CHUNK_SIZE, MediaStore, store_lock
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AUDIO_NORMALIZE = os.getenv("AUDIO_NORMALIZE", "true").lower() == "true"
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", 16000))
+AUDIO_OPUS_BITRATE = os.getenv("AUDIO_OPUS_BITRATE", "24k")
+AUDIO_NORMALIZE_TIMEOUT = float(os.getenv("AUDIO_NORMALIZE_TIMEOUT", 60))
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "") or shutil.which("ffmpeg")
+
+NORMALIZED_SUFFIX = ".ogg"
+
+normalized_store = MediaStore(os.path.join(UPLOAD_DIR, "normalized"), lock_root=UPLOAD_DIR)
+
+_stats_lock = threading.Lock()
+audio_stats = {
+    "normalized": 0,
+    "cache_hits": 0,
+    "failures": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "seconds": 0.0,
+    "stt_requests": 0,
+    "stt_bytes_sent": 0,
+    "stt_seconds": 0.0,
+}
+
+
+def content_digest(path: str) -> str:
+    """SHA-256 of a file's content (taken from the name for media-store files)."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    if len(name) == 64 and all(c in "0123456789abcdef" for c in name):
+        return name
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _count(key: str, value=1):
+    with _stats_lock:
+        audio_stats[key] += value
+
+
+def _transcode(src: str, dest: str):
+    tmp_path = normalized_store.temp_path(NORMALIZED_SUFFIX)
+    try:
+        subprocess.run(
+            [
+                FFMPEG_BIN, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                "-i", src, "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE),
+                "-c:a", "libopus", "-b:a", AUDIO_OPUS_BITRATE, "-application", "voip",
+                tmp_path,
+            ],
+            check=True, capture_output=True, timeout=AUDIO_NORMALIZE_TIMEOUT,
+        )
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def decode_pcm(path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> bytes:
+    """Decode any audio file to mono signed 16-bit little-endian PCM at `sample_rate`."""
+    completed = subprocess.run(
+        [
+            FFMPEG_BIN, "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+        ],
+        check=True, capture_output=True, timeout=AUDIO_NORMALIZE_TIMEOUT,
+    )
+    return completed.stdout
+
+
+def encode_opus(pcm: bytes, dest: str, sample_rate: int = AUDIO_SAMPLE_RATE):
+    """Encode mono s16le PCM to an Ogg/Opus file."""
+    subprocess.run(
+        [
+            FFMPEG_BIN, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "-",
+            "-c:a", "libopus", "-b:a", AUDIO_OPUS_BITRATE, "-application", "voip", dest,
+        ],
+        input=pcm, check=True, capture_output=True, timeout=AUDIO_NORMALIZE_TIMEOUT,
+    )
+
+
+def normalize_audio(path: str) -> str:
+    """
+    Path of a 16 kHz mono Opus version of `path` (cached by content hash), or
+    `path` itself when normalization is disabled, unavailable or not smaller.
+    """
+    if not AUDIO_NORMALIZE or not FFMPEG_BIN:
+        return path
+    started = time.monotonic()
+    try:
+        digest = content_digest(path)
+        dest = normalized_store.path_for(digest, NORMALIZED_SUFFIX)
+        source_bytes = os.path.getsize(path)
+        cached = False
+        if os.path.exists(dest):
+            try:
+                with store_lock(normalized_store.lock_root):
+                    # Fresh mtime under the lock keeps it inside the retention window:
+                    # the sweep re-checks mtime under the same lock before deleting
+                    os.utime(dest)
+                cached = True
+            except FileNotFoundError:
+                pass  # swept in the meantime; transcode it again
+        if cached:
+            _count("cache_hits")
+        else:
+            _transcode(path, dest)
+            _count("normalized")
+    except (OSError, subprocess.SubprocessError) as e:
+        _count("failures")
+        stderr = getattr(e, "stderr", b"") or b""
+        logger.warning(
+            "Audio normalization failed for %s, sending original: %s %s", path, e, stderr.decode(errors="ignore")[-300:]
+        )
+        return path
+    normalized_bytes = os.path.getsize(dest)
+    _count("seconds", time.monotonic() - started)
+    if normalized_bytes >= source_bytes:
+        # Already compact (e.g. a low-bitrate Opus upload)
+        return path
+    _count("bytes_in", source_bytes)
+    _count("bytes_out", normalized_bytes)
+    return dest
+
+
+def record_stt_call(bytes_sent: int, seconds: float):
+    """Account one upstream transcription request (payload size and latency)."""
+    with _stats_lock:
+        audio_stats["stt_requests"] += 1
+        audio_stats["stt_bytes_sent"] += bytes_sent
+        audio_stats["stt_seconds"] += seconds
+
+
+def audio_snapshot() -> dict:
+    with _stats_lock:
+        stats = dict(audio_stats)
+    requests = stats["stt_requests"]
+    return {
+        "enabled": AUDIO_NORMALIZE and bool(FFMPEG_BIN),
+        **stats,
+        "seconds": round(stats["seconds"], 3),
+        "stt_seconds": round(stats["stt_seconds"], 3),
+        "bytes_saved": stats["bytes_in"] - stats["bytes_out"],
+        "stt_avg_bytes": round(stats["stt_bytes_sent"] / requests) if requests else None,
+        "stt_avg_seconds": round(stats["stt_seconds"] / requests, 3) if requests else None,
+    }
+
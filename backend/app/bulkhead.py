@@ -0,0 +1,169 @@
+"""
+Per-dependency bulkheads for blocking pipeline work.
+
+The sync LangGraph nodes call blocking clients (the sync genai SDK, gTTS,
+requests to Open-Meteo, the vision model) from the event loop's default thread
+pool. Without limits one slow dependency ends up holding every pool thread and
+starves the others. Each dependency therefore gets a bulkhead: at most
+BULKHEAD_<NAME>_CONCURRENCY calls run at once, at most BULKHEAD_<NAME>_QUEUE
+more wait for a slot (for up to BULKHEAD_<NAME>_TIMEOUT seconds), and anything
+beyond that fails fast with BulkheadFull, which callers turn into their usual
+fallback (no TTS, no weather, a "busy" vision result, ...). The pipeline pool
+itself is sized by PIPELINE_THREADS (see configure_default_executor), larger
+than any single bulkhead, so a gTTS outage can hold at most
+concurrency + queue threads and chat reasoning keeps running.
+
+Usage:
+
+    with get_bulkhead("tts"):
+        gTTS(...).save(path)
+
+Active calls and queue depth per dependency are exposed at GET /metrics (krishibondhu_bulkhead_*).
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_THREADS = int(os.getenv("PIPELINE_THREADS", 64))
+
+# name -> (concurrency, queue, timeout seconds) defaults
+BULKHEAD_DEFAULTS = {
+    "llm": (16, 32, 30.0),
+    "stt": (8, 16, 30.0),
+    "tts": (4, 8, 10.0),
+    "weather": (4, 8, 5.0),
+    "vision": (4, 16, 15.0),
+}
+
+
+class BulkheadFull(RuntimeError):
+    """Raised when a dependency's bulkhead has no free slot or queue space."""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name} bulkhead full ({reason})")
+        self.name = name
+
+
+class Bulkhead:
+    """Bounded concurrency plus a bounded, time-limited wait queue."""
+
+    def __init__(self, name: str, concurrency: int, queue: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.stats = {"calls": 0, "rejected": 0, "timeouts": 0, "wait_seconds": 0.0, "max_waiting": 0}
+
+    def acquire(self):
+        if self._slots.acquire(blocking=False):
+            waited = 0.0
+        else:
+            with self._lock:
+                if self.waiting >= self.queue:
+                    self.stats["rejected"] += 1
+                    raise BulkheadFull(self.name, "queue full")
+                self.waiting += 1
+                self.stats["max_waiting"] = max(self.stats["max_waiting"], self.waiting)
+            started = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            waited = time.monotonic() - started
+            with self._lock:
+                self.waiting -= 1
+                if not acquired:
+                    self.stats["timeouts"] += 1
+                    raise BulkheadFull(self.name, f"no slot within {self.timeout:g}s")
+        with self._lock:
+            self.active += 1
+            self.stats["calls"] += 1
+            self.stats["wait_seconds"] += waited
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            active, waiting = self.active, self.waiting
+        return {
+            "concurrency": self.concurrency,
+            "queue": self.queue,
+            "timeout": self.timeout,
+            "active": active,
+            "waiting": waiting,
+            **stats,
+            "wait_seconds": round(stats["wait_seconds"], 3),
+            "avg_wait_seconds": round(stats["wait_seconds"] / stats["calls"], 4) if stats["calls"] else None,
+        }
+
+
+_bulkheads: Dict[str, Bulkhead] = {}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead(name: str) -> Bulkhead:
+    """Get or create the bulkhead for a dependency, sized from BULKHEAD_<NAME>_* env"""
+    with _bulkheads_lock:
+        if name not in _bulkheads:
+            concurrency, queue, timeout = BULKHEAD_DEFAULTS.get(name, (8, 16, 30.0))
+            prefix = f"BULKHEAD_{name.upper()}_"
+            _bulkheads[name] = Bulkhead(
+                name,
+                concurrency=int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+                queue=int(os.getenv(prefix + "QUEUE", queue)),
+                timeout=float(os.getenv(prefix + "TIMEOUT", timeout)),
+            )
+        return _bulkheads[name]
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def configure_default_executor(loop):
+    """
+    Size the loop's default executor (where LangGraph runs sync nodes) and warn
+    about bulkheads big enough to fill it on their own.
+    """
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=PIPELINE_THREADS, thread_name_prefix="pipeline")
+    loop.set_default_executor(_executor)
+    for name in BULKHEAD_DEFAULTS:
+        bulkhead = get_bulkhead(name)
+        if bulkhead.concurrency + bulkhead.queue >= PIPELINE_THREADS:
+            logger.warning(
+                "%s bulkhead (%d + %d queued) can occupy all %d pipeline threads",
+                name, bulkhead.concurrency, bulkhead.queue, PIPELINE_THREADS,
+            )
+
+
+def bulkheads_snapshot() -> dict:
+    for name in BULKHEAD_DEFAULTS:
+        get_bulkhead(name)
+    with _bulkheads_lock:
+        bulkheads = dict(_bulkheads)
+    return {
+        "pipeline_threads": PIPELINE_THREADS,
+        "bulkheads": {name: bulkhead.snapshot() for name, bulkhead in bulkheads.items()},
+    }
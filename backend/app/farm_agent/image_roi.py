@@ -0,0 +1,159 @@
+"""
+Detection-guided image input for the multimodal LLM.
+
+Instead of uploading the full-resolution photo to Gemini, reasoning_node sends a
+low-resolution overview of the whole image plus full-detail crops of the regions
+YOLO flagged (raw_detections). The detector is a generic one, so these are only
+regions of interest; the prompt note asks the model to read them with the overview.
+Overlapping regions are merged, each region gets some context margin, and very
+large regions are split into tiles rather than downscaled. Without detections
+(or when they cover most of the photo) only a moderately downscaled full image
+is sent. Crops are taken in the same pixel space as the detector's boxes and
+rotated per EXIF orientation afterwards.
+
+roi_stats tracks bytes sent vs the original uploads (krishibondhu_roi_* at GET /metrics).
+"""
+import io
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.models.vision_result import VisionResult
+
+load_dotenv()
+
+ROI_ENABLED = os.getenv("ROI_ENABLED", "true").lower() == "true"
+ROI_MAX_CROPS = int(os.getenv("ROI_MAX_CROPS", 4))
+ROI_MARGIN = float(os.getenv("ROI_MARGIN", 0.2))  # context around each box, fraction of its size
+ROI_MIN_CROP = int(os.getenv("ROI_MIN_CROP", 224))  # px, smallest crop side taken from the original
+ROI_CROP_MAX = int(os.getenv("ROI_CROP_MAX", 768))  # px, longest side of each crop/tile sent
+ROI_OVERVIEW_MAX = int(os.getenv("ROI_OVERVIEW_MAX", 512))  # px, longest side of the overview
+ROI_FALLBACK_MAX = int(os.getenv("ROI_FALLBACK_MAX", 1024))  # px, whole image when nothing was detected
+ROI_JPEG_QUALITY = int(os.getenv("ROI_JPEG_QUALITY", 85))
+# Regions covering more than this fraction of the photo are sent as the downscaled whole image
+ROI_MAX_AREA_FRACTION = float(os.getenv("ROI_MAX_AREA_FRACTION", 0.6))
+
+# Same mapping PIL.ImageOps.exif_transpose uses
+_EXIF_TRANSPOSE = {2: 0, 3: 3, 4: 1, 5: 5, 6: 4, 7: 6, 8: 2}
+
+_stats_lock = threading.Lock()
+roi_stats = {
+    "images": 0,
+    "with_detections": 0,
+    "parts_sent": 0,
+    "bytes_original": 0,
+    "bytes_sent": 0,
+}
+
+Box = Tuple[float, float, float, float]
+
+
+def _encode(image, max_side: int, orientation: Optional[int]) -> bytes:
+    from PIL import Image
+    image = image.convert("RGB")
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    if orientation in _EXIF_TRANSPOSE:
+        image = image.transpose(_EXIF_TRANSPOSE[orientation])
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=ROI_JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def _expand(box: Box, width: int, height: int) -> Box:
+    x1, y1, x2, y2 = box
+    w, h = x2 - x1, y2 - y1
+    w_new = max(w * (1 + 2 * ROI_MARGIN), ROI_MIN_CROP)
+    h_new = max(h * (1 + 2 * ROI_MARGIN), ROI_MIN_CROP)
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    return (
+        max(0.0, cx - w_new / 2), max(0.0, cy - h_new / 2),
+        min(float(width), cx + w_new / 2), min(float(height), cy + h_new / 2),
+    )
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def merge_regions(boxes: List[Box]) -> List[Box]:
+    """Union overlapping regions so the same pixels are not sent twice."""
+    regions = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                if _overlaps(regions[i], regions[j]):
+                    a, b = regions[i], regions.pop(j)
+                    regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+
+def _tiles(region: Box) -> List[Box]:
+    """Split a region into a grid whose cells fit ROI_CROP_MAX without downscaling more than 2x."""
+    x1, y1, x2, y2 = region
+    cols = max(1, min(3, int((x2 - x1) // (2 * ROI_CROP_MAX)) + 1))
+    rows = max(1, min(3, int((y2 - y1) // (2 * ROI_CROP_MAX)) + 1))
+    w, h = (x2 - x1) / cols, (y2 - y1) / rows
+    return [(x1 + c * w, y1 + r * h, x1 + (c + 1) * w, y1 + (r + 1) * h) for r in range(rows) for c in range(cols)]
+
+
+def build_image_parts(image_path: str, vision_result: Optional[VisionResult]) -> Tuple[List[bytes], str]:
+    """
+    JPEG images to send to the LLM for `image_path` and a short note describing
+    them for the prompt. Returns ([overview, crop, ...], note) when there are
+    detections, else ([downscaled full image], "").
+    """
+    from PIL import Image
+    original_bytes = os.path.getsize(image_path)
+    with Image.open(image_path) as img:
+        img.load()
+        orientation = img.getexif().get(0x0112)
+        width, height = img.size
+        # VisionResult boxes are image-relative and already sorted by confidence
+        boxes = vision_result.pixel_boxes((width, height))[:ROI_MAX_CROPS] if vision_result is not None else []
+        regions = merge_regions([_expand(tuple(box), width, height) for box in boxes])
+        covered = sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions)
+        if covered > ROI_MAX_AREA_FRACTION * width * height:
+            regions = []
+        if not regions:
+            parts = [_encode(img, ROI_FALLBACK_MAX, orientation)]
+            note = ""
+        else:
+            parts = [_encode(img, ROI_OVERVIEW_MAX, orientation)]
+            for region in regions:
+                for tile in _tiles(region):
+                    parts.append(_encode(img.crop(tuple(round(v) for v in tile)), ROI_CROP_MAX, orientation))
+            note = (
+                "IMAGES: The first image is a low-resolution overview of the farmer's photo. "
+                f"The other {len(parts) - 1} image(s) are full-detail crops of detected regions of interest "
+                "(found by a general-purpose object detector, not a disease detector). Use them together with "
+                "the overview: symptoms may also appear outside these regions."
+            )
+    with _stats_lock:
+        roi_stats["images"] += 1
+        roi_stats["with_detections"] += bool(regions)
+        roi_stats["parts_sent"] += len(parts)
+        roi_stats["bytes_original"] += original_bytes
+        roi_stats["bytes_sent"] += sum(len(p) for p in parts)
+    return parts, note
+
+
+def roi_snapshot() -> dict:
+    with _stats_lock:
+        stats = dict(roi_stats)
+    saved = stats["bytes_original"] - stats["bytes_sent"]
+    return {
+        "enabled": ROI_ENABLED,
+        **stats,
+        "bytes_saved": saved,
+        "saved_ratio": round(saved / stats["bytes_original"], 3) if stats["bytes_original"] else None,
+    }
@@ -6,13 +6,24 @@ Using Google Gemini API for transcription and LLM tasks.
 from typing_extensions import TypedDict, Annotated
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-import json, tempfile, os, requests, base64, time
+import contextvars, json, logging, tempfile, os, requests, base64, time
 from app.api.utils import save_audio_local
 from app.models.vision import run_vision_classifier
+from app.models.vision_result import VisionResult, to_json
+from app.storage import get_storage_backend
+from app.audio import content_digest, normalize_audio
+from app.transcript_cache import get_transcript_cache
+from app.bulkhead import BulkheadFull, get_bulkhead
+from app.metrics import instrument_node, observe, record_payload
+from app.llm import stt
+from app.vad import get_chunk_executor, prepare_speech
+from app.farm_agent.image_roi import ROI_ENABLED, build_image_parts
 from gtts import gTTS
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Gemini API client
 import google.generativeai as genai
 
@@ -32,146 +43,150 @@ class FarmState(TypedDict):
     gps: dict
     crop: str
     image_path: str
-    vision_result: dict
+    vision_result: VisionResult  # compact; to_json() at the API/DB boundary
     weather_forecast: dict
     messages: Annotated[list, add_messages]
     reply_text: str
     tts_path: str
+    audio_stats: dict  # VAD report: duration, speech kept, seconds saved, chunks
+    degraded: bool  # admitted under load: skip weather and TTS (app/admission.py)
 
 # --- helper functions ---
-def transcribe_with_gemini(audio_path: str) -> dict:
-    """
-    Transcribe audio using Gemini API.
-    Gemini 2.5 Flash supports audio files via direct file path or base64.
-    Returns dict with keys: text, language (if available).
-    """
+def _transcribe_chunk(audio_path: str, duration: float = None, language_hint: str = None) -> dict:
+    """Transcribe one file with the configured STT backend; empty transcript on failure."""
     try:
-        # Check if file exists
-        if not os.path.exists(audio_path):
-            print(f"Audio file not found: {audio_path}")
-            return {"text": "", "language": "en"}
-        
-        # Read file and encode as base64 for Gemini API
-        print(f"Reading audio file for Gemini: {audio_path}")
-        import mimetypes
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-        
-        # Determine MIME type
-        mime_type, _ = mimetypes.guess_type(audio_path)
-        if not mime_type:
-            # Default to webm if unknown
-            mime_type = "audio/webm"
-        
-        # Use Gemini to transcribe the audio - improved for Bengali/Bangla with better accuracy
-        prompt = """You are an expert audio transcription assistant specializing in Bengali (Bangla) and English languages, with particular expertise in agricultural terminology.
-
-CRITICAL TRANSCRIPTION RULES:
-1. LANGUAGE DETECTION:
-   - Listen carefully to identify if the speaker is using Bengali/Bangla or English
-   - Bengali uses the Bengali script (বাংলা) with Unicode range 0980-09FF
-   - If you hear Bengali words, transcribe in Bengali script
-   - If you hear English words, transcribe in English
-
-2. ACCURACY REQUIREMENTS:
-   - Transcribe EXACTLY what you hear - word for word
-   - Do NOT translate between languages
-   - Do NOT add words that weren't spoken
-   - Do NOT omit words that were spoken
-   - Preserve the exact pronunciation and meaning
-   - Handle regional accents (especially Bangladeshi Bengali dialect)
-
-3. AGRICULTURAL TERMINOLOGY:
-   - Be precise with crop names: ধান (rice), আলু (potato), টমেটো (tomato), গম (wheat)
-   - Accurately transcribe disease names: রোগ, পোকা, পাতা পোড়া
-   - Preserve technical farming terms in their original language
-
-4. OUTPUT FORMAT:
-   - Return ONLY the transcribed text
-   - No explanations, no additional commentary
-   - No language labels or prefixes
-   - Just the pure transcription
-
-Now transcribe the audio accurately:"""
-        
-        print("Generating transcription with Gemini...")
-        # Pass file directly using Part.from_data
-        try:
-            from google.generativeai.types import Part
-            audio_part = Part.from_data(data=audio_data, mime_type=mime_type)
-            response = gemini_model.generate_content([audio_part, prompt])
-        except ImportError:
-            # Fallback: try passing file path directly (may work in some versions)
-            try:
-                response = gemini_model.generate_content([audio_path, prompt])
-            except:
-                # Last resort: encode as base64
-                import base64
-                audio_b64 = base64.b64encode(audio_data).decode('utf-8')
-                # Create a data URI
-                data_uri = f"data:{mime_type};base64,{audio_b64}"
-                response = gemini_model.generate_content([data_uri, prompt])
-        
-        # Handle different response structures
-        if not response:
-            raise Exception("Empty response from Gemini transcription")
-        
-        transcript_text = None
-        if hasattr(response, 'text') and response.text:
-            transcript_text = response.text
-        elif hasattr(response, 'candidates') and response.candidates and len(response.candidates) > 0:
-            candidate = response.candidates[0]
-            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                transcript_text = ''.join([part.text for part in candidate.content.parts if hasattr(part, 'text')])
-            elif hasattr(candidate, 'text'):
-                transcript_text = candidate.text
-        
-        if not transcript_text or not transcript_text.strip():
-            raise Exception("Empty transcription from Gemini API")
-        
-        transcript_text = transcript_text.strip()
-        
-        # Detect language (improved detection with more Bengali characters)
-        language = "en"  # Default
-        transcript_lower = transcript_text.lower()
-        
-        # Comprehensive Bengali character detection (including all Bengali Unicode ranges)
-        bengali_chars = "অআইঈউঊঋএঐওঔকখগঘঙচছজঝঞটঠডঢণতথদধনপফবভমযরলশষসহড়ঢ়য়"
-        # Check for Bengali characters (Unicode range: 0980-09FF)
-        has_bengali = False
-        for char in transcript_text:
-            if '\u0980' <= char <= '\u09FF':  # Bengali Unicode range
-                has_bengali = True
-                break
-        
-        # Also check for common Bengali words/phrases
-        bengali_indicators = ["আমি", "তুমি", "আপনি", "কী", "কেন", "কখন", "কোথায়", "কিভাবে", "ধন্যবাদ", "নমস্কার"]
-        has_bengali_words = any(word in transcript_text for word in bengali_indicators)
-        
-        if has_bengali or has_bengali_words:
-            language = "bn"
-            print(f"[DEBUG] Detected Bengali language from transcription")
-        else:
-            print(f"[DEBUG] Detected English language from transcription")
-        
-        print(f"Transcription successful. Language: {language}, Text length: {len(transcript_text)}")
-        return {"text": transcript_text, "language": language}
-    
+        result = stt.transcribe(audio_path, duration=duration, language_hint=language_hint)
+        logger.info(
+            "Transcription successful (%s). Language: %s, Text length: %d",
+            result["backend"], result["language"], len(result["text"]),
+        )
+        return result
     except Exception as e:
-        error_msg = str(e)
-        error_type = type(e).__name__
-        print(f"[ERROR] Audio transcription failed!")
-        print(f"[ERROR] Error type: {error_type}")
-        print(f"[ERROR] Error message: {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Audio transcription failed (%s): %s", type(e).__name__, e)
         # Return empty transcript - the flow can continue but won't have transcript
         return {"text": "", "language": "en"}
 
+def transcribe_audio(audio_path: str, language_hint: str = None) -> dict:
+    """
+    Normalize, trim silence (VAD) and transcribe a recording with the STT
+    backend chosen by STT_PROVIDER / STT_ROUTES (app/llm/stt.py). Recordings
+    without speech return an empty transcript without calling the STT provider;
+    long ones are split at pauses and the chunks are transcribed concurrently
+    and joined in order. Results are cached by audio content hash, so retried
+    uploads skip all of it. Returns {"text", "language", "audio_stats"}.
+    """
+    if not os.path.exists(audio_path):
+        logger.warning("Audio file not found: %s", audio_path)
+        return {"text": "", "language": "en", "audio_stats": None}
+    cache = get_transcript_cache()
+    if cache is None:
+        return _transcribe_recording(audio_path, language_hint, None)[0]
+
+    digest = content_digest(audio_path)
+    cached = cache.get(digest)
+    if cached is None:
+        running = cache.claim(digest)
+        if running is not None:
+            logger.info("Transcription of identical audio already running, waiting for it")
+            cached = cache.wait(digest, running)
+    if cached is not None:
+        logger.info("Transcript cache hit for %s, skipping STT", digest[:12])
+        return _from_cache(cached)
+    try:
+        result, keys = _transcribe_recording(audio_path, language_hint, cache)
+        if keys is not None:
+            cache.put([digest, *keys], result)
+        return result
+    finally:
+        if running is None:
+            cache.release(digest)
+
+def _from_cache(cached: dict) -> dict:
+    audio_stats = cached.get("audio_stats")
+    return {**cached, "audio_stats": {**audio_stats, "cached": True} if audio_stats else {"cached": True}}
+
+def _transcribe_recording(audio_path: str, language_hint: str, cache):
+    """
+    transcribe_audio() without the content-hash lookup. Returns the result and
+    the extra cache keys to store it under (None when it must not be cached).
+    """
+    # 16 kHz mono Opus is all STT needs; much smaller than the raw upload
+    audio_path = normalize_audio(audio_path)
+    try:
+        plan = prepare_speech(audio_path)
+    except Exception as e:
+        logger.warning("VAD failed, transcribing the whole recording: %s", e)
+        plan = None
+    if plan is None:
+        if cache is not None:
+            cache.miss()
+        result = {**_transcribe_chunk(audio_path, language_hint=language_hint), "audio_stats": None}
+        return result, [] if result["text"] else None
+
+    try:
+        # Same audio in another container / encoding
+        cached = cache.get(plan.pcm_digest, kind="pcm_hits") if cache is not None else None
+        if cached is not None:
+            logger.info("Transcript cache hit on decoded audio %s, skipping STT", plan.pcm_digest[:12])
+            return _from_cache(cached), []
+        if cache is not None:
+            cache.miss()
+        if plan.empty:
+            logger.info("No speech detected in %.1fs recording - skipping transcription", plan.duration)
+            return {"text": "", "language": "en", "audio_stats": plan.report()}, [plan.pcm_digest]
+        if len(plan.chunks) == 1:
+            results = [_transcribe_chunk(plan.chunks[0], plan.chunk_seconds[0], language_hint)]
+        else:
+            # copy_context() so chunk logs keep the request id
+            futures = [
+                get_chunk_executor().submit(
+                    contextvars.copy_context().run, _transcribe_chunk, chunk, seconds, language_hint
+                )
+                for chunk, seconds in zip(plan.chunks, plan.chunk_seconds)
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        plan.cleanup()
+
+    text = " ".join(r["text"] for r in results if r.get("text"))
+    # Language of the chunks carrying most of the text
+    weights = {}
+    for r in results:
+        weights[r.get("language", "en")] = weights.get(r.get("language", "en"), 0) + len(r.get("text", ""))
+    language = max(weights, key=weights.get) if weights else "en"
+    logger.info(
+        "VAD: %.1fs recording, %.1fs speech in %d chunk(s), %.1fs not sent",
+        plan.duration, plan.speech_seconds, len(plan.chunks), plan.seconds_saved,
+    )
+    result = {"text": text, "language": language, "audio_stats": plan.report()}
+    # A chunk that failed leaves a gap in the transcript; try again next time
+    return result, [plan.pcm_digest] if all(r.get("text") for r in results) else None
+
+def _payload_size(contents) -> int:
+    """Approximate request bytes of generate_content contents (text + inline media)."""
+    size = 0
+    for item in contents if isinstance(contents, list) else [contents]:
+        if isinstance(item, str):
+            size += len(item.encode("utf-8"))
+        elif isinstance(item, (bytes, bytearray)):
+            size += len(item)
+        else:
+            data = getattr(getattr(item, "inline_data", None), "data", None)
+            size += len(data) if data else 0
+    return size
+
+def llm_generate(model, contents):
+    """model.generate_content(contents) inside the LLM bulkhead (raises BulkheadFull when saturated)"""
+    record_payload("gemini", "sent", _payload_size(contents))
+    with get_bulkhead("llm"), observe("gemini", "generate"):
+        return model.generate_content(contents)
+
 def call_open_meteo(lat, lon):
     url = "https://api.open-meteo.com/v1/forecast"
     params = {"latitude": lat, "longitude": lon, "hourly":"temperature_2m,relativehumidity_2m,precipitation", "timezone":"auto"}
-    r = requests.get(url, params=params, timeout=10)
+    with get_bulkhead("weather"), observe("open_meteo", "forecast"):
+        r = requests.get(url, params=params, timeout=10)
+    record_payload("open_meteo", "received", len(r.content))
     try:
         return r.json()
     except Exception:
@@ -191,13 +206,12 @@ def validate_response_language(response_text: str, expected_language: str) -> st
     
     # If languages match, return as-is
     if actual_language == expected_language:
-        print(f"[DEBUG] Response language validation: PASSED ({expected_language})")
+        logger.debug("Response language validation: PASSED (%s)", expected_language)
         return response_text
     
     # Languages don't match - log warning
-    print(f"[WARNING] Response language mismatch!")
-    print(f"[WARNING] Expected: {expected_language}, Got: {actual_language}")
-    print(f"[WARNING] Response preview: {response_text[:200]}...")
+    logger.warning("Response language mismatch! Expected: %s, Got: %s", expected_language, actual_language)
+    logger.debug("Response preview: %s...", response_text[:200])
     
     # If response is in wrong language, we could try to regenerate
     # For now, just log and return - the LLM should have followed instructions
@@ -209,11 +223,11 @@ def validate_response_language(response_text: str, expected_language: str) -> st
     
     if expected_language == "bn" and bengali_chars == 0 and english_chars > 0:
         # Response is in English but should be Bengali
-        print(f"[ERROR] Response is in English but should be in Bengali!")
+        logger.error("Response is in English but should be in Bengali!")
         # Could add logic here to request regeneration, but for now just warn
     elif expected_language == "en" and bengali_chars > 0 and english_chars == 0:
         # Response is in Bengali but should be English
-        print(f"[ERROR] Response is in Bengali but should be in English!")
+        logger.error("Response is in Bengali but should be in English!")
     
     return response_text
 
@@ -258,28 +272,25 @@ def synthesize_tts(text: str, lang: str="bn") -> str:
     """
     Save TTS mp3 using gTTS and return the filepath.
     Cleans text before TTS to remove markdown and special symbols.
-    Uses UPLOAD_DIR for persistent storage instead of /tmp.
+    Stored in the content-addressed media store under UPLOAD_DIR, so identical
+    replies share one file.
     """
-    from app.api.utils import UPLOAD_DIR
-    from uuid import uuid4
+    from app.api.utils import media_store
     
     # Clean text before TTS
     cleaned_text = clean_text_for_tts(text)
     
     if not cleaned_text or len(cleaned_text.strip()) < 1:
-        print("[WARNING] Text is empty after cleaning, using original")
+        logger.warning("Text is empty after cleaning, using original")
         cleaned_text = text.strip()
     
-    # Use UPLOAD_DIR instead of /tmp for persistent storage
-    tts_filename = f"{uuid4().hex}.mp3"
-    tts_path = os.path.join(UPLOAD_DIR, tts_filename)
-    
-    # Ensure UPLOAD_DIR exists
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # gTTS writes to a temp file in the store; it is renamed to its content hash once complete
+    tts_path = media_store.temp_path(".mp3")
     
     try:
         tts = gTTS(cleaned_text, lang=lang if lang else "en")
-        tts.save(tts_path)
+        with get_bulkhead("tts"), observe("gtts", "synthesize"):
+            tts.save(tts_path)
         
         # Verify file was actually created with retry logic (race condition fix)
         import time
@@ -289,8 +300,11 @@ def synthesize_tts(text: str, lang: str="bn") -> str:
             if os.path.exists(tts_path):
                 file_size = os.path.getsize(tts_path)
                 if file_size > 0:  # File has content
-                    print(f"[DEBUG] TTS generated: {len(cleaned_text)} characters (cleaned from {len(text)} original)")
-                    print(f"[DEBUG] TTS saved to: {tts_path} (file size: {file_size} bytes)")
+                    tts_path = media_store.put_file(tts_path, ".mp3")
+                    logger.debug(
+                        "TTS saved to: %s (%d bytes, %d characters cleaned from %d)",
+                        tts_path, file_size, len(cleaned_text), len(text),
+                    )
                     return tts_path
             retry_count += 1
             if retry_count < max_retries:
@@ -298,14 +312,17 @@ def synthesize_tts(text: str, lang: str="bn") -> str:
         
         # If we get here, file wasn't created properly
         raise Exception(f"TTS file was not created at {tts_path} after {max_retries} retries")
+    except BulkheadFull:
+        if os.path.exists(tts_path):
+            os.remove(tts_path)
+        raise
     except Exception as e:
-        print(f"[ERROR] TTS generation failed: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("TTS generation failed: %s", e)
         # Try with original text as fallback
         try:
             tts = gTTS(text[:500], lang=lang if lang else "en")  # Limit length
-            tts.save(tts_path)
+            with get_bulkhead("tts"), observe("gtts", "synthesize"):
+                tts.save(tts_path)
             
             # Verify fallback file was created with retry logic
             import time
@@ -315,7 +332,8 @@ def synthesize_tts(text: str, lang: str="bn") -> str:
                 if os.path.exists(tts_path):
                     file_size = os.path.getsize(tts_path)
                     if file_size > 0:  # File has content
-                        print(f"[DEBUG] TTS fallback saved to: {tts_path} (file size: {file_size} bytes)")
+                        tts_path = media_store.put_file(tts_path, ".mp3")
+                        logger.debug("TTS fallback saved to: %s (file size: %s bytes)", tts_path, file_size)
                         return tts_path
                 retry_count += 1
                 if retry_count < max_retries:
@@ -323,9 +341,9 @@ def synthesize_tts(text: str, lang: str="bn") -> str:
             
             raise Exception(f"TTS fallback file was not created at {tts_path} after {max_retries} retries")
         except Exception as e2:
-            print(f"[ERROR] TTS fallback also failed: {e2}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("TTS fallback also failed: %s", e2)
+            if os.path.exists(tts_path):
+                os.remove(tts_path)
             raise
 
 def call_gemini_llm(prompt: str, system_instruction: str = None) -> str:
@@ -335,21 +353,18 @@ def call_gemini_llm(prompt: str, system_instruction: str = None) -> str:
     so we embed system instructions directly into the prompt.
     """
     try:
-        print(f"[DEBUG] call_gemini_llm called with system_instruction: {bool(system_instruction)}")
-        print(f"[DEBUG] Prompt length: {len(prompt)} characters")
+        logger.debug(
+            "call_gemini_llm: prompt %d characters, system_instruction: %s", len(prompt), bool(system_instruction)
+        )
         
         # Since system_instruction parameter is not supported, embed it directly in prompt
         if system_instruction:
-            print("[DEBUG] Embedding system instruction directly in prompt...")
             # Put system instruction at the very beginning of the prompt
             final_prompt = f"{system_instruction}\n\n{prompt}"
         else:
-            print("[DEBUG] No system instruction provided, using prompt as-is...")
             final_prompt = prompt
         
-        print("[DEBUG] Generating content with Gemini...")
-        response = gemini_model.generate_content(final_prompt)
-        print("[DEBUG] Response received successfully")
+        response = llm_generate(gemini_model, final_prompt)
         
         # Handle different response structures from Gemini
         if not response:
@@ -372,7 +387,7 @@ def call_gemini_llm(prompt: str, system_instruction: str = None) -> str:
                 # Direct parts access
                 result_text = ''.join([part.text for part in response.parts if hasattr(part, 'text')])
         except Exception as extract_err:
-            print(f"[WARNING] Error extracting text from response: {extract_err}")
+            logger.warning("Error extracting text from response: %s", extract_err)
             # Try to get text directly as fallback
             if hasattr(response, 'text'):
                 result_text = response.text
@@ -386,41 +401,58 @@ def call_gemini_llm(prompt: str, system_instruction: str = None) -> str:
             raise Exception("Empty or invalid response from Gemini API - no text content found")
         
         result = result_text.strip()
-        print(f"[DEBUG] Response length: {len(result)} characters")
+        logger.debug("call_gemini_llm: response %d characters", len(result))
         return result
         
+    except BulkheadFull:
+        raise  # reasoning_node answers "busy" once instead of retrying
     except Exception as e:
         error_msg = str(e)
         error_type = type(e).__name__
-        print(f"[ERROR] Gemini LLM call failed!")
-        print(f"[ERROR] Error type: {error_type}")
-        print(f"[ERROR] Error message: {error_msg}")
-        print(f"[ERROR] Full error details:")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Gemini LLM call failed (%s): %s", error_type, error_msg)
         
         # Check for specific error types
         if "429" in error_msg or "quota" in error_msg.lower() or "ResourceExhausted" in error_msg:
-            print("[ERROR] Quota/rate limit error detected")
+            logger.error("Quota/rate limit error detected")
             return "I apologize, but the AI service is currently experiencing high demand. Please try again in a few moments."
         
         if "API key" in error_msg or "authentication" in error_msg.lower() or "401" in error_msg or "403" in error_msg:
-            print("[ERROR] API key authentication error")
+            logger.error("API key authentication error")
             return "There's an issue with the AI service authentication. Please check the API configuration."
         
         if "timeout" in error_msg.lower() or "timed out" in error_msg.lower():
-            print("[ERROR] Timeout error")
+            logger.error("Timeout error")
             return "The request took too long to process. Please try again with a shorter query."
         
         if "invalid" in error_msg.lower() or "bad request" in error_msg.lower() or "400" in error_msg:
-            print("[ERROR] Invalid request error")
+            logger.error("Invalid request error")
             return "The request format was invalid. Please try rephrasing your question."
         
         # Return error with more context for debugging
-        print(f"[ERROR] Unknown error type - returning generic message")
+        logger.error("Unknown error type - returning generic message")
         return f"I'm having trouble processing your request. Error: {error_type}. Please try again or contact support."
 
+# Reply when the LLM bulkhead is saturated
+LLM_BUSY_REPLY = {
+    "en": "The advisory service is busy right now. Please try again in a minute.",
+    "bn": "পরামর্শ সেবা এখন ব্যস্ত। অনুগ্রহ করে এক মিনিট পরে আবার চেষ্টা করুন।",
+}
+
 # --- nodes ---
+def llm_image_parts(state: FarmState, image_data: bytes, mime_type: str):
+    """
+    Image Parts for Gemini and a prompt note describing them: a low-res overview
+    plus close-ups of the detected regions (see image_roi), or the original upload.
+    """
+    from google.generativeai.types import Part
+    if ROI_ENABLED:
+        try:
+            images, note = build_image_parts(state["image_path"], state.get("vision_result"))
+            return [Part.from_data(data=data, mime_type="image/jpeg") for data in images], note
+        except Exception as e:
+            logger.warning("ROI cropping failed, sending the original image: %s", e)
+    return [Part.from_data(data=image_data, mime_type=mime_type)], ""
+
 def detect_language_from_text(text: str) -> str:
     """
     Detect language from text input (for chat/text queries).
@@ -432,53 +464,9 @@ def detect_language_from_text(text: str) -> str:
     
     text = text.strip()
     
-    # DEBUG: Show what we're detecting
-    print(f"[DEBUG] detect_language_from_text: Input text length: {len(text)}")
-    print(f"[DEBUG] detect_language_from_text: First 50 chars: {repr(text[:50])}")
-    
-    # Count Bengali vs English characters for more accurate detection
-    bengali_char_count = 0
-    english_char_count = 0
-    
-    for char in text:
-        # Bengali Unicode range: 0980-09FF (includes all Bengali characters)
-        if '\u0980' <= char <= '\u09FF':
-            bengali_char_count += 1
-        # English letters (basic Latin)
-        elif char.isalpha() and ord(char) < 128:
-            english_char_count += 1
-    
-    print(f"[DEBUG] detect_language_from_text: Bengali chars found: {bengali_char_count}, English chars: {english_char_count}")
-    
-    # Check for common Bengali words/phrases (expanded list)
-    bengali_indicators = [
-        "আমি", "তুমি", "আপনি", "কী", "কেন", "কখন", "কোথায়", "কিভাবে", 
-        "ধন্যবাদ", "নমস্কার", "ফসল", "ধান", "আলু", "টমেটো", "রোগ", "পোকা",
-        "কৃষি", "চাষ", "জমি", "বীজ", "সার", "পানি", "বৃষ্টি", "সূর্য",
-        "কীটনাশক", "ফল", "শাক", "সবজি", "গাছ", "গাছপালা"
-    ]
-    has_bengali_words = any(word in text for word in bengali_indicators)
-    
-    print(f"[DEBUG] detect_language_from_text: Bengali words found: {has_bengali_words}")
-    
-    # Decision logic: Bengali if we have Bengali characters OR Bengali words
-    # Also consider ratio if both are present
-    if bengali_char_count > 0:
-        # If we have Bengali characters, it's definitely Bengali
-        print(f"[DEBUG] ✅ DETECTED BENGALI: Bengali chars: {bengali_char_count}")
-        return "bn"
-    elif has_bengali_words:
-        # Bengali words detected even without Bengali script (transliterated)
-        print(f"[DEBUG] ✅ DETECTED BENGALI: Bengali words found")
-        return "bn"
-    elif english_char_count > 0 and bengali_char_count == 0:
-        # Only English characters
-        print(f"[DEBUG] DETECTED ENGLISH: English chars: {english_char_count}, Bengali: 0")
-        return "en"
-    else:
-        # Default to English if unclear
-        print(f"[DEBUG] UNCLEAR: Defaulting to English")
-        return "en"
+    language = stt.detect_language(text)
+    logger.debug("detect_language_from_text: Detected %s in %d chars: %r", language, len(text), text[:50])
+    return language
 
 def stt_node(state: FarmState):
     """
@@ -486,39 +474,31 @@ def stt_node(state: FarmState):
     For text input, detects language. For audio input, transcribes and detects language.
     ALWAYS returns language in the state.
     """
-    print(f"[DEBUG] STT node: Starting")
-    print(f"[DEBUG] STT node: Has transcript: {bool(state.get('transcript'))}")
-    print(f"[DEBUG] STT node: Has audio_path: {bool(state.get('audio_path'))}")
-    
     # If transcript already exists (from text input), detect language from it
     if state.get("transcript"):
         transcript = state["transcript"]
-        print(f"[DEBUG] STT node: Transcript exists, length={len(transcript)}")
-        print(f"[DEBUG] STT node: Transcript repr: {repr(transcript[:100])}")
         # Detect language from the transcript text
         detected_lang = detect_language_from_text(transcript)
-        print(f"[DEBUG] STT node: 🔍 DETECTED LANGUAGE: {detected_lang} from text input")
-        print(f"[DEBUG] STT node: Full transcript: {transcript[:100]}...")
+        logger.debug("STT node: Text input (%d chars), language %s", len(transcript), detected_lang)
         return {"transcript": transcript, "language": detected_lang}
     
     # If no audio path, still need to return a language (default to English)
     if not state.get("audio_path"):
-        print("[DEBUG] STT node: No audio path and no transcript, defaulting to English")
+        logger.debug("STT node: No audio path and no transcript, defaulting to English")
         return {"transcript": "", "language": "en"}
     
-    # Transcribe audio using Gemini
-    print(f"[DEBUG] STT node: Transcribing audio from: {state['audio_path']}")
-    stt = transcribe_with_gemini(state["audio_path"])
-    transcript = stt.get("text", "").strip()
-    detected_lang = stt.get("language", "en")
+    # Transcribe audio (normalized + silence-trimmed) with the configured STT backend
+    logger.debug("STT node: Transcribing audio from: %s", state["audio_path"])
+    # A client-supplied language is only a routing hint; the transcript decides
+    result = transcribe_audio(state["audio_path"], language_hint=state.get("language"))
+    transcript = result.get("text", "").strip()
+    detected_lang = result.get("language", "en")
     
-    print(f"[DEBUG] STT node: Transcription complete")
-    print(f"[DEBUG] STT node: Detected language: {detected_lang}")
-    print(f"[DEBUG] STT node: Transcript length: {len(transcript)} characters")
-    if transcript:
-        print(f"[DEBUG] STT node: Transcript preview: {transcript[:100]}...")
+    logger.debug(
+        "STT node: Transcribed %d characters, language %s: %r", len(transcript), detected_lang, transcript[:100]
+    )
     
-    return {"transcript": transcript, "language": detected_lang}
+    return {"transcript": transcript, "language": detected_lang, "audio_stats": result.get("audio_stats")}
 
 def intent_node(state: FarmState):
     """
@@ -532,7 +512,7 @@ def intent_node(state: FarmState):
     language = state.get("language", "en")
     if transcript and (not language or language not in ["bn", "en"]):
         language = detect_language_from_text(transcript)
-        print(f"[DEBUG] Intent node: Detected language from transcript: {language}")
+        logger.debug("Intent node: Detected language from transcript: %s", language)
     
     if not transcript:
         # If no transcript, skip intent extraction and go to reasoning
@@ -588,14 +568,14 @@ IMPORTANT:
                 "note": response_text
             }
     except Exception as e:
-        print(f"Error in intent extraction: {e}")
+        logger.warning("Error in intent extraction: %s", e)
         parsed = {"crop": None, "symptoms": transcript, "need_image": False, "note": transcript}
     
     updates = {
         "messages": state.get("messages", []) + [{"role":"user", "content": transcript}],
         "language": language  # ALWAYS set the detected language
     }
-    print(f"[DEBUG] Intent node: Setting language: {language}")
+    logger.debug("Intent node: Setting language: %s", language)
     
     # Don't set reply_text here - let reasoning_node handle it
     if parsed.get("crop"):
@@ -608,14 +588,26 @@ IMPORTANT:
 def vision_node(state: FarmState):
     if not state.get("image_path"):
         return {}
-    res = run_vision_classifier(state["image_path"])
+    try:
+        with get_bulkhead("vision"):
+            res = run_vision_classifier(state["image_path"])
+    except BulkheadFull as e:
+        logger.warning("Vision skipped: %s", e)
+        res = VisionResult.failure("Vision service busy, please try again")
     return {"vision_result": res}
 
 def weather_node(state: FarmState):
+    if state.get("degraded"):
+        return {}
     gps = state.get("gps")
     if not gps or not gps.get("lat") or not gps.get("lon"):
         return {}
-    w = call_open_meteo(gps.get("lat"), gps.get("lon"))
+    try:
+        w = call_open_meteo(gps.get("lat"), gps.get("lon"))
+    except BulkheadFull as e:
+        # Advice without the forecast beats queueing behind a slow weather API
+        logger.warning("Weather skipped: %s", e)
+        return {}
     return {"weather_forecast": w}
 
 def reasoning_node(state: FarmState):
@@ -634,25 +626,22 @@ def reasoning_node(state: FarmState):
     has_image = bool(state.get("image_path"))
     has_audio = bool(state.get("audio_path"))
     
-    # CRITICAL DEBUG: Log incoming state to catch contamination
-    print(f"[DEBUG] ===== REASONING NODE START =====")
-    print(f"[DEBUG] Transcript: {transcript[:100] if transcript else '(empty)'}...")
-    print(f"[DEBUG] Crop detected: {crop if crop else '(none)'}")
-    print(f"[DEBUG] Vision result keys: {list(vision_result.keys()) if vision_result else '(empty)'}")
-    print(f"[DEBUG] Language: {language}")
-    print(f"[DEBUG] Has image: {has_image}, Has audio: {has_audio}")
-    print(f"[DEBUG] ===== END INCOMING STATE =====")
+    # Log incoming state to catch contamination between requests
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Reasoning node: transcript=%r crop=%s vision=%s language=%s image=%s audio=%s",
+            transcript[:100], crop or None, sorted(vision_result.keys()) if vision_result else None,
+            language, has_image, has_audio,
+        )
     
     # CRITICAL: If language not set, detect from transcript
     if not language or language not in ["bn", "en"]:
         if transcript:
             language = detect_language_from_text(transcript)
-            print(f"[DEBUG] Reasoning node: Language not in state, detected from transcript: {language}")
+            logger.debug("Reasoning node: Language not in state, detected from transcript: %s", language)
         else:
             language = "en"  # Default to English
-            print(f"[DEBUG] Reasoning node: No transcript, defaulting to English")
-    
-    print(f"[DEBUG] Reasoning node: Using language: {language} for response generation")
+            logger.debug("Reasoning node: No transcript, defaulting to English")
     
     # Determine input type for better system instruction
     input_type = "text"
@@ -819,10 +808,9 @@ CONVERSATION GUIDELINES:
             disease = vision_result.get("disease", "unknown")
             confidence = vision_result.get("confidence", 0)
             context_parts.append(f"Computer vision analysis detected: {disease} (confidence: {confidence:.1%})")
-            if vision_result.get("raw_detections"):
-                detections = vision_result.get("raw_detections", [])
-                if detections:
-                    context_parts.append(f"Number of detections: {len(detections)}")
+            detections_total = vision_result.get("detections_total") or len(vision_result.get("raw_detections") or [])
+            if detections_total:
+                context_parts.append(f"Number of detections: {detections_total}")
         elif vision_result.get("error"):
             context_parts.append(f"Vision analysis note: {vision_result.get('error')}")
     
@@ -850,7 +838,7 @@ CONVERSATION GUIDELINES:
     if not language or language == "en":
         response_lang = "English"
     
-    print(f"[DEBUG] Reasoning node: Response language selected: {response_lang} (code: {language})")
+    logger.debug("Reasoning node: Response language selected: %s (code: %s)", response_lang, language)
     
     # Add explicit language instruction to system instruction - STRONGER ENFORCEMENT
     if language == "bn":
@@ -916,8 +904,6 @@ Please:
 {language_instruction}
 The farmer's input language is: {response_lang}. You MUST respond in {response_lang}."""
         
-        print(f"[DEBUG] Language in prompt for image_only: {response_lang}")
-        print(f"[DEBUG] Language instruction included in prompt")
     
     elif input_type == "image_with_text":
         prompt = f"""🚨 CRITICAL: Analyze ONLY THIS image and question. Ignore any previous context, conversations, or images.
@@ -938,8 +924,6 @@ Please:
 {language_instruction}
 The farmer's input language is: {response_lang}. You MUST respond in {response_lang}."""
         
-        print(f"[DEBUG] Language in prompt for image_with_text: {response_lang}")
-        print(f"[DEBUG] Language instruction included in prompt")
     
     else:  # voice or text
         prompt = f"""🚨 CRITICAL: Answer ONLY THIS question. Do NOT reference previous queries, conversations, or context.
@@ -960,15 +944,13 @@ Please provide:
 {language_instruction}
 The farmer's input language is: {response_lang}. You MUST respond in {response_lang}. If the farmer asked in Bengali, respond in Bengali. If they asked in English, respond in English."""
         
-        print(f"[DEBUG] Language in prompt for text/voice: {response_lang}")
-        print(f"[DEBUG] Language instruction included in prompt")
     
     try:
         # If there's an image, include it for multimodal understanding
         if state.get("image_path") and os.path.exists(state["image_path"]):
             image_file = None
             try:
-                print(f"Reading image for multimodal analysis: {state['image_path']}")
+                logger.debug("Reading image for multimodal analysis: %s", state["image_path"])
                 # Read image file
                 import mimetypes
                 with open(state["image_path"], 'rb') as f:
@@ -980,9 +962,8 @@ The farmer's input language is: {response_lang}. You MUST respond in {response_l
                     mime_type = "image/jpeg"
                 
                 try:
-                    # Use Part.from_data for image
-                    from google.generativeai.types import Part
-                    image_part = Part.from_data(data=image_data, mime_type=mime_type)
+                    # Overview + detected regions instead of the full-resolution upload
+                    image_parts, image_note = llm_image_parts(state, image_data, mime_type)
                     
                     # Use model with system instruction for image analysis
                     try:
@@ -995,8 +976,10 @@ The farmer's input language is: {response_lang}. You MUST respond in {response_l
                         model_with_system = gemini_model
                         prompt = f"{system_instruction}\n\n{prompt}"
                     
-                    print("Generating multimodal response with image...")
-                    response = model_with_system.generate_content([image_part, prompt])
+                    response = llm_generate(
+                        model_with_system,
+                        [*image_parts, f"{image_note}\n\n{prompt}" if image_note else prompt]
+                    )
                     
                     # Handle different response structures
                     if not response:
@@ -1016,44 +999,40 @@ The farmer's input language is: {response_lang}. You MUST respond in {response_l
                         raise Exception("Empty reply from Gemini multimodal API")
                     
                     reply = reply.strip()
-                    print("Multimodal response generated successfully")
                 except ImportError:
                     # Part.from_data not available, try direct file path
                     try:
-                        response = gemini_model.generate_content([state["image_path"], prompt])
+                        response = llm_generate(gemini_model, [state["image_path"], prompt])
                         if hasattr(response, 'text') and response.text:
                             reply = response.text.strip()
                         else:
                             raise Exception("Could not extract text from response")
+                    except BulkheadFull:
+                        raise
                     except Exception as e2:
-                        print(f"Error with direct file path: {e2}")
+                        logger.warning("Error with direct file path: %s", e2)
                         # Last resort: base64 encoding
                         import base64
                         image_b64 = base64.b64encode(image_data).decode('utf-8')
                         data_uri = f"data:{mime_type};base64,{image_b64}"
-                        response = gemini_model.generate_content([data_uri, prompt])
+                        response = llm_generate(gemini_model, [data_uri, prompt])
                         if hasattr(response, 'text') and response.text:
                             reply = response.text.strip()
                         else:
                             raise Exception("Could not extract text from base64 response")
+                except BulkheadFull:
+                    raise
                 except Exception as e:
-                    print(f"Error with image in reasoning: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("Error with image in reasoning: %s", e)
                     reply = call_gemini_llm(prompt, system_instruction)
+            except BulkheadFull:
+                raise
             except Exception as e:
-                print(f"Error processing image with Gemini: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error processing image with Gemini: %s", e)
                 reply = call_gemini_llm(prompt, system_instruction)
         else:
-            print("[DEBUG] Reasoning node - generating text-only response...")
-            print(f"[DEBUG] Input type: {input_type}")
-            print(f"[DEBUG] Has transcript: {bool(transcript)}")
-            print(f"[DEBUG] Has image: {has_image}")
-            print(f"[DEBUG] Language: {language}")
+            logger.debug("Reasoning node: generating text-only %s response", input_type)
             reply = call_gemini_llm(prompt, system_instruction)
-            print("[DEBUG] Response generated successfully")
         
         if not reply or reply.strip() == "":
             raise Exception("Empty reply from call_gemini_llm")
@@ -1064,8 +1043,10 @@ The farmer's input language is: {response_lang}. You MUST respond in {response_l
         retry_count = 0
         
         while actual_lang != language and retry_count < max_retries:
-            print(f"[WARNING] Response language mismatch! Expected: {language}, Got: {actual_lang}")
-            print(f"[WARNING] Attempting to regenerate response (retry {retry_count + 1}/{max_retries})...")
+            logger.warning(
+                "Response language mismatch! Expected: %s, Got: %s - regenerating (retry %d/%d)",
+                language, actual_lang, retry_count + 1, max_retries,
+            )
             
             # Create a stronger prompt with explicit language correction
             response_lang_name = "Bengali (বাংলা)" if language == "bn" else "English"
@@ -1092,8 +1073,7 @@ Please regenerate your response in {response_lang_name} ONLY."""
                         mime_type = "image/jpeg"
                     
                     try:
-                        from google.generativeai.types import Part
-                        image_part = Part.from_data(data=image_data, mime_type=mime_type)
+                        image_parts, image_note = llm_image_parts(state, image_data, mime_type)
                         try:
                             model_with_system = genai.GenerativeModel(
                                 'models/gemini-2.5-flash',
@@ -1103,7 +1083,10 @@ Please regenerate your response in {response_lang_name} ONLY."""
                             model_with_system = gemini_model
                             correction_prompt = f"{system_instruction}\n\n{correction_prompt}"
                         
-                        response = model_with_system.generate_content([image_part, correction_prompt])
+                        response = llm_generate(
+                            model_with_system,
+                            [*image_parts, f"{image_note}\n\n{correction_prompt}" if image_note else correction_prompt]
+                        )
                         if hasattr(response, 'text') and response.text:
                             reply = response.text.strip()
                         elif hasattr(response, 'candidates') and response.candidates:
@@ -1112,6 +1095,8 @@ Please regenerate your response in {response_lang_name} ONLY."""
                                 reply = ''.join([part.text for part in candidate.content.parts if hasattr(part, 'text')]).strip()
                             elif hasattr(candidate, 'text'):
                                 reply = candidate.text.strip()
+                    except BulkheadFull:
+                        raise
                     except:
                         reply = call_gemini_llm(correction_prompt, system_instruction)
                 else:
@@ -1121,30 +1106,32 @@ Please regenerate your response in {response_lang_name} ONLY."""
                 retry_count += 1
                 
                 if actual_lang == language:
-                    print(f"[SUCCESS] Response regenerated successfully in correct language: {language}")
+                    logger.info("Response regenerated in correct language: %s", language)
                     break
+            except BulkheadFull as e:
+                # Keep the reply we have rather than queueing for a correction
+                logger.warning("Language retry skipped: %s", e)
+                break
             except Exception as retry_err:
-                print(f"[ERROR] Failed to regenerate response: {retry_err}")
+                logger.error("Failed to regenerate response: %s", retry_err)
                 break
         
-        # Final validation
-        final_lang = detect_language_from_text(reply)
-        if final_lang != language:
-            print(f"[ERROR] Response still in wrong language after {retry_count} retries. Expected: {language}, Got: {final_lang}")
-            print(f"[ERROR] Response preview: {reply[:300]}...")
-        else:
-            print(f"[SUCCESS] Response language validated: {language}")
-        
-        print(f"[DEBUG] Response length: {len(reply)} characters")
-        print(f"[DEBUG] Final response language: {final_lang} (expected: {language})")
+        # Final validation (actual_lang is the language of the current reply)
+        if actual_lang != language:
+            logger.error(
+                "Response still in wrong language after %d retries. Expected: %s, Got: %s",
+                retry_count, language, actual_lang,
+            )
+            logger.debug("Response preview: %s...", reply[:300])
+        logger.debug("Reasoning node: reply %d characters in %s", len(reply), actual_lang)
+    except BulkheadFull as e:
+        # One "busy" reply, no fallback LLM calls and no TTS (they would queue again)
+        logger.warning("Reasoning skipped: %s", e)
+        return {"reply_text": LLM_BUSY_REPLY.get(language, LLM_BUSY_REPLY["en"]), "language": language, "degraded": True}
     except Exception as e:
         error_msg = str(e)
         error_type = type(e).__name__
-        print(f"[ERROR] Reasoning node failed!")
-        print(f"[ERROR] Error type: {error_type}")
-        print(f"[ERROR] Error message: {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Reasoning node failed (%s): %s", error_type, error_msg)
         
         # Fallback response - always provide something helpful
         if transcript:
@@ -1176,77 +1163,73 @@ def tts_node(state: FarmState):
     """
     reply_text = state.get("reply_text", "")
     if not reply_text or reply_text.strip() == "":
-        print("[DEBUG] TTS node: No reply text, skipping TTS")
+        logger.debug("TTS node: No reply text, skipping TTS")
+        return {}
+    if state.get("degraded"):
+        logger.debug("TTS node: Server under load, skipping TTS")
         return {}
     
     # Get language from state (detected from input)
     lang = state.get("language", None)
     
-    # If language not in state, detect from reply text
-    if not lang or not isinstance(lang, str):
-        print("[DEBUG] TTS node: Language not in state, detecting from reply text")
-        lang = detect_language_from_text(reply_text)
-        print(f"[DEBUG] TTS node: Detected language from reply: {lang}")
-    else:
-        print(f"[DEBUG] TTS node: Using language from state: {lang}")
-    
-    # Validate that reply text matches the detected language
+    # Validate that reply text matches the detected language (or use it when the state has none)
     reply_lang = detect_language_from_text(reply_text)
-    if reply_lang != lang:
-        print(f"[WARNING] TTS node: Language mismatch! State lang: {lang}, Reply lang: {reply_lang}")
-        print(f"[WARNING] TTS node: Using reply text language for TTS: {reply_lang}")
+    if not lang or not isinstance(lang, str):
+        lang = reply_lang
+    elif reply_lang != lang:
+        logger.warning("TTS node: Language mismatch! State lang: %s, Reply lang: %s - using the reply's", lang, reply_lang)
         lang = reply_lang  # Use the actual language of the reply
     
     # Map language codes for gTTS (gTTS uses 'bn' for Bengali, 'en' for English)
     lang_map = {"bn": "bn", "en": "en", "bn-BD": "bn", "en-US": "en", "en-GB": "en"}
     tts_lang = lang_map.get(lang.lower() if lang else "en", "en")
     
-    print(f"[DEBUG] TTS node: Generating TTS in language: {tts_lang}")
-    print(f"[DEBUG] TTS node: Reply text length: {len(reply_text)} characters")
+    logger.debug("TTS node: Generating TTS in language %s for %d characters", tts_lang, len(reply_text))
     
     try:
         path = synthesize_tts(reply_text, lang=tts_lang)
         
         # Verify file exists before returning
         if not os.path.exists(path):
-            print(f"[ERROR] TTS file was returned but doesn't exist: {path}")
+            logger.error("TTS file was returned but doesn't exist: %s", path)
             raise Exception(f"TTS file not found at {path}")
         
-        file_size = os.path.getsize(path)
-        print(f"[DEBUG] TTS node: TTS generated successfully at: {path} (size: {file_size} bytes)")
+        logger.debug("TTS node: TTS generated at: %s", path)
+        # Don't hold the reply for the upload: until it lands tts_url is None and the
+        # client plays tts_path through /api/get_tts, which redirects once the object exists
+        get_storage_backend().offload(path)
         return {"tts_path": path}
+    except BulkheadFull as e:
+        # The text reply still goes out; retrying in English would only queue again
+        logger.warning("TTS node: Skipping TTS: %s", e)
+        return {}
     except Exception as e:
-        print(f"[ERROR] TTS generation failed: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("TTS generation failed: %s", e)
         # Try with English as fallback
         try:
-            print("[DEBUG] TTS node: Attempting fallback with English")
+            logger.debug("TTS node: Attempting fallback with English")
             path = synthesize_tts(reply_text[:500], lang="en")  # Limit length for fallback
             
             # Verify fallback file exists
             if os.path.exists(path):
-                file_size = os.path.getsize(path)
-                print(f"[DEBUG] TTS node: Fallback TTS generated at: {path} (size: {file_size} bytes)")
+                logger.debug("TTS node: Fallback TTS generated at: %s", path)
+                get_storage_backend().offload(path)
                 return {"tts_path": path}
             else:
-                print(f"[ERROR] TTS fallback file not found: {path}")
+                logger.error("TTS fallback file not found: %s", path)
                 return {}
         except Exception as e2:
-            print(f"[ERROR] TTS fallback also failed: {e2}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("TTS fallback also failed: %s", e2)
             return {}
 
 async def respond_node(state: FarmState):
     """
-    Persist conversation to database.
-    Gracefully handles database connection errors - the flow continues even if DB is unavailable.
+    Queue the conversation for persistence.
+    The write itself happens in the background (see app.persistence), so the reply
+    never waits on the database and the flow continues even if it is unavailable.
     """
-    from app.db import AsyncSessionLocal
-    from app.models.db_models import Conversation, User
-    from sqlalchemy import select
-    from sqlalchemy.exc import OperationalError
+    from datetime import datetime, timezone
+    from app.persistence import get_conversation_writer
     
     # Get user_id string from state
     user_id_str = state.get("user_id", "unknown")
@@ -1256,74 +1239,51 @@ async def respond_node(state: FarmState):
     confidence = vision_result.get("confidence") if vision_result else None
     media_url = state.get("image_path")  # Store image path if available
     
+    # Typed, indexed copies of the meta_data fields used for filtering (migration 0004)
+    crop = state.get("crop")
+    crop = crop.strip().lower() if isinstance(crop, str) and crop.strip() else None
+    language = state.get("language")
+    language = language.strip().lower() if isinstance(language, str) and language.strip() else None
+    gps = state.get("gps") or {}
+    
     try:
-        async with AsyncSessionLocal() as session:
-            try:
-                # Try to find or create user by external_id
-                user = None
-                if user_id_str and user_id_str != "unknown":
-                    result = await session.execute(
-                        select(User).where(User.external_id == user_id_str)
-                    )
-                    user = result.scalar_one_or_none()
-                    if not user:
-                        # Create new user if doesn't exist
-                        user = User(external_id=user_id_str)
-                        session.add(user)
-                        await session.flush()  # Flush to get the user.id
-                
-                # Create conversation record
-                conversation = Conversation(
-                    user_id=user.id if user else None,
-                    transcript=state.get("transcript", ""),
-                    tts_path=state.get("tts_path", ""),
-                    media_url=media_url,
-                    confidence=confidence,
-                    meta_data={
-                        "user_id": user_id_str,
-                        "crop": state.get("crop"),
-                        "gps": state.get("gps"),
-                        "language": state.get("language"),
-                        "vision_result": state.get("vision_result"),
-                        "weather_forecast": state.get("weather_forecast"),
-                    }
-                )
-                session.add(conversation)
-                await session.commit()
-                await session.refresh(conversation)
-                print(f"Successfully saved conversation to database for user: {user_id_str}")
-            except (OperationalError, ConnectionRefusedError) as db_error:
-                await session.rollback()
-                # Database connection error - log but don't fail
-                print(f"Database not available - conversation not saved: {db_error}")
-                print("Note: The assistant will still work, but conversation history won't be stored.")
-            except Exception as e:
-                await session.rollback()
-                # Other errors - log but don't fail the flow
-                print(f"Error persisting conversation: {e}")
-                import traceback
-                traceback.print_exc()
-    except (OperationalError, ConnectionRefusedError) as db_error:
-        # Database connection failed at session creation level
-        print(f"Database connection unavailable - conversation not saved: {db_error}")
-        print("Note: The assistant will still work, but conversation history won't be stored.")
+        get_conversation_writer().enqueue({
+            "external_id": user_id_str if user_id_str and user_id_str != "unknown" else None,
+            # Stamp the reply time here; the row may be inserted a little later
+            "created_at": datetime.now(timezone.utc),
+            "transcript": state.get("transcript", ""),
+            "tts_path": state.get("tts_path", ""),
+            "media_url": media_url,
+            "confidence": confidence,
+            "crop": crop,
+            "language": language,
+            "disease": vision_result.get("disease") if vision_result else None,
+            "lat": gps.get("lat"),
+            "lon": gps.get("lon"),
+            "meta_data": {
+                "user_id": user_id_str,
+                "crop": state.get("crop"),
+                "gps": state.get("gps"),
+                "language": state.get("language"),
+                "vision_result": to_json(state.get("vision_result")),
+                "weather_forecast": state.get("weather_forecast"),
+            },
+        })
     except Exception as e:
-        # Any other unexpected error
-        print(f"Unexpected error in respond_node: {e}")
-        import traceback
-        traceback.print_exc()
+        # Never fail the flow because of persistence
+        logger.exception("Unexpected error in respond_node: %s", e)
     
     return {}
 
 # Build graph
 graph = StateGraph(FarmState)
-graph.add_node("stt", stt_node)
-graph.add_node("intent", intent_node)
-graph.add_node("vision", vision_node)
-graph.add_node("weather", weather_node)
-graph.add_node("reason", reasoning_node)
-graph.add_node("tts", tts_node)
-graph.add_node("respond", respond_node)
+graph.add_node("stt", instrument_node("stt", stt_node))
+graph.add_node("intent", instrument_node("intent", intent_node))
+graph.add_node("vision", instrument_node("vision", vision_node))
+graph.add_node("weather", instrument_node("weather", weather_node))
+graph.add_node("reason", instrument_node("reason", reasoning_node))
+graph.add_node("tts", instrument_node("tts", tts_node))
+graph.add_node("respond", instrument_node("respond", respond_node))
 
 # Conditional: if audio provided -> stt, else -> intent (for text/image-only)
 def has_audio(state):
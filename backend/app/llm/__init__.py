@@ -1,7 +1,7 @@
 """
 LLM Provider Module
 
-Provides unified interface for multiple LLM providers.
+Provides unified interface for multiple LLM providers and speech-to-text backends.
 Switch providers by changing LLM_PROVIDER in .env file.
 """
 
@@ -17,6 +17,17 @@ from .provider import (
     get_llm_provider,
     init_llm_provider,
 )
+from .stt import (
+    BaseSTTBackend,
+    GeminiSTTBackend,
+    OpenAIWhisperBackend,
+    WhisperCppBackend,
+    StubSTTBackend,
+    register_stt_backend,
+    get_stt_backend,
+    select_backend,
+    transcribe,
+)
 
 __all__ = [
     "LLMProvider",
@@ -29,4 +40,13 @@ __all__ = [
     "get_llm_config",
     "get_llm_provider",
     "init_llm_provider",
+    "BaseSTTBackend",
+    "GeminiSTTBackend",
+    "OpenAIWhisperBackend",
+    "WhisperCppBackend",
+    "StubSTTBackend",
+    "register_stt_backend",
+    "get_stt_backend",
+    "select_backend",
+    "transcribe",
 ]
@@ -35,7 +35,7 @@ class LLMConfig:
         if self.provider not in [p.value for p in LLMProvider]:
             raise ValueError(f"Unknown LLM provider: {self.provider}")
         
-        logger.info(f"LLM Provider: {self.provider}")
+        logger.info("LLM Provider: %s", self.provider)
         
         # Load provider-specific configs
         if self.provider == LLMProvider.GEMINI:
@@ -122,7 +122,7 @@ class GeminiProvider(BaseLLMProvider):
             response = self.client.GenerativeModel(self.model).generate_content(final_prompt)
             return response.text
         except Exception as e:
-            logger.error(f"Gemini error: {e}")
+            logger.error("Gemini error: %s", e)
             raise
     
     def get_model_name(self) -> str:
@@ -169,7 +169,7 @@ class OpenAIProvider(BaseLLMProvider):
             
             return response.choices[0].message.content
         except Exception as e:
-            logger.error(f"OpenAI error: {e}")
+            logger.error("OpenAI error: %s", e)
             raise
     
     def get_model_name(self) -> str:
@@ -208,7 +208,7 @@ class AnthropicProvider(BaseLLMProvider):
             
             return response.content[0].text
         except Exception as e:
-            logger.error(f"Anthropic error: {e}")
+            logger.error("Anthropic error: %s", e)
             raise
     
     def get_model_name(self) -> str:
@@ -246,7 +246,7 @@ class CohereProvider(BaseLLMProvider):
             
             return response.message.content[0].text
         except Exception as e:
-            logger.error(f"Cohere error: {e}")
+            logger.error("Cohere error: %s", e)
             raise
     
     def get_model_name(self) -> str:
@@ -278,5 +278,5 @@ def init_llm_provider() -> BaseLLMProvider:
     global _provider
     if _provider is None:
         _provider = get_llm_provider()
-        logger.info(f"LLM Provider initialized: {_provider.get_model_name()}")
+        logger.info("LLM Provider initialized: %s", _provider.get_model_name())
     return _provider
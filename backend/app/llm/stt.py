@@ -0,0 +1,408 @@
+"""
+Speech-to-Text Backend Registry
+
+Transcription backends behind one interface, selected by STT_PROVIDER
+(LLMConfig.stt_provider):
+- gemini: Gemini multimodal model (default)
+- openai: OpenAI Whisper API
+- whisper_cpp: local CPU transcription with the whisper.cpp CLI
+- stub: deterministic local stub for tests and benchmarks (no network)
+
+STT_ROUTES sends some clips to another backend, by language hint and duration.
+Rules are comma separated, "<language>:<max seconds>=<backend>", "*" matching
+anything, first match wins, e.g.
+
+    STT_ROUTES=bn:20=whisper_cpp,*:5=whisper_cpp
+
+Clips no rule matches (or whose backend is not usable here) go to STT_PROVIDER,
+which is also the fallback when a routed backend fails. Register more backends
+with register_stt_backend().
+"""
+
+import hashlib
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from typing import Dict, List, Optional, Tuple, Type
+
+from dotenv import load_dotenv
+
+from app.audio import AUDIO_SAMPLE_RATE, FFMPEG_BIN, decode_pcm, record_stt_call
+from app.bulkhead import get_bulkhead
+from app.metrics import observe, record_payload
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STT_ROUTES = os.getenv("STT_ROUTES", "")
+GEMINI_STT_MODEL = os.getenv("GEMINI_STT_MODEL", os.getenv("GEMINI_MODEL", "models/gemini-2.5-flash"))
+OPENAI_STT_MODEL = os.getenv("OPENAI_STT_MODEL", "whisper-1")
+WHISPER_CPP_BIN = os.getenv("WHISPER_CPP_BIN", "whisper-cli")
+WHISPER_CPP_MODEL = os.getenv("WHISPER_CPP_MODEL", "models/ggml-base.bin")
+WHISPER_CPP_THREADS = int(os.getenv("WHISPER_CPP_THREADS", 4))
+WHISPER_CPP_TIMEOUT = float(os.getenv("WHISPER_CPP_TIMEOUT", 120))
+STT_STUB_LANGUAGE = os.getenv("STT_STUB_LANGUAGE", "")  # empty = detect from the stub text
+STT_STUB_LATENCY_MS = int(os.getenv("STT_STUB_LATENCY_MS", 0))
+
+# Common Bengali words, also written in Latin script by some farmers
+BENGALI_INDICATORS = [
+    "আমি", "তুমি", "আপনি", "কী", "কেন", "কখন", "কোথায়", "কিভাবে",
+    "ধন্যবাদ", "নমস্কার", "ফসল", "ধান", "আলু", "টমেটো", "রোগ", "পোকা",
+    "কৃষি", "চাষ", "জমি", "বীজ", "সার", "পানি", "বৃষ্টি", "সূর্য",
+    "কীটনাশক", "ফল", "শাক", "সবজি", "গাছ", "গাছপালা"
+]
+
+# Whisper reports language names; the app uses ISO codes
+_WHISPER_LANGUAGES = {"bengali": "bn", "bangla": "bn", "english": "en"}
+
+TRANSCRIPTION_PROMPT = """You are an expert audio transcription assistant specializing in Bengali (Bangla) and English languages, with particular expertise in agricultural terminology.
+
+CRITICAL TRANSCRIPTION RULES:
+1. LANGUAGE DETECTION:
+   - Listen carefully to identify if the speaker is using Bengali/Bangla or English
+   - Bengali uses the Bengali script (বাংলা) with Unicode range 0980-09FF
+   - If you hear Bengali words, transcribe in Bengali script
+   - If you hear English words, transcribe in English
+
+2. ACCURACY REQUIREMENTS:
+   - Transcribe EXACTLY what you hear - word for word
+   - Do NOT translate between languages
+   - Do NOT add words that weren't spoken
+   - Do NOT omit words that were spoken
+   - Preserve the exact pronunciation and meaning
+   - Handle regional accents (especially Bangladeshi Bengali dialect)
+
+3. AGRICULTURAL TERMINOLOGY:
+   - Be precise with crop names: ধান (rice), আলু (potato), টমেটো (tomato), গম (wheat)
+   - Accurately transcribe disease names: রোগ, পোকা, পাতা পোড়া
+   - Preserve technical farming terms in their original language
+
+4. OUTPUT FORMAT:
+   - Return ONLY the transcribed text
+   - No explanations, no additional commentary
+   - No language labels or prefixes
+   - Just the pure transcription
+
+Now transcribe the audio accurately:"""
+
+
+def detect_language(text: str) -> str:
+    """"bn" if the text has Bengali script or common Bengali words, else "en"."""
+    if not text:
+        return "en"
+    if any('\u0980' <= char <= '\u09FF' for char in text):  # Bengali Unicode range
+        return "bn"
+    if any(word in text for word in BENGALI_INDICATORS):
+        return "bn"
+    return "en"
+
+
+def _mime_type(audio_path: str) -> str:
+    import mimetypes
+    mime_type, _ = mimetypes.guess_type(audio_path)
+    # Default to webm if unknown
+    return mime_type or "audio/webm"
+
+
+class BaseSTTBackend:
+    """Abstract base class for speech-to-text backends"""
+
+    name = "base"
+
+    def available(self) -> bool:
+        """Whether the backend can run here (credentials, binaries, packages)"""
+        return True
+
+    def transcribe(self, audio_path: str, language_hint: Optional[str] = None) -> dict:
+        """Transcribe a file; returns {"text", "language"}. Raises on failure."""
+        raise NotImplementedError
+
+
+class GeminiSTTBackend(BaseSTTBackend):
+    """Gemini multimodal transcription"""
+
+    name = "gemini"
+
+    def __init__(self, model: str = GEMINI_STT_MODEL):
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise ImportError("google-generativeai not installed. Run: pip install google-generativeai")
+        # The API key is configured once per process (see farm_agent.langgraph_app)
+        if os.getenv("GEMINI_API_KEY"):
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.model = genai.GenerativeModel(model)
+
+    def transcribe(self, audio_path: str, language_hint: Optional[str] = None) -> dict:
+        with open(audio_path, 'rb') as f:
+            audio_data = f.read()
+        mime_type = _mime_type(audio_path)
+        # Pass file directly using Part.from_data
+        try:
+            from google.generativeai.types import Part
+            audio_part = Part.from_data(data=audio_data, mime_type=mime_type)
+            response = self.model.generate_content([audio_part, TRANSCRIPTION_PROMPT])
+        except ImportError:
+            # Fallback: try passing file path directly (may work in some versions)
+            try:
+                response = self.model.generate_content([audio_path, TRANSCRIPTION_PROMPT])
+            except Exception:
+                # Last resort: encode as base64 data URI
+                import base64
+                audio_b64 = base64.b64encode(audio_data).decode('utf-8')
+                response = self.model.generate_content([f"data:{mime_type};base64,{audio_b64}", TRANSCRIPTION_PROMPT])
+
+        if not response:
+            raise Exception("Empty response from Gemini transcription")
+        text = None
+        if hasattr(response, 'text') and response.text:
+            text = response.text
+        elif hasattr(response, 'candidates') and response.candidates:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                text = ''.join([part.text for part in candidate.content.parts if hasattr(part, 'text')])
+            elif hasattr(candidate, 'text'):
+                text = candidate.text
+        text = (text or "").strip()
+        return {"text": text, "language": detect_language(text)}
+
+
+class OpenAIWhisperBackend(BaseSTTBackend):
+    """OpenAI Whisper API transcription"""
+
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_STT_MODEL):
+        try:
+            from openai import OpenAI
+        except ImportError:
+            raise ImportError("openai not installed. Run: pip install openai")
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.client = OpenAI(api_key=self.api_key) if self.api_key else None
+        self.model = model
+
+    def available(self) -> bool:
+        return self.client is not None
+
+    def transcribe(self, audio_path: str, language_hint: Optional[str] = None) -> dict:
+        with open(audio_path, 'rb') as f:
+            kwargs = {"model": self.model, "file": f, "response_format": "verbose_json"}
+            if language_hint:
+                kwargs["language"] = language_hint
+            response = self.client.audio.transcriptions.create(**kwargs)
+        text = (response.text or "").strip()
+        language = _WHISPER_LANGUAGES.get(str(getattr(response, "language", "")).lower()) or detect_language(text)
+        return {"text": text, "language": language}
+
+
+class WhisperCppBackend(BaseSTTBackend):
+    """Local CPU transcription with the whisper.cpp CLI (no network, no API cost)"""
+
+    name = "whisper_cpp"
+
+    def __init__(self, binary: str = WHISPER_CPP_BIN, model: str = WHISPER_CPP_MODEL):
+        import shutil
+        self.binary = shutil.which(binary) or (binary if os.path.exists(binary) else None)
+        self.model = model
+
+    def available(self) -> bool:
+        return bool(self.binary and os.path.exists(self.model) and FFMPEG_BIN)
+
+    def transcribe(self, audio_path: str, language_hint: Optional[str] = None) -> dict:
+        # whisper.cpp reads 16 kHz mono WAV
+        fd, wav_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with wave.open(wav_path, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(AUDIO_SAMPLE_RATE)
+                wav.writeframes(decode_pcm(audio_path, AUDIO_SAMPLE_RATE))
+            completed = subprocess.run(
+                [
+                    self.binary, "-m", self.model, "-f", wav_path, "-t", str(WHISPER_CPP_THREADS),
+                    "-l", language_hint or "auto", "-nt", "-np",
+                ],
+                check=True, capture_output=True, timeout=WHISPER_CPP_TIMEOUT,
+            )
+        finally:
+            os.remove(wav_path)
+        text = " ".join(completed.stdout.decode(errors="ignore").split())
+        # e.g. "whisper_full_with_state: auto-detected language: bn (p = 0.91)" on stderr
+        match = re.search(r"auto-detected language: (\w+)", completed.stderr.decode(errors="ignore"))
+        language = language_hint or (match.group(1) if match else detect_language(text))
+        return {"text": text, "language": language}
+
+
+class StubSTTBackend(BaseSTTBackend):
+    """
+    Deterministic transcripts without any model: the text of a sidecar
+    "<audio>.txt" file if present, else a fixed text derived from the audio
+    content hash. STT_STUB_LATENCY_MS simulates upstream latency.
+    """
+
+    name = "stub"
+
+    def transcribe(self, audio_path: str, language_hint: Optional[str] = None) -> dict:
+        if STT_STUB_LATENCY_MS:
+            time.sleep(STT_STUB_LATENCY_MS / 1000)
+        sidecar = f"{audio_path}.txt"
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as f:
+                text = f.read().strip()
+        else:
+            # Hash the decoded samples: re-encoded copies of the same audio differ in container bytes
+            if FFMPEG_BIN:
+                data = decode_pcm(audio_path)
+            else:
+                with open(audio_path, "rb") as f:
+                    data = f.read()
+            text = f"stub transcript {hashlib.sha256(data).hexdigest()[:12]}"
+        return {"text": text, "language": STT_STUB_LANGUAGE or language_hint or detect_language(text)}
+
+
+STT_BACKENDS: Dict[str, Type[BaseSTTBackend]] = {
+    GeminiSTTBackend.name: GeminiSTTBackend,
+    OpenAIWhisperBackend.name: OpenAIWhisperBackend,
+    WhisperCppBackend.name: WhisperCppBackend,
+    StubSTTBackend.name: StubSTTBackend,
+}
+
+
+def register_stt_backend(name: str, backend: Type[BaseSTTBackend]):
+    """Make a backend selectable by STT_PROVIDER / STT_ROUTES"""
+    STT_BACKENDS[name] = backend
+
+
+_backends: Dict[str, BaseSTTBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_stt_backend(name: str) -> BaseSTTBackend:
+    """Get or create the backend instance for `name`"""
+    with _backends_lock:
+        if name not in _backends:
+            if name not in STT_BACKENDS:
+                raise ValueError(f"Unknown STT provider: {name}")
+            _backends[name] = STT_BACKENDS[name]()
+        return _backends[name]
+
+
+def default_stt_provider() -> str:
+    """LLMConfig.stt_provider (STT_PROVIDER)"""
+    from app.llm.provider import get_llm_config
+    try:
+        return get_llm_config().stt_provider.lower()
+    except ValueError:
+        # LLM provider misconfigured; STT does not depend on it
+        return os.getenv("STT_PROVIDER", "gemini").lower()
+
+
+Route = Tuple[str, Optional[float], str]
+
+
+def parse_routes(spec: str) -> List[Route]:
+    """"bn:20=whisper_cpp,*:5=stub" -> [("bn", 20.0, "whisper_cpp"), ("*", 5.0, "stub")]"""
+    routes = []
+    for rule in filter(None, (part.strip() for part in spec.split(","))):
+        condition, _, backend = rule.partition("=")
+        language, _, max_seconds = condition.partition(":")
+        if not backend:
+            raise ValueError(f"Invalid STT_ROUTES rule: {rule}")
+        routes.append((
+            language.strip() or "*",
+            None if max_seconds.strip() in ("", "*") else float(max_seconds),
+            backend.strip(),
+        ))
+    return routes
+
+
+_routes = parse_routes(STT_ROUTES)
+_unusable = set()  # routed backends that failed to load, skipped from then on
+
+
+def select_backend(duration: Optional[float] = None, language_hint: Optional[str] = None) -> str:
+    """Backend name for a clip of `duration` seconds (None = unknown) in `language_hint`"""
+    for language, max_seconds, backend in _routes:
+        if language != "*" and language != language_hint:
+            continue
+        if max_seconds is not None and (duration is None or duration > max_seconds):
+            continue
+        if backend in _unusable:
+            continue
+        try:
+            if get_stt_backend(backend).available():
+                return backend
+        except (ImportError, ValueError) as e:
+            _unusable.add(backend)
+            logger.warning("STT backend %s unusable, not routing to it: %s", backend, e)
+    return default_stt_provider()
+
+
+_stats_lock = threading.Lock()
+stt_stats: Dict[str, dict] = {}
+
+
+def _record(backend: str, seconds: float, audio_seconds: Optional[float], failed: bool):
+    with _stats_lock:
+        stats = stt_stats.setdefault(backend, {"requests": 0, "failures": 0, "seconds": 0.0, "audio_seconds": 0.0})
+        stats["requests"] += 1
+        stats["failures"] += failed
+        stats["seconds"] += seconds
+        stats["audio_seconds"] += audio_seconds or 0.0
+
+
+def _run(backend: str, audio_path: str, duration: Optional[float], language_hint: Optional[str]) -> dict:
+    started = time.monotonic()
+    try:
+        record_payload("stt", "sent", os.path.getsize(audio_path))
+        with get_bulkhead("stt"), observe("stt", backend):
+            result = get_stt_backend(backend).transcribe(audio_path, language_hint)
+        if not result.get("text"):
+            raise Exception(f"Empty transcription from {backend}")
+    except Exception:
+        _record(backend, time.monotonic() - started, duration, failed=True)
+        raise
+    elapsed = time.monotonic() - started
+    _record(backend, elapsed, duration, failed=False)
+    record_stt_call(os.path.getsize(audio_path), elapsed)
+    return {**result, "backend": backend}
+
+
+def transcribe(audio_path: str, duration: Optional[float] = None, language_hint: Optional[str] = None) -> dict:
+    """
+    Transcribe with the routed backend, falling back to STT_PROVIDER if it fails.
+    Returns {"text", "language", "backend"}; raises when every backend failed.
+    """
+    backend = select_backend(duration, language_hint)
+    default = default_stt_provider()
+    try:
+        return _run(backend, audio_path, duration, language_hint)
+    except Exception as e:
+        if backend == default:
+            raise
+        logger.warning("STT backend %s failed (%s), falling back to %s", backend, e, default)
+        return _run(default, audio_path, duration, language_hint)
+
+
+def stt_snapshot() -> dict:
+    with _stats_lock:
+        backends = {name: dict(stats) for name, stats in stt_stats.items()}
+    for stats in backends.values():
+        stats["seconds"] = round(stats["seconds"], 3)
+        stats["audio_seconds"] = round(stats["audio_seconds"], 2)
+        stats["avg_seconds"] = round(stats["seconds"] / stats["requests"], 3) if stats["requests"] else None
+        # Real-time factor: processing time per second of audio
+        stats["rtf"] = round(stats["seconds"] / stats["audio_seconds"], 3) if stats["audio_seconds"] else None
+    return {
+        "provider": default_stt_provider(),
+        "routes": [{"language": l, "max_seconds": s, "backend": b} for l, s, b in _routes],
+        "registered": sorted(STT_BACKENDS),
+        "backends": backends,
+    }
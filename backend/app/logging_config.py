@@ -0,0 +1,147 @@
+"""
+Structured logging.
+
+Every module logs through `logging.getLogger(__name__)` with %-style arguments
+(`logger.debug("Transcript: %r", transcript)`), so a message below the
+configured level is dropped before its arguments are formatted. configure_logging()
+installs one stderr handler on the root logger:
+
+- LOG_FORMAT=json (default) writes one JSON object per line with ts, level,
+  logger, msg, request_id, any `extra={...}` fields and the traceback;
+  LOG_FORMAT=text writes a plain line for local development.
+- LOG_LEVEL sets the root level; LOG_LEVELS overrides it per module, e.g.
+  LOG_LEVELS=app.farm_agent=DEBUG,app.db=WARNING.
+- LOG_DEBUG_SAMPLE_RATE keeps that fraction of DEBUG records. Sampling is
+  decided per request id, so a sampled request keeps its whole debug trace.
+
+The request id comes from the X-Request-ID header (or is generated) in the
+HTTP middleware in app.main and lives in a ContextVar, so it follows the request
+into LangGraph nodes, which run in the loop's executor with a copy of the
+context. Work handed to other thread pools should be submitted through
+contextvars.copy_context().run to keep the id.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+import zlib
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1.0))
+
+request_id_var: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Bind a request id (the client's, if sane, else a new one) to the current context."""
+    request_id = incoming if incoming and len(incoming) <= 128 and incoming.isprintable() else uuid.uuid4().hex
+    request_id_var.set(request_id)
+    return request_id
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """"app.farm_agent=DEBUG,app.db=WARNING" -> {"app.farm_agent": "DEBUG", "app.db": "WARNING"}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, level = item.partition("=")
+        if not sep or not name.strip() or not isinstance(logging.getLevelName(level.strip().upper()), int):
+            raise ValueError(f"Invalid LOG_LEVELS entry {item!r} (expected logger=LEVEL)")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps each record with the request id of the context that logged it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keeps `rate` of DEBUG records, all or nothing per request."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < self.rate
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+_configured = False
+
+
+def configure_logging(force: bool = False):
+    """Install the handler and levels from the environment; safe to call more than once."""
+    global _configured
+    if _configured and not force:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(RequestContextFilter())
+    if LOG_DEBUG_SAMPLE_RATE < 1.0:
+        handler.addFilter(DebugSampler(max(LOG_DEBUG_SAMPLE_RATE, 0.0)))
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+    # Library chatter stays at WARNING unless asked for explicitly
+    for name in ("urllib3", "httpx", "httpcore", "PIL", "multipart"):
+        if name not in LOG_LEVELS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+    _configured = True
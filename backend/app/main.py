@@ -1,51 +1,147 @@
-from fastapi import FastAPI, File, UploadFile, Form, Depends
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, Depends, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import logging
 import os
+import time
+from app.logging_config import configure_logging, new_request_id
+# Before the app modules below, some of which log while importing
+configure_logging()
 from app.farm_agent.langgraph_app import app as langgraph_app
 from app.api.utils import save_audio_local, save_image_local
 from dotenv import load_dotenv
 from app.api import routes as api_routes
-from app.db import get_db
+from app.db import get_read_db, execute_read, start_replica_monitor, stop_replica_monitor
+from app.storage import get_storage_backend
+from app.persistence import get_conversation_writer
+from app.retention import RETENTION_ENABLED, get_upload_retention
+from app.models.vision_pool import get_vision_pool
+from app.preload import get_preloader
+from app.models.vision_result import to_json
+from app.bulkhead import configure_default_executor
+from app.admission import Admission, Overloaded, admission_middleware, admit, overloaded_response
+from app.metrics import observe_http, render_metrics
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="KrishiBondhu API")
 
+# Innermost middleware (registered first): shed load before the body is parsed or dependencies run
+app.middleware("http")(admission_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Request-ID"],  # keyset cursor for /api/conversations, log correlation id
 )
 
 app.include_router(api_routes.router, prefix="/api")
 
+storage = get_storage_backend()
+
+def storage_url(path):
+    """Direct (presigned) URL for a stored file once the backend has it, else None."""
+    if not path:
+        return None
+    try:
+        return storage.url_for(path)
+    except Exception as e:
+        logger.warning("Could not build storage URL for %s: %s", path, e)
+        return None
+
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """Tag every log line of this request (including pipeline threads) with X-Request-ID."""
+    request_id = new_request_id(request.headers.get("X-Request-ID"))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route template (e.g. /api/upload_audio), not the raw path, to keep label cardinality bounded
+    route = request.scope.get("route")
+    observe_http(request.method, getattr(route, "path", "unmatched"), response.status_code, time.perf_counter() - started)
+    return response
+
+@app.get('/metrics')
+async def metrics():
+    """Prometheus metrics: node/external-call latency, errors, payload sizes, cache hits, load."""
+    rendered = render_metrics()
+    if rendered is None:
+        return PlainTextResponse("metrics disabled (METRICS_ENABLED=false or prometheus_client not installed)\n", status_code=503)
+    body, content_type = rendered
+    return Response(body, media_type=content_type)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Admission control rejected the request before any pipeline work was done."""
+    return overloaded_response(exc)
+
+@app.on_event("startup")
+async def start_background_writers():
+    # Sync LangGraph nodes run here; per-dependency bulkheads keep any one from filling it
+    configure_default_executor(asyncio.get_running_loop())
+    get_conversation_writer().start()
+    # Replica health is probed here, never inline on a request
+    start_replica_monitor()
+    if RETENTION_ENABLED:
+        get_upload_retention().start()
+    # Model loading / worker spawning runs in the background; /api/ready reports when done
+    get_preloader().start()
+
+@app.on_event("shutdown")
+async def drain_background_writers():
+    await get_preloader().stop()
+    await stop_replica_monitor()
+    await get_upload_retention().stop()
+    # Flush conversations still queued by respond_node before the worker exits
+    await get_conversation_writer().stop()
+    vision_pool = get_vision_pool()
+    if vision_pool is not None:
+        vision_pool.shutdown()
+
 @app.post('/api/upload_audio')
 async def upload_audio(
     file: UploadFile = File(...), 
     user_id: str = Form(...), 
     lat: float = Form(None), 
     lon: float = Form(None),
-    image: UploadFile = File(None)
+    image: UploadFile = File(None),
+    language: str = Form(None),
+    admission: Admission = Depends(admit)
 ):
     """
     Save uploaded audio file (and optional image), invoke the LangGraph flow, and return the resulting state.
+    `language` ("bn"/"en") is an optional hint used to route the recording to an STT backend.
     """
     audio_path = await save_audio_local(file)
+    storage.offload(audio_path)
     image_path = None
     if image:
         image_path = await save_image_local(image)
+        storage.offload(image_path)
     
     initial_state = {
         "audio_path": audio_path,
         "user_id": user_id,
         "gps": {"lat": lat, "lon": lon},
         "image_path": image_path,
-        "messages": []
+        "messages": [],
+        "degraded": admission.degraded
     }
+    if language:
+        initial_state["language"] = language
     try:
         # Use ainvoke for async nodes (respond_node is async)
         result = await langgraph_app.ainvoke(initial_state)
@@ -59,16 +155,19 @@ async def upload_audio(
             "reply_text": result.get("reply_text", ""),
             "crop": result.get("crop"),
             "language": result.get("language"),
-            "vision_result": result.get("vision_result"),
+            "vision_result": to_json(result.get("vision_result")),
+            "audio_stats": result.get("audio_stats"),
             "weather_forecast": result.get("weather_forecast"),
             "tts_path": result.get("tts_path"),
+            "tts_url": storage_url(result.get("tts_path")),
             "user_id": result.get("user_id", user_id),
-            "gps": result.get("gps", {"lat": lat, "lon": lon})
+            "gps": result.get("gps", {"lat": lat, "lon": lon}),
+            # Admitted degraded, or degraded mid-run (e.g. the LLM bulkhead was full)
+            "degraded": admission.degraded or bool(result.get("degraded"))
         }
         return JSONResponse(clean_result)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("/api/upload_audio failed: %s", e)
         # Return a helpful error response instead of crashing
         return JSONResponse({
             "error": str(e),
@@ -82,7 +181,8 @@ async def upload_image(
     user_id: str = Form(...),
     lat: float = Form(None),
     lon: float = Form(None),
-    question: str = Form("")
+    question: str = Form(""),
+    admission: Admission = Depends(admit)
 ):
     """
     Upload image for analysis. Can include optional text question.
@@ -91,12 +191,13 @@ async def upload_image(
     from app.farm_agent.langgraph_app import detect_language_from_text
     
     image_path = await save_image_local(image)
+    storage.offload(image_path)
     
     # CRITICAL: Detect language from question if provided
     detected_language = "en"
     if question:
         detected_language = detect_language_from_text(question)
-        print(f"[DEBUG] /api/upload_image: Question language detected: {detected_language}")
+        logger.debug("/api/upload_image: Question language detected: %s", detected_language)
     
     initial_state = {
         "audio_path": None,
@@ -105,7 +206,8 @@ async def upload_image(
         "image_path": image_path,
         "transcript": question,  # Use question as transcript if provided
         "language": detected_language,  # SET LANGUAGE HERE!
-        "messages": []
+        "messages": [],
+        "degraded": admission.degraded
     }
     try:
         # Skip STT if no audio, go directly to intent/vision
@@ -121,16 +223,18 @@ async def upload_image(
             "reply_text": result.get("reply_text", ""),
             "crop": result.get("crop"),
             "language": result.get("language"),
-            "vision_result": result.get("vision_result"),
+            "vision_result": to_json(result.get("vision_result")),
             "weather_forecast": result.get("weather_forecast"),
             "tts_path": result.get("tts_path"),
+            "tts_url": storage_url(result.get("tts_path")),
             "user_id": result.get("user_id", user_id),
-            "gps": result.get("gps", {"lat": lat, "lon": lon})
+            "gps": result.get("gps", {"lat": lat, "lon": lon}),
+            # Admitted degraded, or degraded mid-run (e.g. the LLM bulkhead was full)
+            "degraded": admission.degraded or bool(result.get("degraded"))
         }
         return JSONResponse(clean_result)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("/api/upload_image failed: %s", e)
         # Return a helpful error response instead of crashing
         return JSONResponse({
             "error": str(e),
@@ -147,7 +251,8 @@ async def chat(
     lon: float = Form(None),
     image: UploadFile = File(None),
     include_history: bool = Form(True),  # NEW: Option to include chat history
-    db: AsyncSession = Depends(get_db)
+    admission: Admission = Depends(admit),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Text-based chatbot endpoint. Can include optional image and chat history.
@@ -155,24 +260,26 @@ async def chat(
     # Import language detection function
     from app.farm_agent.langgraph_app import detect_language_from_text
     from sqlalchemy import select, desc
-    from app.models.db_models import Conversation
+    from app.models.db_models import Conversation, User
     
     image_path = None
     if image:
         image_path = await save_image_local(image)
+        storage.offload(image_path)
     
     # CRITICAL: Detect language from message BEFORE passing to workflow
     detected_language = detect_language_from_text(message)
-    print(f"[DEBUG] /api/chat: Message language detected: {detected_language}")
+    logger.debug("/api/chat: Message language detected: %s", detected_language)
     
     # NEW: Load chat history for context (last 5 conversations)
     messages = [{"role": "user", "content": message}]
-    if include_history and db:
+    if include_history:
         try:
-            # Query previous conversations for this user
-            result = await db.execute(
+            # Query previous conversations for this user (user_id is the farmer's external id)
+            result = await execute_read(
+                db,
                 select(Conversation)
-                .where(Conversation.user_id == user_id)
+                .where(Conversation.user_id == select(User.id).where(User.external_id == user_id).scalar_subquery())
                 .order_by(desc(Conversation.created_at))
                 .limit(5)  # Get last 5 conversations
             )
@@ -188,9 +295,9 @@ async def chat(
                 if conv.meta_data and conv.meta_data.get("reply_text"):
                     messages.insert(1, {"role": "assistant", "content": conv.meta_data.get("reply_text", "")})
             
-            print(f"[DEBUG] /api/chat: Loaded {len(previous_convs)} previous conversations for user {user_id}")
+            logger.debug("/api/chat: Loaded %s previous conversations for user %s", len(previous_convs), user_id)
         except Exception as e:
-            print(f"[DEBUG] /api/chat: Could not load history: {e}")
+            logger.debug("/api/chat: Could not load history: %s", e)
             # Continue without history if database fails
             pass
     
@@ -201,7 +308,8 @@ async def chat(
         "image_path": image_path,
         "transcript": message,  # Use message as transcript
         "language": detected_language,  # SET LANGUAGE HERE!
-        "messages": messages  # Now includes history if available
+        "messages": messages,  # Now includes history if available
+        "degraded": admission.degraded
     }
     try:
         # For text-only chat, skip STT and go to reasoning
@@ -216,16 +324,18 @@ async def chat(
             "reply_text": result.get("reply_text", ""),
             "crop": result.get("crop"),
             "language": result.get("language"),
-            "vision_result": result.get("vision_result"),
+            "vision_result": to_json(result.get("vision_result")),
             "weather_forecast": result.get("weather_forecast"),
             "tts_path": result.get("tts_path"),
+            "tts_url": storage_url(result.get("tts_path")),
             "user_id": result.get("user_id", user_id),
-            "gps": result.get("gps", {"lat": lat, "lon": lon})
+            "gps": result.get("gps", {"lat": lat, "lon": lon}),
+            # Admitted degraded, or degraded mid-run (e.g. the LLM bulkhead was full)
+            "degraded": admission.degraded or bool(result.get("degraded"))
         }
         return JSONResponse(clean_result)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("/api/chat failed: %s", e)
         # Return a helpful error response instead of crashing
         error_msg = str(e)
         return JSONResponse({
@@ -245,7 +355,7 @@ async def get_tts(path: str):
     Silently handles old temp files that no longer exist.
     """
     from urllib.parse import unquote
-    from app.api.utils import UPLOAD_DIR
+    from app.api.utils import UPLOAD_DIR, media_store
     import re
     from fastapi import Response
     
@@ -253,8 +363,8 @@ async def get_tts(path: str):
     decoded_path = unquote(path)
     filename = os.path.basename(decoded_path)
     
-    print(f"[DEBUG] get_tts requested: {decoded_path}")
-    print(f"[DEBUG] get_tts UPLOAD_DIR: {UPLOAD_DIR}")
+    logger.debug("get_tts requested: %s", decoded_path)
+    logger.debug("get_tts UPLOAD_DIR: %s", UPLOAD_DIR)
     
     # Check if this is an old temporary file pattern (from before the fix)
     # Pattern: tmp followed by alphanumeric characters and underscores, ending with .mp3
@@ -265,40 +375,47 @@ async def get_tts(path: str):
         not decoded_path.startswith('/tmp/uploads/')
     )
     
+    # Remote storage: send the client straight to the object instead of proxying bytes
+    # remote_url may call head_object (blocking boto3 I/O); keep it off the event loop
+    remote_url = await run_in_threadpool(storage.remote_url, decoded_path) if storage.name != "local" else None
+    if remote_url:
+        return RedirectResponse(remote_url, status_code=307)
+    
     # Check if file exists at the requested path
     if os.path.exists(decoded_path):
         file_size = os.path.getsize(decoded_path)
-        print(f"[DEBUG] get_tts: Serving file from requested path: {decoded_path} (size: {file_size} bytes)")
+        logger.debug("get_tts: Serving file from requested path: %s (size: %s bytes)", decoded_path, file_size)
         return FileResponse(decoded_path, media_type='audio/mpeg', filename=filename)
     
-    # If file not found, try to find it in UPLOAD_DIR (for backward compatibility)
-    upload_dir_path = os.path.join(UPLOAD_DIR, filename)
+    # If file not found, look it up by name in the sharded media store, then flat in
+    # UPLOAD_DIR (files written before content-addressed storage)
+    upload_dir_path = media_store.locate(filename) or os.path.join(UPLOAD_DIR, filename)
     
     if os.path.exists(upload_dir_path):
         file_size = os.path.getsize(upload_dir_path)
-        print(f"[DEBUG] get_tts: Serving file from UPLOAD_DIR: {upload_dir_path} (size: {file_size} bytes)")
+        logger.debug("get_tts: Serving file from UPLOAD_DIR: %s (size: %s bytes)", upload_dir_path, file_size)
         return FileResponse(upload_dir_path, media_type='audio/mpeg', filename=filename)
     
     # File not found - handle old temp files silently (they're expected to be missing)
     if is_old_temp_file:
         # Return 204 No Content instead of 404 to avoid uvicorn logging "404 Not Found"
         # This is a silent response that won't clutter the logs
-        print(f"[DEBUG] get_tts: Old temp file, returning 204: {decoded_path}")
+        logger.debug("get_tts: Old temp file, returning 204: %s", decoded_path)
         return Response(status_code=204)
     
     # New file that should exist but doesn't - log error for debugging
-    print(f"[ERROR] get_tts: File not found in requested path: {decoded_path}")
-    print(f"[ERROR] get_tts: File not found in UPLOAD_DIR: {upload_dir_path}")
-    print(f"[ERROR] get_tts: Requested directory exists: {os.path.exists(os.path.dirname(decoded_path)) if os.path.dirname(decoded_path) else 'N/A'}")
-    print(f"[ERROR] get_tts: UPLOAD_DIR exists: {os.path.exists(UPLOAD_DIR)}")
+    logger.error("get_tts: File not found in requested path: %s", decoded_path)
+    logger.error("get_tts: File not found in UPLOAD_DIR: %s", upload_dir_path)
+    logger.error("get_tts: Requested directory exists: %s", os.path.exists(os.path.dirname(decoded_path)) if os.path.dirname(decoded_path) else 'N/A')
+    logger.error("get_tts: UPLOAD_DIR exists: %s", os.path.exists(UPLOAD_DIR))
     
     # List files in UPLOAD_DIR for debugging
     if os.path.exists(UPLOAD_DIR):
         try:
             files_in_dir = os.listdir(UPLOAD_DIR)[:10]  # First 10 files
-            print(f"[ERROR] get_tts: Files in UPLOAD_DIR: {files_in_dir}")
+            logger.error("get_tts: Files in UPLOAD_DIR: %s", files_in_dir)
         except Exception as e:
-            print(f"[ERROR] get_tts: Could not list UPLOAD_DIR: {e}")
+            logger.error("get_tts: Could not list UPLOAD_DIR: %s", e)
     
     return JSONResponse({
         "error": "file not found", 
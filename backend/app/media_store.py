@@ -0,0 +1,124 @@
+"""
+Content-addressed, sharded media store.
+
+Files are named by the SHA-256 of their content and sharded two levels deep
+(`ab/cd/abcd....jpg`), so directories stay small and identical uploads (client
+retries, re-sent photos) and identical TTS replies are stored once. Writes go to
+a temp file under the store root and are renamed into place, so readers never
+see a partially written file. Re-storing existing content refreshes its mtime, which
+keeps it inside the retention window (see app.retention). The refresh and the
+retention sweep's delete are serialized across processes by a lock file in the
+store root (store_lock), so a path handed out by dedup is never deleted under it.
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Optional
+
+import aiofiles
+from fastapi.concurrency import run_in_threadpool
+
+TEMP_PREFIX = ".tmp-"
+LOCK_NAME = ".store.lock"
+CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def store_lock(root: str, exclusive: bool = False):
+    """
+    flock on the store's lock file: shared for dedup mtime refreshes, exclusive
+    for the retention sweep's re-check + delete. Works across worker processes.
+    """
+    fd = os.open(os.path.join(root, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
+
+
+class MediaStore:
+    def __init__(self, root: str, lock_root: Optional[str] = None):
+        self.root = root
+        # A store nested in another (e.g. UPLOAD_DIR/normalized) is swept with the
+        # outer store's lock, so it must refresh mtimes under that lock too
+        self.lock_root = lock_root or root
+        os.makedirs(root, exist_ok=True)
+        self.stats = {"stored": 0, "deduplicated": 0, "bytes_stored": 0, "bytes_deduplicated": 0}
+
+    def path_for(self, digest: str, suffix: str = "") -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{suffix}")
+
+    def locate(self, filename: str) -> Optional[str]:
+        """Sharded path of a stored file given only its basename, if it exists."""
+        digest = os.path.splitext(os.path.basename(filename))[0]
+        if len(digest) != 64:
+            return None
+        path = self.path_for(digest, os.path.splitext(filename)[1])
+        return path if os.path.exists(path) else None
+
+    def temp_path(self, suffix: str = "") -> str:
+        """A fresh temp file inside the store (same filesystem, so put_file can rename it)."""
+        fd, path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=suffix, dir=self.root)
+        os.close(fd)
+        return path
+
+    def _commit(self, tmp_path: str, digest: str, suffix: str, size: int) -> str:
+        dest = self.path_for(digest, suffix)
+        if os.path.exists(dest):
+            try:
+                with store_lock(self.lock_root):
+                    # Fresh mtime under the lock: the sweep re-checks it before deleting
+                    os.utime(dest)
+            except FileNotFoundError:
+                pass  # swept in the meantime; store our copy instead
+            else:
+                os.remove(tmp_path)
+                self.stats["deduplicated"] += 1
+                self.stats["bytes_deduplicated"] += size
+                return dest
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)
+        self.stats["stored"] += 1
+        self.stats["bytes_stored"] += size
+        return dest
+
+    def put_file(self, src_path: str, suffix: str = "") -> str:
+        """Move a finished local file (e.g. from temp_path()) into the store."""
+        digest = hashlib.sha256()
+        size = 0
+        with open(src_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        if os.path.dirname(os.path.abspath(src_path)) != os.path.abspath(self.root):
+            # Stage files from elsewhere under root first so the final rename is atomic
+            tmp_path = self.temp_path(suffix)
+            shutil.move(src_path, tmp_path)
+            src_path = tmp_path
+        return self._commit(src_path, digest.hexdigest(), suffix, size)
+
+    async def put_upload(self, upload_file, suffix: str = "") -> str:
+        """Stream a FastAPI UploadFile into the store, hashing as it is written."""
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.temp_path(suffix)
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while True:
+                    chunk = await upload_file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await out.write(chunk)
+            # _commit may wait on the store lock (flock) behind a retention sweep; keep it off the event loop
+            return await run_in_threadpool(self._commit, tmp_path, digest.hexdigest(), suffix, size)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
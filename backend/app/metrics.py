@@ -0,0 +1,483 @@
+"""
+Prometheus instrumentation.
+
+Latency histograms and error counters for every LangGraph node
+(instrument_node) and every external call (observe(): Gemini, STT backends,
+gTTS, Open-Meteo, the database, YOLO), payload sizes sent to / received from
+external services, and HTTP request latency per route. Cache hit counters,
+bulkhead and admission state are not counted twice: a collector reads the
+existing stats snapshots at scrape time. Everything is served in Prometheus
+text format at GET /metrics.
+
+prometheus_client is optional; without it (or with METRICS_ENABLED=false) the
+helpers are no-ops and /metrics answers 503. For multi-worker gunicorn set
+PROMETHEUS_MULTIPROC_DIR so every worker's samples are aggregated.
+"""
+import functools
+import inspect
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# prometheus_client is optional; metrics are simply not recorded without it
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true" and PROMETHEUS_AVAILABLE
+METRICS_PREFIX = "krishibondhu"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))  # 1 KiB .. 64 MiB
+SQL_VERBS = {"select", "insert", "update", "delete", "with"}
+
+if METRICS_ENABLED:
+    NODE_SECONDS = Histogram(
+        f"{METRICS_PREFIX}_node_seconds", "LangGraph node latency", ["node"], buckets=LATENCY_BUCKETS,
+    )
+    NODE_ERRORS = Counter(f"{METRICS_PREFIX}_node_errors_total", "LangGraph node exceptions", ["node"])
+    EXTERNAL_SECONDS = Histogram(
+        f"{METRICS_PREFIX}_external_call_seconds", "External call latency", ["dependency", "operation"],
+        buckets=LATENCY_BUCKETS,
+    )
+    EXTERNAL_ERRORS = Counter(
+        f"{METRICS_PREFIX}_external_call_errors_total", "External call failures", ["dependency", "operation"],
+    )
+    PAYLOAD_BYTES = Histogram(
+        f"{METRICS_PREFIX}_payload_bytes", "Payload sizes to/from external services", ["dependency", "direction"],
+        buckets=SIZE_BUCKETS,
+    )
+    HTTP_SECONDS = Histogram(
+        f"{METRICS_PREFIX}_http_request_seconds", "HTTP request latency", ["method", "route", "status"],
+        buckets=LATENCY_BUCKETS,
+    )
+
+
+@contextmanager
+def observe(dependency: str, operation: str = "call"):
+    """Time an external call; exceptions are counted as errors and re-raised."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        EXTERNAL_ERRORS.labels(dependency, operation).inc()
+        raise
+    finally:
+        EXTERNAL_SECONDS.labels(dependency, operation).observe(time.perf_counter() - started)
+
+
+def record_call(dependency: str, operation: str, seconds: float, error: bool = False):
+    """Record an external call timed elsewhere (callbacks, event hooks)."""
+    if not METRICS_ENABLED:
+        return
+    EXTERNAL_SECONDS.labels(dependency, operation).observe(seconds)
+    if error:
+        EXTERNAL_ERRORS.labels(dependency, operation).inc()
+
+
+def record_payload(dependency: str, direction: str, size: Optional[int]):
+    """direction: "sent" or "received"."""
+    if METRICS_ENABLED and size is not None:
+        PAYLOAD_BYTES.labels(dependency, direction).observe(size)
+
+
+def instrument_node(name: str, fn):
+    """Wrap a LangGraph node (sync or async) with latency and error metrics."""
+    if not METRICS_ENABLED:
+        return fn
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_node(state):
+            started = time.perf_counter()
+            try:
+                return await fn(state)
+            except BaseException:
+                NODE_ERRORS.labels(name).inc()
+                raise
+            finally:
+                NODE_SECONDS.labels(name).observe(time.perf_counter() - started)
+        return async_node
+
+    @functools.wraps(fn)
+    def node(state):
+        started = time.perf_counter()
+        try:
+            return fn(state)
+        except BaseException:
+            NODE_ERRORS.labels(name).inc()
+            raise
+        finally:
+            NODE_SECONDS.labels(name).observe(time.perf_counter() - started)
+    return node
+
+
+def observe_http(method: str, route: str, status: int, seconds: float):
+    if METRICS_ENABLED:
+        HTTP_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+
+def instrument_engine(engine, name: str = "primary"):
+    """Time every statement on a SQLAlchemy (async) engine as a "db" external call."""
+    if not METRICS_ENABLED or engine is None:
+        return
+    from sqlalchemy import event
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def _finish(conn, statement, error):
+        # Never raise from here: SQLAlchemy would report our exception in place of the
+        # statement's own error (and callers match on OperationalError for outages)
+        try:
+            if conn is None:
+                return  # the connection itself failed; nothing was timed
+            started = conn.info.get("metrics_started")
+            if started:
+                verb = statement.lstrip().split(None, 1)[0].lower() if statement and statement.strip() else ""
+                operation = f"{name}:{verb if verb in SQL_VERBS else 'other'}"
+                record_call("db", operation, time.perf_counter() - started.pop(), error)
+        except Exception:
+            logger.debug("Could not record DB statement metrics", exc_info=True)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn, statement, False)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        _finish(context.connection, context.statement, True)
+
+
+class SnapshotCollector:
+    """
+    Exposes the existing stats snapshots (caches, bulkheads, admission, DB pool,
+    upload retention, media pipelines, worker memory) at scrape time.
+
+    The snapshots are per process. With per_process=True (multi-worker
+    gunicorn, where any worker may answer a scrape) every sample carries a
+    "pid" label and counters are exported as gauges named like their _total
+    series, so a scrape served by another worker shows up as a separate series
+    instead of an apparent counter reset; aggregate with sum without (pid).
+    """
+
+    def __init__(self, per_process: bool = False):
+        self.pid = str(os.getpid()) if per_process else None
+
+    def _family(self, kind, name: str, documentation: str, labels=None, value=None):
+        labels = list(labels or [])
+        if self.pid is not None:
+            if kind is CounterMetricFamily:
+                kind, name = GaugeMetricFamily, f"{name}_total"
+            family = kind(name, documentation, labels=[*labels, "pid"])
+            if value is not None:
+                family.add_metric([self.pid], value)
+            return family
+        if labels:
+            return kind(name, documentation, labels=labels)
+        return kind(name, documentation, value=value)
+
+    def _add(self, family, labels, value):
+        family.add_metric([*labels, self.pid] if self.pid is not None else labels, value)
+
+    def collect(self):
+        yield from self._caches()
+        yield from self._bulkheads()
+        yield from self._admission()
+        yield from self._database()
+        yield from self._uploads()
+        yield from self._media()
+        yield from self._memory()
+
+    def _caches(self):
+        from app.audio import audio_snapshot
+        from app.models.vision_cache import get_vision_cache
+        from app.transcript_cache import transcript_cache_snapshot
+
+        hits = self._family(CounterMetricFamily, f"{METRICS_PREFIX}_cache_hits", "Cache hits", labels=["cache"])
+        misses = self._family(CounterMetricFamily, f"{METRICS_PREFIX}_cache_misses", "Cache misses", labels=["cache"])
+        vision_cache = get_vision_cache()
+        if vision_cache is not None:
+            stats = vision_cache.snapshot()
+            self._add(hits, ["vision"], stats["hits"])
+            self._add(misses, ["vision"], stats["misses"])
+            yield self._family(
+                CounterMetricFamily,
+                f"{METRICS_PREFIX}_vision_cache_near_hits", "Vision cache hits on a near-duplicate image",
+                value=stats["near_hits"],
+            )
+            yield self._family(
+                GaugeMetricFamily,
+                f"{METRICS_PREFIX}_vision_cache_entries", "Vision cache entries",
+                value=stats["entries"],
+            )
+        transcripts = transcript_cache_snapshot()
+        if transcripts["enabled"]:
+            self._add(hits, ["transcript"], transcripts["hits"] + transcripts["pcm_hits"] + transcripts["coalesced"])
+            self._add(misses, ["transcript"], transcripts["misses"])
+        audio = audio_snapshot()
+        self._add(hits, ["normalized_audio"], audio["cache_hits"])
+        self._add(misses, ["normalized_audio"], audio["normalized"])
+        yield hits
+        yield misses
+
+    def _bulkheads(self):
+        from app.bulkhead import bulkheads_snapshot
+
+        active = self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_bulkhead_active", "Calls running per dependency", labels=["dependency"],
+        )
+        waiting = self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_bulkhead_waiting", "Calls queued per dependency", labels=["dependency"],
+        )
+        rejected = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_bulkhead_rejected", "Calls rejected by a full bulkhead", labels=["dependency"],
+        )
+        for name, stats in bulkheads_snapshot()["bulkheads"].items():
+            self._add(active, [name], stats["active"])
+            self._add(waiting, [name], stats["waiting"])
+            self._add(rejected, [name], stats["rejected"] + stats["timeouts"])
+        yield active
+        yield waiting
+        yield rejected
+
+    def _admission(self):
+        from app.admission import admission_snapshot
+
+        admission = admission_snapshot()
+        if not admission["enabled"]:
+            return
+        yield self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_pipeline_running", "Pipeline runs in flight",
+            value=admission["running"],
+        )
+        yield self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_pipeline_waiting", "Pipeline runs queued",
+            value=admission["waiting"],
+        )
+        yield self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_admission_estimated_wait_seconds", "Estimated queue wait for a new pipeline run",
+            value=admission["estimated_wait_seconds"],
+        )
+        outcomes = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_admission_requests", "Admission decisions", labels=["outcome"],
+        )
+        self._add(outcomes, ["admitted"], admission["admitted"] - admission["degraded"])
+        self._add(outcomes, ["degraded"], admission["degraded"])
+        self._add(outcomes, ["rejected"], admission["rejected"])
+        yield outcomes
+        # Goodput = completed_within_slo / (admitted + rejected)
+        completed = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_pipeline_completed", "Pipeline runs finished", labels=["within_slo"],
+        )
+        self._add(completed, ["true"], admission["completed_within_slo"])
+        self._add(completed, ["false"], admission["completed"] - admission["completed_within_slo"])
+        yield completed
+
+    def _database(self):
+        from app.db import pool_stats, replica_stats
+
+        pool = pool_stats()
+        yield self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_db_pool_in_use", "Primary pool connections checked out",
+            value=pool["in_use"],
+        )
+        yield self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_db_pool_peak_in_use", "Most primary pool connections checked out at once",
+            value=pool["peak_in_use"],
+        )
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_db_pool_checkouts", "Primary pool checkouts",
+            value=pool["checkouts"],
+        )
+        if "size" in pool:
+            yield self._family(GaugeMetricFamily, f"{METRICS_PREFIX}_db_pool_size", "Primary pool size", value=pool["size"])
+            yield self._family(
+                GaugeMetricFamily,
+                f"{METRICS_PREFIX}_db_pool_overflow", "Primary pool overflow connections",
+                value=pool["overflow"],
+            )
+        replica = replica_stats()
+        if replica["configured"]:
+            yield self._family(
+                GaugeMetricFamily,
+                f"{METRICS_PREFIX}_db_replica_usable", "1 when reads go to the replica", value=int(replica["usable"]),
+            )
+            if replica["lag"] is not None:
+                yield self._family(
+                    GaugeMetricFamily,
+                    f"{METRICS_PREFIX}_db_replica_lag_seconds", "Replica replay lag",
+                    value=replica["lag"],
+                )
+            yield self._family(
+                CounterMetricFamily,
+                f"{METRICS_PREFIX}_db_replica_fallbacks", "Reads sent to the primary instead of the replica",
+                value=replica["fallbacks"],
+            )
+
+    def _uploads(self):
+        from app.retention import RETENTION_ENABLED, get_upload_retention
+
+        if not RETENTION_ENABLED:
+            return
+        stats = get_upload_retention().stats
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_retention_sweeps", "Upload retention sweeps",
+            value=stats["sweeps"],
+        )
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_retention_deleted_files", "Files deleted from UPLOAD_DIR", value=stats["files_deleted"],
+        )
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_retention_reclaimed_bytes", "Bytes reclaimed from UPLOAD_DIR", value=stats["bytes_reclaimed"],
+        )
+        if stats["bytes_in_use"] is not None:
+            yield self._family(
+                GaugeMetricFamily,
+                f"{METRICS_PREFIX}_uploads_bytes", "Bytes in UPLOAD_DIR after the last sweep", value=stats["bytes_in_use"],
+            )
+        if stats["last_sweep_seconds"] is not None:
+            yield self._family(
+                GaugeMetricFamily,
+                f"{METRICS_PREFIX}_retention_last_sweep_seconds", "Duration of the last sweep",
+                value=stats["last_sweep_seconds"],
+            )
+
+    def _media(self):
+        from app.audio import audio_snapshot
+        from app.farm_agent.image_roi import roi_snapshot
+        from app.llm.stt import stt_snapshot
+        from app.vad import vad_snapshot
+
+        roi = roi_snapshot()
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_roi_images", "Images prepared for the multimodal LLM",
+            value=roi["images"],
+        )
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_roi_parts", "Image parts sent (overview + crops)",
+            value=roi["parts_sent"],
+        )
+        roi_bytes = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_roi_bytes", "Image bytes uploaded vs sent to the LLM", labels=["stage"],
+        )
+        self._add(roi_bytes, ["original"], roi["bytes_original"])
+        self._add(roi_bytes, ["sent"], roi["bytes_sent"])
+        yield roi_bytes
+
+        audio = audio_snapshot()
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_audio_normalize_failures", "Audio normalizations that failed", value=audio["failures"],
+        )
+        audio_bytes = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_audio_normalized_bytes", "Audio bytes before and after normalization", labels=["stage"],
+        )
+        self._add(audio_bytes, ["in"], audio["bytes_in"])
+        self._add(audio_bytes, ["out"], audio["bytes_out"])
+        yield audio_bytes
+
+        vad = vad_snapshot()
+        recordings = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_vad_recordings", "Recordings through VAD", labels=["outcome"],
+        )
+        self._add(recordings, ["rejected_empty"], vad["rejected_empty"])
+        self._add(recordings, ["split"], vad["split"])
+        self._add(recordings, ["single"], vad["recordings"] - vad["rejected_empty"] - vad["split"])
+        yield recordings
+        yield self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_vad_chunks", "Speech chunks transcribed",
+            value=vad["chunks"],
+        )
+        vad_seconds = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_vad_audio_seconds", "Seconds of audio before and after trimming silence", labels=["stage"],
+        )
+        self._add(vad_seconds, ["in"], vad["seconds_in"])
+        self._add(vad_seconds, ["kept"], vad["seconds_kept"])
+        yield vad_seconds
+
+        # Real-time factor per backend: external_call_seconds_sum{dependency="stt"} / stt_audio_seconds
+        stt_audio = self._family(
+            CounterMetricFamily,
+            f"{METRICS_PREFIX}_stt_audio_seconds", "Seconds of audio transcribed per STT backend", labels=["backend"],
+        )
+        for name, stats in stt_snapshot()["backends"].items():
+            self._add(stt_audio, [name], stats["audio_seconds"])
+        yield stt_audio
+
+    def _memory(self):
+        from app.prefork import memory_usage
+
+        try:
+            usage = memory_usage()
+        except OSError:
+            return  # no /proc (non-Linux)
+        memory = self._family(
+            GaugeMetricFamily,
+            f"{METRICS_PREFIX}_worker_memory_bytes", "Memory of the scraped worker", labels=["kind"],
+        )
+        for kind in ("rss", "pss", "uss", "shared"):
+            self._add(memory, [kind], usage[f"{kind}_mb"] * 1024 * 1024)
+        yield memory
+
+
+_registry = None
+
+
+def _get_registry():
+    global _registry
+    if _registry is None:
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            _registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(_registry)
+            _registry.register(SnapshotCollector(per_process=True))
+        else:
+            from prometheus_client import REGISTRY
+            _registry = REGISTRY
+            _registry.register(SnapshotCollector())
+    return _registry
+
+
+def render_metrics():
+    """(body, content type) for GET /metrics, or None when metrics are unavailable."""
+    if not METRICS_ENABLED:
+        return None
+    return generate_latest(_get_registry()), CONTENT_TYPE_LATEST
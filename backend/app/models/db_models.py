@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Float, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Float, Index, func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -18,4 +18,19 @@ class Conversation(Base):
     media_url = Column(String, nullable=True)  # Added in migration 0002
     confidence = Column(Float, nullable=True)  # Added in migration 0002
     meta_data = Column(JSON, nullable=True)  # Renamed from 'metadata' to avoid SQLAlchemy conflict
+    # Promoted from meta_data in migration 0004 so they can be filtered via indexes
+    crop = Column(String, nullable=True)  # lower-cased crop name from intent extraction
+    language = Column(String(8), nullable=True)
+    disease = Column(String, nullable=True)  # vision_result["disease"]
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Keyset pagination for /api/conversations (added in migration 0003)
+        Index("ix_conversations_created_at_id", "created_at", "id"),
+        Index("ix_conversations_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_conversations_crop_language_created_at", "crop", "language", "created_at", "id"),
+        Index("ix_conversations_language_created_at", "language", "created_at", "id"),
+        Index("ix_conversations_disease_created_at", "disease", "created_at", "id"),
+    )
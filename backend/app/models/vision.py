@@ -2,17 +2,47 @@
 YOLOv8-based demo inference. Uses ultralytics.YOLO.
 This is an integration demo; you should replace with a domain-specific classifier for crop diseases.
 """
+import logging
 import os
-import torch
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import numpy as np
+from dotenv import load_dotenv
 
-# Try to import ultralytics, but make it optional
-try:
-    from ultralytics import YOLO
-    import numpy as np
-    ULTRALYTICS_AVAILABLE = True
-except ImportError:
-    ULTRALYTICS_AVAILABLE = False
-    print("Warning: ultralytics not installed. Vision features will be disabled.")
+from app.metrics import observe
+from app.models.vision_result import VisionResult
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "torch" (ultralytics/PyTorch) or "onnx" (ONNX Runtime, see app.models.vision_onnx)
+VISION_BACKEND = os.getenv("VISION_BACKEND", "torch").lower()
+# Detector weights for both backends (the ONNX model is exported from them)
+VISION_MODEL_WEIGHTS = os.getenv("VISION_MODEL_WEIGHTS", "yolov8n.pt")
+
+# Try to import ultralytics, but make it optional. The ONNX backend doesn't need
+# it (or torch) at runtime, so skip the import there to keep workers small.
+ULTRALYTICS_AVAILABLE = False
+if VISION_BACKEND != "onnx":
+    try:
+        import torch
+        from ultralytics import YOLO
+        ULTRALYTICS_AVAILABLE = True
+    except ImportError:
+        logger.warning("ultralytics not installed. Vision features will be disabled.")
+
+# Micro-batching of concurrent requests (see VisionBatcher)
+VISION_BATCHING = os.getenv("VISION_BATCHING", "true").lower() == "true"
+VISION_MAX_BATCH = int(os.getenv("VISION_MAX_BATCH", 8))
+VISION_MAX_WAIT = float(os.getenv("VISION_MAX_WAIT_MS", 15)) / 1000
+# Bound on queued images; beyond it requests fail fast instead of piling up
+VISION_QUEUE_SIZE = int(os.getenv("VISION_QUEUE_SIZE", 64))
+VISION_QUEUE_TIMEOUT = float(os.getenv("VISION_QUEUE_TIMEOUT", 5))
+# Upper bound on waiting for a batched / worker result, so a hung worker can't block a request forever
+VISION_RESULT_TIMEOUT = float(os.getenv("VISION_RESULT_TIMEOUT", 30))
 
 # Load model lazily to avoid long startup time during imports
 _MODEL = None
@@ -38,12 +68,12 @@ def _get_model():
                 # try to set weights_only=False via environment or monkey patch
                 pass
             
-            # yolov8n.pt will be auto-downloaded by ultralytics the first time
-            _MODEL = YOLO("yolov8n.pt")
+            # Stock names like yolov8n.pt are auto-downloaded by ultralytics the first time
+            _MODEL = YOLO(VISION_MODEL_WEIGHTS)
         except Exception as e:
             error_msg = str(e)
             _MODEL_ERROR = error_msg
-            print(f"Error loading YOLOv8 model: {error_msg}")
+            logger.error("Error loading YOLOv8 model: %s", error_msg)
             # If it's a weights_only error, try to work around it
             if "weights_only" in error_msg.lower() or "WeightsUnpickler" in error_msg:
                 try:
@@ -55,11 +85,11 @@ def _get_model():
                         return original_load(*args, **kwargs)
                     # Temporarily replace torch.load
                     torch.load = patched_load
-                    _MODEL = YOLO("yolov8n.pt")
+                    _MODEL = YOLO(VISION_MODEL_WEIGHTS)
                     # Restore original
                     torch.load = original_load
                     _MODEL_ERROR = None
-                    print("Successfully loaded YOLOv8 model with workaround")
+                    logger.info("Successfully loaded YOLOv8 model with workaround")
                 except Exception as e2:
                     _MODEL_ERROR = f"Failed to load model even with workaround: {str(e2)}"
                     return None, _MODEL_ERROR
@@ -68,54 +98,224 @@ def _get_model():
     
     return _MODEL, None
 
+def warmup(runs: int = 1) -> float:
+    """
+    Load the model and run `runs` predicts on a blank image so weight loading
+    (and a possible download) plus first-inference setup happen before real
+    traffic. Returns the seconds spent; raises if the model cannot be loaded.
+    """
+    started = time.monotonic()
+    dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+    if VISION_BACKEND == "onnx":
+        from app.models.vision_onnx import get_onnx_detector
+        detector = get_onnx_detector()
+        for _ in range(runs):
+            detector.predict_arrays([dummy])
+        return time.monotonic() - started
+    model, error = _get_model()
+    if model is None:
+        raise RuntimeError(error or "ultralytics not installed")
+    for _ in range(runs):
+        model.predict(source=dummy, imgsz=640, conf=0.25, verbose=False)
+    return time.monotonic() - started
+
+
+def _format_result(res) -> VisionResult:
+    """Map one ultralytics Results object to a compact VisionResult (no per-box Python objects)."""
+    boxes = res.boxes
+    height, width = res.orig_shape[:2]
+    return VisionResult.from_detections(
+        boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(), (width, height)
+    )
+
+
+def _format_detections(detections) -> VisionResult:
+    """Same as _format_result for (xyxy, confidences, classes, (width, height)) from the ONNX backend."""
+    xyxy, confidences, classes, image_size = detections
+    return VisionResult.from_detections(xyxy, confidences, classes, image_size)
+
+
+MISSING_RESULT_ERROR = "No detector result for this image"
+
+
+def _error_result(error_msg: str) -> VisionResult:
+    return VisionResult.failure(error_msg)
+
+
+def predict_batch(image_paths: list) -> list:
+    """
+    Run the detector on several images in one model.predict call.
+    Returns one VisionResult per path, in order.
+    """
+    if VISION_BACKEND == "onnx":
+        from app.models.vision_onnx import get_onnx_detector
+        try:
+            detector = get_onnx_detector()
+        except Exception as e:
+            return [_error_result(str(e)) for _ in image_paths]
+        predict, format_result = detector.predict, _format_detections
+    else:
+        model, error = _get_model()
+        if model is None:
+            return [_error_result(error or "Model not available") for _ in image_paths]
+        predict = lambda paths: model.predict(source=paths, imgsz=640, conf=0.25, verbose=False)
+        format_result = _format_result
+    try:
+        results = predict(list(image_paths))
+    except Exception as e:
+        if len(image_paths) > 1:
+            # One unreadable image shouldn't fail every request in the batch
+            return [predict_batch([path])[0] for path in image_paths]
+        return [_error_result(str(e))]
+    formatted = [format_result(res) for res in results]
+    # ultralytics returns one Results per input; pad defensively if it didn't (with an
+    # error, so the vision cache never stores the placeholder)
+    formatted += [VisionResult.failure(MISSING_RESULT_ERROR, label="unknown")] * (len(image_paths) - len(formatted))
+    return formatted
+
+
+class VisionBatcher:
+    """
+    In-process micro-batching for concurrent vision requests.
+    Requests arriving within `max_wait` of the first one (up to `max_batch`)
+    are run as a single batched predict and the results are fanned back out to
+    the waiting callers. Batches run on the batcher thread, or in the vision
+    worker processes when VISION_WORKERS > 0 (see app.models.vision_pool).
+    """
+
+    def __init__(self, max_batch: int = VISION_MAX_BATCH, max_wait: float = VISION_MAX_WAIT, queue_size: int = VISION_QUEUE_SIZE):
+        from app.models.vision_pool import get_vision_pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pool = get_vision_pool()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "max_batch_seen": 0, "rejected": 0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="vision-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, image_path: str) -> Future:
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put((image_path, future), timeout=VISION_QUEUE_TIMEOUT)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            future.set_result(_error_result("Vision service busy, please try again"))
+        return future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        paths = [path for path, _ in batch]
+        futures = [future for _, future in batch]
+        if self.pool is None:
+            try:
+                results = predict_batch(paths)
+            except Exception as e:
+                results = [_error_result(str(e)) for _ in paths]
+            self._fan_out(futures, results)
+            return
+        try:
+            # Blocks while all workers are busy; meanwhile the next batch keeps filling up
+            pool_future = self.pool.submit(paths)
+        except Exception as e:
+            self._fan_out(futures, [_error_result(str(e)) for _ in paths])
+            return
+
+        def _done(f):
+            try:
+                results = f.result()
+            except Exception as e:
+                results = [_error_result(f"Vision worker failed: {e}") for _ in paths]
+            self._fan_out(futures, results)
+
+        pool_future.add_done_callback(_done)
+
+    @staticmethod
+    def _fan_out(futures, results):
+        # A short result list would leave requests waiting out VISION_RESULT_TIMEOUT
+        results = list(results) + [_error_result(MISSING_RESULT_ERROR)] * (len(futures) - len(results))
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+
+_batcher = None
+
+
+def get_vision_batcher() -> VisionBatcher:
+    """Get or create the vision batcher singleton"""
+    global _batcher
+    if _batcher is None:
+        _batcher = VisionBatcher()
+    return _batcher
+
+
 def run_vision_classifier(image_path: str) -> dict:
     """
     Run detector and map detections to a mock disease label.
-    Returns dict: {"disease": str, "confidence": float, "raw_detections": {...}}
+    Returns a VisionResult (top-k detections as NumPy arrays; .to_dict() gives
+    {"disease": str, "confidence": float, "raw_detections": [...]} for JSON).
+    With VISION_BATCHING enabled, concurrent calls are micro-batched into one predict;
+    with VISION_WORKERS > 0 inference runs in separate worker processes. Repeated or
+    near-identical photos are answered from the perceptual-hash cache.
     """
-    if not ULTRALYTICS_AVAILABLE:
-        return {
-            "disease": "vision_model_not_available",
-            "confidence": 0.0,
-            "raw_detections": [],
-            "error": "ultralytics not installed"
-        }
+    from app.models.vision_cache import get_vision_cache, image_hash
+    from app.models.vision_pool import get_vision_pool
+    if VISION_BACKEND == "onnx":
+        from app.models.vision_onnx import ONNXRUNTIME_AVAILABLE
+        if not ONNXRUNTIME_AVAILABLE:
+            return VisionResult.failure("onnxruntime not installed", label="vision_model_not_available")
+    elif not ULTRALYTICS_AVAILABLE:
+        return VisionResult.failure("ultralytics not installed", label="vision_model_not_available")
     
+    cache = get_vision_cache()
+    key = None
+    if cache is not None:
+        try:
+            key, size = image_hash(image_path)
+            cached = cache.get(key, size)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            # Unreadable here means unreadable for the model too; let it report the error
+            logger.warning("Vision cache: could not hash %s: %s", image_path, e)
+            key = None
+
     try:
-        model, error = _get_model()
-        if model is None:
-            error_msg = error or "Model not available"
-            return {
-                "disease": "error",
-                "confidence": 0.0,
-                "raw_detections": [],
-                "error": error_msg
-            }
-        
-        results = model.predict(source=image_path, imgsz=640, conf=0.25, verbose=False)
-        # results is a list of Results for batch input; we ran on a single image
-        if len(results) == 0:
-            return {"disease": "unknown", "confidence": 0.0, "raw_detections": []}
-        res = results[0]
-        boxes = []
-        for det in res.boxes:
-            x1, y1, x2, y2 = det.xyxy[0].tolist()
-            conf = float(det.conf[0])
-            cls = int(det.cls[0])
-            boxes.append({"box": [x1, y1, x2, y2], "confidence": conf, "class": cls})
-        # Mock mapping: if any detection exists -> 'pest_or_damage' with average confidence
-        if boxes:
-            avg_conf = float(np.mean([b["confidence"] for b in boxes]))
-            return {
-                "disease": "pest_or_damage_detected",
-                "confidence": round(avg_conf, 3),
-                "raw_detections": boxes
-            }
-        return {"disease": "no_detection", "confidence": 0.0, "raw_detections": []}
+        # Includes time queued for a batch / worker
+        with observe("yolo", VISION_BACKEND):
+            if VISION_BATCHING or get_vision_pool() is not None:
+                result = get_vision_batcher().submit(image_path).result(timeout=VISION_RESULT_TIMEOUT)
+            else:
+                result = predict_batch([image_path])[0]
+    except FutureTimeout:
+        return _error_result(f"Vision analysis timed out after {VISION_RESULT_TIMEOUT:g}s")
     except Exception as e:
-        return {
-            "disease": "error",
-            "confidence": 0.0,
-            "raw_detections": [],
-            "error": str(e)
-        }
+        return _error_result(str(e))
+    if key is not None:
+        cache.put(key, size, result)
+    return result
@@ -0,0 +1,145 @@
+"""
+Perceptual-hash cache for vision results.
+
+Farmers often resend the same photo, or a re-compressed / resized copy of it
+(client retries, messaging apps). Exact byte hashes miss those, so results are
+keyed by a 64-bit perceptual hash of the normalized (grayscale, downscaled)
+image: dHash (gradient signs, cheapest) or pHash (low DCT frequencies, more
+robust to re-encoding). A lookup matches any cached hash within
+VISION_CACHE_MAX_DISTANCE bits (Hamming distance) and skips model.predict.
+Results are compact VisionResults with image-relative boxes, so a hit on a
+resized copy is served at the query image's size.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.models.vision_result import VisionResult
+
+load_dotenv()
+
+VISION_CACHE_ENABLED = os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true"
+VISION_CACHE_SIZE = int(os.getenv("VISION_CACHE_SIZE", 1024))
+VISION_CACHE_MAX_DISTANCE = int(os.getenv("VISION_CACHE_MAX_DISTANCE", 6))  # of 64 bits
+VISION_CACHE_HASH = os.getenv("VISION_CACHE_HASH", "dhash").lower()
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)[::-1]).astype(np.uint64)
+
+
+def _to_int(bits: np.ndarray) -> int:
+    return int(np.bitwise_or.reduce(bits.ravel().astype(np.uint64) * _BIT_WEIGHTS))
+
+
+def _gray(image, size: Tuple[int, int]) -> np.ndarray:
+    from PIL import Image
+    return np.asarray(image.convert("L").resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def dhash(image) -> int:
+    """Difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail."""
+    pixels = _gray(image, (HASH_SIZE + 1, HASH_SIZE))
+    return _to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image) -> int:
+    """DCT hash: top-left 8x8 DCT coefficients of a 32x32 thumbnail vs their median."""
+    pixels = _gray(image, (PHASH_SIZE, PHASH_SIZE))
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    return _to_int(low > np.median(low.ravel()[1:]))
+
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+
+def image_hash(image_path: str, method: str = VISION_CACHE_HASH) -> Tuple[int, Tuple[int, int]]:
+    """Perceptual hash and (width, height) of an image file."""
+    from PIL import Image
+    # Raw pixel orientation, the same space the detector's boxes are in
+    with Image.open(image_path) as img:
+        return HASH_FUNCTIONS[method](img), img.size
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class VisionResultCache:
+    """LRU of vision results keyed by perceptual hash, with near-match lookup."""
+
+    def __init__(self, max_size: int = VISION_CACHE_SIZE, max_distance: int = VISION_CACHE_MAX_DISTANCE):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[int, Tuple[VisionResult, Tuple[int, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0}
+
+    def _nearest(self, key: int) -> Optional[int]:
+        if key in self._entries:
+            return key
+        if not self.max_distance or not self._entries:
+            return None
+        keys = np.fromiter(self._entries.keys(), dtype=np.uint64, count=len(self._entries))
+        distances = _popcount(keys ^ np.uint64(key))
+        best = int(distances.argmin())
+        return int(keys[best]) if distances[best] <= self.max_distance else None
+
+    def get(self, key: int, size: Tuple[int, int]) -> Optional[VisionResult]:
+        with self._lock:
+            match = self._nearest(key)
+            if match is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(match)
+            result, _ = self._entries[match]
+            self.stats["hits"] += 1
+            if match != key:
+                self.stats["near_hits"] += 1
+        # Boxes are image-relative, so a resized copy only needs its own pixel size
+        return result.with_image_size(size)
+
+    def put(self, key: int, size: Tuple[int, int], result: VisionResult):
+        if result.error is not None:
+            return
+        with self._lock:
+            self._entries[key] = (result, size)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+        }
+
+
+_cache: Optional[VisionResultCache] = None
+
+
+def get_vision_cache() -> Optional[VisionResultCache]:
+    """The vision result cache singleton, or None when disabled"""
+    global _cache
+    if not VISION_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = VisionResultCache()
+    return _cache
@@ -0,0 +1,205 @@
+"""
+ONNX Runtime backend for the YOLOv8 detector (VISION_BACKEND=onnx).
+
+On CPU-only nodes PyTorch eager inference is slow and memory-heavy. This backend
+runs an ONNX export of the same weights with ONNX Runtime, optionally dynamically
+quantized to int8 (VISION_ONNX_INT8=true). Pre-processing (letterbox + normalize),
+decoding and NMS are vectorized NumPy, and results come back as the same
+(boxes, confidences, classes) the PyTorch path produces, so the resulting
+VisionResult is the same for callers.
+
+If VISION_ONNX_PATH does not exist it is exported once from VISION_MODEL_WEIGHTS
+with ultralytics (needs the `onnx` package); the int8 model is derived from it
+with onnxruntime.quantization and cached next to it.
+"""
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.models.vision import VISION_MODEL_WEIGHTS
+
+# onnxruntime is only needed for VISION_BACKEND=onnx
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VISION_ONNX_PATH = os.getenv("VISION_ONNX_PATH", "yolov8n.onnx")
+VISION_ONNX_INT8 = os.getenv("VISION_ONNX_INT8", "false").lower() == "true"
+VISION_ONNX_THREADS = int(os.getenv("VISION_ONNX_THREADS", 0))  # 0 = onnxruntime default
+VISION_IMGSZ = 640
+VISION_CONF = 0.25
+VISION_IOU = 0.7  # ultralytics predict default
+LETTERBOX_FILL = 114
+
+# One image's detections: (N, 4) xyxy boxes in original pixels, (N,) confidences, (N,) class ids
+# and the image (width, height)
+Detections = Tuple[np.ndarray, np.ndarray, np.ndarray, Tuple[int, int]]
+
+
+def export_onnx(weights: str = VISION_MODEL_WEIGHTS, path: str = VISION_ONNX_PATH) -> str:
+    """Export the ultralytics weights to ONNX (dynamic batch) and return the model path."""
+    from ultralytics import YOLO
+    exported = YOLO(weights).export(format="onnx", imgsz=VISION_IMGSZ, dynamic=True, simplify=False)
+    if os.path.abspath(exported) != os.path.abspath(path):
+        os.replace(exported, path)
+    return path
+
+
+def quantize_int8(path: str) -> str:
+    """Dynamically quantize an ONNX model's weights to int8; returns the quantized model path."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    root, ext = os.path.splitext(path)
+    int8_path = f"{root}.int8{ext}"
+    if not os.path.exists(int8_path):
+        quantize_dynamic(path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+def letterbox(image: np.ndarray, size: int = VISION_IMGSZ) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """
+    Resize an HxWx3 uint8 RGB image to fit `size` keeping its aspect ratio and pad
+    the rest (like ultralytics). Returns the padded image, the scale and the (x, y) padding.
+    """
+    from PIL import Image
+    h, w = image.shape[:2]
+    gain = min(size / h, size / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+    if (new_w, new_h) != (w, h):
+        image = np.asarray(Image.fromarray(image).resize((new_w, new_h), Image.BILINEAR))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+    out = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    out[top:top + new_h, left:left + new_w] = image
+    return out, gain, (left, top)
+
+
+def load_image(path: str) -> np.ndarray:
+    from PIL import Image
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy NMS over xyxy boxes; returns kept indices by descending score."""
+    order = scores.argsort()[::-1]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def postprocess(
+    output: np.ndarray,
+    gain: float,
+    pad: Tuple[float, float],
+    shape: Tuple[int, int],
+    conf: float = VISION_CONF,
+    iou: float = VISION_IOU,
+) -> Detections:
+    """
+    Decode one YOLOv8 output of shape (4 + num_classes, anchors) into detections
+    in original image pixels. NMS is per class (boxes are offset by class id so
+    one vectorized pass handles every class).
+    """
+    preds = output.T  # (anchors, 4 + nc)
+    scores = preds[:, 4:]
+    classes = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), classes]
+    mask = confidences >= conf
+    h, w = shape
+    if not mask.any():
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64), (w, h)
+    xywh, confidences, classes = preds[mask, :4], confidences[mask], classes[mask]
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    offsets = classes[:, None].astype(boxes.dtype) * (VISION_IMGSZ * 2)
+    keep = nms(boxes + offsets, confidences, iou)[:300]  # ultralytics max_det
+    boxes, confidences, classes = boxes[keep], confidences[keep], classes[keep]
+    boxes[:, [0, 2]] -= pad[0]
+    boxes[:, [1, 3]] -= pad[1]
+    boxes /= gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+    return boxes, confidences, classes, (w, h)
+
+
+class OnnxDetector:
+    """ONNX Runtime session plus NumPy pre/post-processing for a YOLOv8 export."""
+
+    def __init__(self, path: str = VISION_ONNX_PATH, int8: bool = VISION_ONNX_INT8, threads: int = VISION_ONNX_THREADS):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime not installed. Run: pip install onnxruntime")
+        if not os.path.exists(path):
+            logger.info("Exporting %s to ONNX at %s...", VISION_MODEL_WEIGHTS, path)
+            export_onnx(path=path)
+        if int8:
+            path = quantize_int8(path)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Static exports take exactly one image per run
+        self.max_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+    def _run(self, blob: np.ndarray) -> np.ndarray:
+        if self.max_batch is None or len(blob) <= self.max_batch:
+            return self.session.run(None, {self.input_name: blob})[0]
+        return np.concatenate([
+            self.session.run(None, {self.input_name: blob[i:i + self.max_batch]})[0]
+            for i in range(0, len(blob), self.max_batch)
+        ])
+
+    def predict_arrays(self, images: List[np.ndarray]) -> List[Detections]:
+        """Detect on HxWx3 uint8 RGB arrays."""
+        if not images:
+            return []
+        letterboxed = [letterbox(image) for image in images]
+        blob = np.stack([padded for padded, _, _ in letterboxed])
+        # NHWC uint8 -> NCHW float32 in [0, 1]
+        blob = np.ascontiguousarray(blob.transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        outputs = self._run(blob)
+        return [
+            postprocess(output, gain, pad, image.shape[:2])
+            for output, image, (_, gain, pad) in zip(outputs, images, letterboxed)
+        ]
+
+    def predict(self, image_paths: List[str]) -> List[Detections]:
+        return self.predict_arrays([load_image(path) for path in image_paths])
+
+
+_detector: Optional[OnnxDetector] = None
+_detector_lock = threading.Lock()
+
+
+def get_onnx_detector() -> OnnxDetector:
+    """Get or create the ONNX detector singleton"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = OnnxDetector()
+    return _detector
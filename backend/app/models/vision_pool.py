@@ -0,0 +1,141 @@
+"""
+Out-of-process YOLO workers.
+
+With VISION_WORKERS > 0, batches built by VisionBatcher are executed in a pool
+of worker processes instead of the API process, so PyTorch inference and its
+GIL-heavy pre/post-processing never compete with request handling. Each worker
+loads and warms up the model once at start-up and pins its intra-op threads with
+torch.set_num_threads(VISION_WORKER_THREADS). Images are handed over as file
+paths (they are already on disk in UPLOAD_DIR) and results come back as plain
+dicts. At most VISION_WORKERS batches are in flight; callers wait for a slot.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VISION_WORKERS = int(os.getenv("VISION_WORKERS", 0))  # 0 = run inference in the API process
+VISION_WORKER_THREADS = int(os.getenv("VISION_WORKER_THREADS", 0)) or max(1, (os.cpu_count() or 1) // max(VISION_WORKERS, 1))
+# spawn avoids inheriting torch/OpenMP thread state from the parent
+VISION_WORKER_START_METHOD = os.getenv("VISION_WORKER_START_METHOD", "spawn")
+
+
+def _init_worker(num_threads: int):
+    from app.logging_config import configure_logging
+    from app.models import vision
+    # Spawned workers start without the parent's logging setup
+    configure_logging()
+    if vision.ULTRALYTICS_AVAILABLE:
+        vision.torch.set_num_threads(num_threads)
+    else:
+        # The ONNX backend sizes its own session threads from this
+        os.environ.setdefault("VISION_ONNX_THREADS", str(num_threads))
+    # Load and warm up once per worker, before the first request arrives
+    try:
+        vision.warmup()
+    except Exception as e:
+        logger.warning("Vision worker %s warmup failed: %s", os.getpid(), e)
+
+
+def _predict_in_worker(image_paths: List[str]) -> list:
+    from app.models import vision
+    return vision.predict_batch(image_paths)
+
+
+class VisionWorkerPool:
+    def __init__(self, workers: int = VISION_WORKERS, threads: int = VISION_WORKER_THREADS):
+        self.workers = workers
+        self.threads = threads
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # One in-flight batch per worker; further batches keep accumulating in the batcher
+        self._slots = threading.BoundedSemaphore(workers)
+        self.stats = {"batches": 0, "worker_restarts": 0, "in_flight": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(VISION_WORKER_START_METHOD),
+                    initializer=_init_worker,
+                    initargs=(self.threads,),
+                )
+            return self._executor
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.stats["worker_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Spawn the workers (and load the model in each) ahead of the first request."""
+        executor = self._get_executor()
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def submit(self, image_paths: List[str]) -> Future:
+        """
+        Run one batch in a worker. Blocks while every worker is busy (backpressure
+        for the batcher). The returned future resolves to one result dict per path.
+        """
+        self._slots.acquire()
+        with self._lock:
+            self.stats["in_flight"] += 1
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_predict_in_worker, list(image_paths))
+            except BrokenProcessPool:
+                self._restart(executor)
+                executor = self._get_executor()
+                future = executor.submit(_predict_in_worker, list(image_paths))
+        except BaseException:
+            # Spawning the pool or the retry failed; the slot is not held by any batch
+            self._release()
+            raise
+        self.stats["batches"] += 1
+
+        def _done(f):
+            self._release()
+            if isinstance(f.exception(), BrokenProcessPool):
+                # A worker died (e.g. OOM); start a fresh pool for the next batch
+                self._restart(executor)
+
+        future.add_done_callback(_done)
+        return future
+
+    def _release(self):
+        with self._lock:
+            self.stats["in_flight"] -= 1
+        self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[VisionWorkerPool] = None
+
+
+def get_vision_pool() -> Optional[VisionWorkerPool]:
+    """The worker pool singleton, or None when inference runs in-process"""
+    global _pool
+    if VISION_WORKERS <= 0:
+        return None
+    if _pool is None:
+        _pool = VisionWorkerPool()
+    return _pool
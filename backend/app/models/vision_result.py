@@ -0,0 +1,153 @@
+"""
+Compact vision result.
+
+Dense leaf photos can produce hundreds of boxes, and the result used to be a
+list of per-box dicts of Python floats copied into FarmState, the API response
+and Conversation.meta_data. VisionResult keeps only the top VISION_TOP_K
+detections by confidence as NumPy arrays: boxes as image-relative int16
+(0..BOX_SCALE), confidences as float32 and class ids as int16. Aggregates are
+computed vectorized over all detections before truncation. The result is
+converted to the JSON dict format ({"disease", "confidence", "raw_detections"})
+only at the boundary (to_dict()). dict-style get() is kept for existing callers.
+"""
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VISION_TOP_K = int(os.getenv("VISION_TOP_K", 20))
+BOX_SCALE = np.iinfo(np.int16).max
+
+
+class VisionResult:
+    __slots__ = ("boxes", "confidences", "classes", "image_size", "total", "mean_confidence", "label", "error")
+
+    def __init__(
+        self,
+        boxes: np.ndarray,
+        confidences: np.ndarray,
+        classes: np.ndarray,
+        image_size: Optional[Tuple[int, int]],
+        total: int = 0,
+        mean_confidence: float = 0.0,
+        label: Optional[str] = None,
+        error: Optional[str] = None,
+    ):
+        self.boxes = boxes
+        self.confidences = confidences
+        self.classes = classes
+        self.image_size = image_size  # (width, height) of the image the boxes are relative to
+        self.total = total
+        self.mean_confidence = mean_confidence
+        self.label = label
+        self.error = error
+
+    @classmethod
+    def from_detections(cls, xyxy, confidences, classes, image_size: Tuple[int, int], top_k: int = VISION_TOP_K) -> "VisionResult":
+        """Build from pixel xyxy boxes, confidences and class ids of one image."""
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        confidences = np.asarray(confidences, dtype=np.float32).reshape(-1)
+        classes = np.asarray(classes).reshape(-1)
+        total = len(confidences)
+        mean_confidence = float(confidences.mean()) if total else 0.0
+        order = np.argsort(-confidences, kind="stable")[:top_k]
+        width, height = image_size
+        scale = np.array([width, height, width, height], dtype=np.float32)
+        relative = np.clip(xyxy[order] / scale, 0.0, 1.0)
+        return cls(
+            boxes=np.round(relative * BOX_SCALE).astype(np.int16),
+            confidences=confidences[order],
+            classes=classes[order].astype(np.int16),
+            image_size=(int(width), int(height)),
+            total=total,
+            mean_confidence=mean_confidence,
+        )
+
+    @classmethod
+    def failure(cls, error: Optional[str], label: str = "error") -> "VisionResult":
+        return cls(
+            boxes=np.zeros((0, 4), dtype=np.int16),
+            confidences=np.zeros(0, dtype=np.float32),
+            classes=np.zeros(0, dtype=np.int16),
+            image_size=None,
+            label=label,
+            error=error,
+        )
+
+    @property
+    def disease(self) -> str:
+        if self.label:
+            return self.label
+        # Mock mapping: if any detection exists -> 'pest_or_damage' with average confidence
+        return "pest_or_damage_detected" if self.total else "no_detection"
+
+    @property
+    def confidence(self) -> float:
+        return round(self.mean_confidence, 3) if self.total else 0.0
+
+    def with_image_size(self, image_size: Tuple[int, int]) -> "VisionResult":
+        """Same detections for a resized copy of the image (arrays are shared)."""
+        return VisionResult(
+            self.boxes, self.confidences, self.classes, image_size,
+            self.total, self.mean_confidence, self.label, self.error,
+        )
+
+    def relative_boxes(self) -> np.ndarray:
+        return self.boxes.astype(np.float32) / BOX_SCALE
+
+    def pixel_boxes(self, image_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """(k, 4) float32 xyxy boxes in pixels of `image_size` (default: the detected image)."""
+        width, height = image_size or self.image_size or (0, 0)
+        return self.relative_boxes() * np.array([width, height, width, height], dtype=np.float32)
+
+    def raw_detections(self) -> list:
+        boxes = np.round(self.pixel_boxes(), 1).tolist()
+        confidences = np.round(self.confidences.astype(np.float64), 4).tolist()
+        return [
+            {"box": box, "confidence": conf, "class": cls}
+            for box, conf, cls in zip(boxes, confidences, self.classes.tolist())
+        ]
+
+    def to_dict(self) -> dict:
+        """JSON-ready form for API responses and meta_data."""
+        result = {
+            "disease": self.disease,
+            "confidence": self.confidence,
+            "raw_detections": self.raw_detections(),
+        }
+        if self.total > len(self.confidences):
+            result["detections_total"] = self.total
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+    def get(self, key: str, default=None):
+        if key == "raw_detections":
+            return self.raw_detections()
+        if key == "detections_total":
+            return self.total
+        if key in ("disease", "confidence"):
+            return getattr(self, key)
+        if key == "error":
+            return self.error if self.error is not None else default
+        return default
+
+    def __getitem__(self, key: str):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def __repr__(self) -> str:
+        return f"VisionResult(disease={self.disease!r}, confidence={self.confidence}, detections={len(self.confidences)}/{self.total})"
+
+
+def to_json(result) -> Optional[dict]:
+    """Boundary conversion for values that may be a VisionResult, a dict or None."""
+    return result.to_dict() if isinstance(result, VisionResult) else result
@@ -0,0 +1,192 @@
+"""
+Write-behind persistence for conversation records.
+
+respond_node no longer talks to Postgres on the reply path: it enqueues a plain
+dict and returns. A background task collects queued records into batches
+(bounded by PERSIST_BATCH_SIZE and PERSIST_MAX_DELAY_MS) and writes each batch
+with one bulk INSERT, resolving farmer ids through app.users. Batches are retried with backoff while
+the database is unreachable and the queue is drained on shutdown. A batch rejected
+for another reason (a bad row) is written row by row so only the offending
+records are dropped.
+"""
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app.db import AsyncSessionLocal
+from app.models.db_models import Conversation
+from app.users import get_user_resolver
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", 100))
+PERSIST_MAX_DELAY = float(os.getenv("PERSIST_MAX_DELAY_MS", 200)) / 1000
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", 10000))
+PERSIST_RETRY_MAX_DELAY = float(os.getenv("PERSIST_RETRY_MAX_DELAY", 30))
+PERSIST_DRAIN_TIMEOUT = float(os.getenv("PERSIST_DRAIN_TIMEOUT", 10))
+
+# Errors that mean "database unreachable right now" - the batch is kept and retried.
+# Not OSError in general: a local failure would otherwise be retried forever.
+TRANSIENT_DB_ERRORS = (OperationalError, InterfaceError, ConnectionError, TimeoutError)
+
+
+class ConversationWriter:
+    """Bounded queue + background flusher that bulk-inserts Conversation rows."""
+
+    def __init__(
+        self,
+        batch_size: int = PERSIST_BATCH_SIZE,
+        max_delay: float = PERSIST_MAX_DELAY,
+        queue_size: int = PERSIST_QUEUE_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._drain_deadline = 0.0
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0, "retries": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the flusher on the running event loop (no-op if already running)."""
+        if self.running:
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._closing = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def enqueue(self, record: Dict) -> bool:
+        """
+        Queue one conversation record without waiting on the database.
+        `record` holds Conversation column values plus "external_id" (the farmer id).
+        Returns False if the record was dropped because the queue is full.
+        """
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning("Persistence queue full (%s) - conversation not saved", self.queue_size)
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def stop(self, timeout: float = PERSIST_DRAIN_TIMEOUT):
+        """Flush everything still queued, giving up on an unreachable DB after `timeout`."""
+        if not self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self._closing = True
+        self._drain_deadline = loop.time() + timeout
+        try:
+            # Small grace period on top of the drain deadline for the in-flight INSERT
+            await asyncio.wait_for(self._task, timeout + 5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        if self.queue_depth():
+            self.stats["dropped"] += self.queue_depth()
+            logger.error("Persistence queue not drained on shutdown - %s conversations lost", self.queue_depth())
+        logger.info("Persistence writer stopped: %s", self.stats)
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._write_with_retry(batch)
+
+    async def _next_batch(self) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        try:
+            # Wake up periodically so stop() is noticed while idle
+            first = await asyncio.wait_for(self._queue.get(), timeout=self.max_delay if self._closing else 1.0)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write_with_retry(self, batch: List[Dict]):
+        loop = asyncio.get_running_loop()
+        delay = 0.5
+        while True:
+            try:
+                await self._write_batch(batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except TRANSIENT_DB_ERRORS as db_error:
+                if self._closing and loop.time() >= self._drain_deadline:
+                    self.stats["dropped"] += len(batch)
+                    logger.error("Database still unavailable at shutdown - %s conversations lost: %s", len(batch), db_error)
+                    return
+                self.stats["retries"] += 1
+                logger.warning("Database not available - retrying %s queued conversations in %.1fs: %s", len(batch), delay, db_error)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, PERSIST_RETRY_MAX_DELAY)
+            except Exception as e:
+                # Not a connectivity problem - retrying the batch would fail the same way
+                if len(batch) > 1:
+                    logger.warning("Batch of %d conversations rejected (%s) - writing them one by one", len(batch), e)
+                    break
+                self.stats["dropped"] += 1
+                logger.exception("Error persisting conversation for %s: %s", batch[0].get("external_id"), e)
+                return
+        for record in batch:
+            await self._write_with_retry([record])
+
+    async def _write_batch(self, batch: List[Dict]):
+        resolver = get_user_resolver()
+        external_ids = [r["external_id"] for r in batch if r.get("external_id")]
+        async with AsyncSessionLocal() as session:
+            try:
+                user_ids = await resolver.resolve_many(session, external_ids)
+                rows = []
+                for record in batch:
+                    row = dict(record)
+                    row["user_id"] = user_ids.get(row.pop("external_id", None))
+                    rows.append(row)
+                await session.execute(insert(Conversation), rows)
+                await session.commit()
+            except BaseException:
+                # Users inserted in this transaction are rolled back with it
+                resolver.forget(external_ids)
+                raise
+
+
+# Process-wide writer (lazy-started on first enqueue or at app startup)
+_writer: Optional[ConversationWriter] = None
+
+
+def get_conversation_writer() -> ConversationWriter:
+    """Get or create the conversation writer singleton"""
+    global _writer
+    if _writer is None:
+        _writer = ConversationWriter()
+    return _writer
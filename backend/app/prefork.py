@@ -0,0 +1,85 @@
+"""
+Preload-then-fork deployment support (gunicorn --preload, see gunicorn.conf.py).
+
+Normally every worker process imports torch and loads its own YOLO weights, so
+memory grows linearly with the worker count. With PREFORK_PRELOAD=true the
+gunicorn master imports the app (prompt templates, lexicons and other
+module-level data) and loads the vision model *before* forking, so workers
+share those pages copy-on-write. To keep the pages shared:
+
+- the model is loaded and warmed up in the master with a single torch thread
+  (OpenMP thread pools don't survive fork); workers set their own thread count
+  after the fork,
+- the warmup predict runs in the master, so ultralytics' one-time layer fusion
+  happens once instead of rewriting the weights in every worker,
+- gc.freeze() moves everything allocated so far into the permanent generation,
+  so the cyclic GC in workers never writes to those objects' headers.
+
+Only the PyTorch backend is preloaded: ONNX Runtime sessions own thread pools
+and are not fork-safe, and with VISION_WORKERS > 0 the model lives in the
+spawned vision workers instead. memory_usage() reports the per-worker unique
+(USS) vs proportionally shared (PSS) memory that this mode saves.
+"""
+import gc
+import logging
+import os
+import time
+from typing import Dict, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PREFORK_PRELOAD = os.getenv("PREFORK_PRELOAD", "false").lower() == "true"
+# torch intra-op threads per web worker after fork (0 = CPU count / WEB_CONCURRENCY)
+PREFORK_WORKER_THREADS = int(os.getenv("PREFORK_WORKER_THREADS", 0))
+
+
+def preload_before_fork() -> Dict:
+    """Load shared, read-mostly state in the master process. Returns timings."""
+    from app.models import vision
+    from app.models.vision_pool import VISION_WORKERS
+    started = time.monotonic()
+    report = {"vision_model": False}
+    if vision.VISION_BACKEND != "onnx" and vision.ULTRALYTICS_AVAILABLE and VISION_WORKERS <= 0:
+        vision.torch.set_num_threads(1)
+        vision.warmup(1)
+        report["vision_model"] = True
+    gc.collect()
+    gc.freeze()
+    report["preload_seconds"] = round(time.monotonic() - started, 3)
+    report["frozen_objects"] = gc.get_freeze_count()
+    logger.info("Preloaded before fork in pid %s: %s", os.getpid(), report)
+    return report
+
+
+def after_fork(workers: int = 1):
+    """Per-worker setup once forked from a preloaded master."""
+    from app.models import vision
+    if vision.ULTRALYTICS_AVAILABLE:
+        threads = PREFORK_WORKER_THREADS or max(1, (os.cpu_count() or 1) // max(workers, 1))
+        vision.torch.set_num_threads(threads)
+
+
+def memory_usage(pid: Union[int, str] = "self") -> Dict:
+    """
+    RSS / PSS / USS of a process in MB from /proc/<pid>/smaps_rollup. USS (private
+    pages) is what each extra worker really costs; RSS double-counts shared pages.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+        "shared_mb": round(shared / 1024, 1),
+    }
@@ -0,0 +1,128 @@
+"""
+Startup preload / warmup and readiness.
+
+Without preloading, the first request after a deploy pays for loading YOLO
+weights (possibly downloading them), first-inference setup, opening database
+connections and creating storage clients. With PRELOAD_ON_STARTUP=true these
+steps run in the background right after startup and /api/ready answers 503
+until they have finished, so a load balancer only routes traffic to warm
+workers. Vision worker processes (VISION_WORKERS > 0) are always spawned here.
+
+A failed step is recorded (and reported by /api/ready) but does not keep the
+worker unready: requests then fall back to the same lazy paths as before.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_ON_STARTUP = os.getenv("PRELOAD_ON_STARTUP", "false").lower() == "true"
+PRELOAD_VISION_WARMUP_RUNS = int(os.getenv("PRELOAD_VISION_WARMUP_RUNS", 2))
+
+
+def _preload_vision():
+    from app.models import vision
+    from app.models.vision_pool import get_vision_pool
+    pool = get_vision_pool()
+    if pool is not None:
+        # Each worker loads and warms up its own model copy in its initializer
+        pool.start()
+    elif vision.ULTRALYTICS_AVAILABLE or vision.VISION_BACKEND == "onnx":
+        vision.warmup(PRELOAD_VISION_WARMUP_RUNS)
+
+
+async def _preload_database():
+    from app.db import engine, read_engine
+    for eng in (engine, read_engine):
+        if eng is None:
+            continue
+        async with eng.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+
+def _preload_storage():
+    from app.storage import get_storage_backend
+    get_storage_backend()
+
+
+class Preloader:
+    """Runs the preload steps once and tracks readiness for /api/ready."""
+
+    def __init__(self, enabled: bool = PRELOAD_ON_STARTUP):
+        self.enabled = enabled
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "enabled": enabled,
+            "started_at": None,
+            "finished_at": None,
+            "preload_seconds": None,
+            "steps": {},
+        }
+
+    def steps(self) -> List[Tuple[str, Callable]]:
+        from app.models.vision_pool import get_vision_pool
+        if self.enabled:
+            return [("vision", _preload_vision), ("database", _preload_database), ("storage", _preload_storage)]
+        if get_vision_pool() is not None:
+            return [("vision", _preload_vision)]
+        return []
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self):
+        steps = self.steps()
+        if not steps:
+            self.ready = True
+            return
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        self.stats["started_at"] = datetime.now(timezone.utc).isoformat()
+        for name, step in steps:
+            step_started = time.monotonic()
+            result: Dict = {"ok": True}
+            try:
+                if asyncio.iscoroutinefunction(step):
+                    await step()
+                else:
+                    # Model loading is blocking; keep it off the event loop
+                    await loop.run_in_executor(None, step)
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+                logger.exception("Preload step '%s' failed: %s", name, e)
+            result["seconds"] = round(time.monotonic() - step_started, 3)
+            self.stats["steps"][name] = result
+        self.stats["preload_seconds"] = round(time.monotonic() - started, 3)
+        self.stats["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.ready = True
+        logger.info("Preload finished in %ss: %s", self.stats['preload_seconds'], self.stats['steps'])
+
+
+_preloader: Optional[Preloader] = None
+
+
+def get_preloader() -> Preloader:
+    """Get or create the preloader singleton"""
+    global _preloader
+    if _preloader is None:
+        _preloader = Preloader()
+    return _preloader
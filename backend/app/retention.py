@@ -0,0 +1,231 @@
+"""
+Disk-budgeted retention for UPLOAD_DIR.
+
+Uploaded audio/images and generated TTS files are never needed forever. A
+background sweep deletes files older than UPLOAD_RETENTION_MAX_AGE_HOURS and,
+if the directory is still above UPLOAD_RETENTION_MAX_MB, the oldest remaining
+files until it fits. Files referenced by conversations from the last
+UPLOAD_RETENTION_PROTECT_HOURS (tts_path / media_url), and any file modified
+within that window, are always kept. The directory is scanned incrementally on a
+dedicated thread, pausing between chunks so large directories don't monopolize I/O.
+Each file's mtime is re-checked under the media store lock right before it is
+deleted, so content deduplicated since the scan survives. With several workers
+only the one holding the sweeper lock file runs sweeps.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional, Set
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from app.api.utils import UPLOAD_DIR
+from app.db import AsyncSessionLocal, CONNECTION_ERRORS
+from app.media_store import LOCK_NAME, store_lock
+from app.models.db_models import Conversation
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RETENTION_ENABLED = os.getenv("UPLOAD_RETENTION_ENABLED", "true").lower() == "true"
+RETENTION_MAX_AGE = float(os.getenv("UPLOAD_RETENTION_MAX_AGE_HOURS", 720)) * 3600  # 0 disables
+RETENTION_MAX_BYTES = int(float(os.getenv("UPLOAD_RETENTION_MAX_MB", 2048)) * 1024 * 1024)  # 0 disables
+RETENTION_PROTECT_WINDOW = float(os.getenv("UPLOAD_RETENTION_PROTECT_HOURS", 24)) * 3600
+RETENTION_INTERVAL = float(os.getenv("UPLOAD_RETENTION_INTERVAL", 600))  # seconds between sweeps
+RETENTION_SCAN_BATCH = int(os.getenv("UPLOAD_RETENTION_SCAN_BATCH", 500))
+RETENTION_SCAN_PAUSE = float(os.getenv("UPLOAD_RETENTION_SCAN_PAUSE_MS", 10)) / 1000
+SWEEPER_LOCK_NAME = ".retention.lock"
+
+
+class UploadRetention:
+    """Periodic age + size budget enforcement for one upload directory."""
+
+    def __init__(
+        self,
+        root: str = UPLOAD_DIR,
+        max_age: float = RETENTION_MAX_AGE,
+        max_bytes: int = RETENTION_MAX_BYTES,
+        protect_window: float = RETENTION_PROTECT_WINDOW,
+        interval: float = RETENTION_INTERVAL,
+    ):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.protect_window = protect_window
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._leader_fd: Optional[int] = None
+        self.stats = {
+            "sweeps": 0,
+            "files_deleted": 0,
+            "bytes_reclaimed": 0,
+            "last_sweep_at": None,
+            "last_sweep_seconds": None,
+            "last_files_scanned": 0,
+            "last_bytes_reclaimed": 0,
+            "bytes_in_use": None,
+            "sweeper": False,
+        }
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._leader_fd is not None:
+            os.close(self._leader_fd)
+            self._leader_fd = None
+            self.stats["sweeper"] = False
+
+    def _acquire_sweeper(self) -> bool:
+        """Whether this process is the one that sweeps (non-blocking, re-tried each interval)."""
+        if self._leader_fd is None:
+            fd = os.open(os.path.join(self.root, SWEEPER_LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            # Held until stop() or process exit, when the next worker takes over
+            self._leader_fd = fd
+            self.stats["sweeper"] = True
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                if self._acquire_sweeper():
+                    await self.sweep()
+            except Exception as e:
+                logger.exception("Upload retention sweep failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> int:
+        """Run one retention pass and return the number of bytes reclaimed."""
+        started = time.monotonic()
+        protected = await self._referenced_paths()
+        if self._executor is None:
+            # Own thread: a long scan never takes a slot from the pipeline's default executor
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retention")
+        loop = asyncio.get_running_loop()
+        reclaimed = await loop.run_in_executor(self._executor, self._sweep_files, protected)
+        self.stats["sweeps"] += 1
+        self.stats["last_sweep_at"] = datetime.now(timezone.utc).isoformat()
+        self.stats["last_sweep_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(
+            "Upload retention: reclaimed %d bytes from %s (%d files scanned, %d bytes in use)",
+            reclaimed, self.root, self.stats["last_files_scanned"], self.stats["bytes_in_use"],
+        )
+        return reclaimed
+
+    async def _referenced_paths(self) -> Set[str]:
+        """Files referenced by conversations inside the protection window."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.protect_window)
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Conversation.tts_path, Conversation.media_url).where(Conversation.created_at >= cutoff)
+                )
+                rows = result.all()
+        except CONNECTION_ERRORS as e:
+            # Recently referenced files are also recently written, so the mtime
+            # window still protects them while the database is down
+            logger.warning("Upload retention: database not available, relying on file age only: %s", e)
+            return set()
+        return {os.path.realpath(path) for row in rows for path in row if path}
+
+    def _iter_files(self, directory: str) -> Iterator[os.DirEntry]:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from self._iter_files(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:
+            return
+
+    def _remove(self, path: str, size: int) -> int:
+        try:
+            with store_lock(self.root, exclusive=True):
+                # Deduplicated since the scan (mtime refreshed): still in use
+                if time.time() - os.stat(path).st_mtime < self.protect_window:
+                    return 0
+                os.remove(path)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning("Upload retention: could not delete %s: %s", path, e)
+            return 0
+        self.stats["files_deleted"] += 1
+        return size
+
+    def _sweep_files(self, protected: Set[str]) -> int:
+        now = time.time()
+        reclaimed = 0
+        in_use = 0
+        scanned = 0
+        candidates = []  # (mtime, size, path) of files the size budget may delete
+        for entry in self._iter_files(self.root):
+            if entry.name in (LOCK_NAME, SWEEPER_LOCK_NAME):
+                continue
+            scanned += 1
+            if scanned % RETENTION_SCAN_BATCH == 0:
+                time.sleep(RETENTION_SCAN_PAUSE)
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            path = os.path.realpath(entry.path)
+            age = now - st.st_mtime
+            if age < self.protect_window or path in protected:
+                in_use += st.st_size
+            elif self.max_age and age > self.max_age:
+                reclaimed += self._remove(path, st.st_size)
+            else:
+                in_use += st.st_size
+                candidates.append((st.st_mtime, st.st_size, path))
+
+        if self.max_bytes and in_use > self.max_bytes:
+            candidates.sort()
+            for _, size, path in candidates:
+                if in_use <= self.max_bytes:
+                    break
+                freed = self._remove(path, size)
+                in_use -= freed
+                reclaimed += freed
+
+        self.stats["bytes_reclaimed"] += reclaimed
+        self.stats["last_bytes_reclaimed"] = reclaimed
+        self.stats["last_files_scanned"] = scanned
+        self.stats["bytes_in_use"] = in_use
+        return reclaimed
+
+
+# Process-wide sweeper for UPLOAD_DIR
+_retention: Optional[UploadRetention] = None
+
+
+def get_upload_retention() -> UploadRetention:
+    """Get or create the UPLOAD_DIR retention singleton"""
+    global _retention
+    if _retention is None:
+        _retention = UploadRetention()
+    return _retention
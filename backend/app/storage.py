@@ -1,23 +1,219 @@
-# Simple S3/local storage helper (optional)
+"""
+Storage backends for media (uploads and generated TTS audio).
+
+Everything is first written locally through the media store (app.media_store);
+the configured backend decides where clients fetch it from:
+
+- "local": files are served by the API itself (/api/get_tts).
+- "s3": files are offloaded in the background to an S3-compatible bucket
+  (AWS, MinIO, a local moto server, ...) through one shared, connection-pooled
+  client, using concurrent multipart uploads for large files. Clients get
+  presigned URLs and fetch the bytes directly from object storage.
+
+Select with STORAGE_BACKEND; S3_ENDPOINT_URL points at non-AWS endpoints.
+"""
+import abc
+import logging
 import os
-import boto3
-from botocore.exceptions import BotoCoreError
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, Optional
+
 from dotenv import load_dotenv
 
+# boto3 is only needed for the S3 backend
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import BotoCoreError, ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
 S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "media/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "") or None
+S3_REGION = os.getenv("S3_REGION", "") or None
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID", "")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", 3600))
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 32))
+S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", 4))
+S3_MULTIPART_THRESHOLD_MB = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", 8))
+S3_MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", 8))
+
+
+class StorageBackend(abc.ABC):
+    """Where clients fetch stored media from."""
+
+    name = "base"
+
+    def offload(self, local_path: str, wait: float = 0.0) -> Optional[Future]:
+        """
+        Schedule a background copy of `local_path` to the backend (if remote).
+        With `wait`, block up to that many seconds for the copy to finish.
+        """
+        return None
+
+    @abc.abstractmethod
+    def upload(self, local_path: str, key: Optional[str] = None) -> str:
+        """Synchronously store `local_path` and return its backend URI."""
+
+    def url_for(self, local_path: str) -> Optional[str]:
+        """A URL clients can fetch directly, or None to serve through the API."""
+        return None
+
+    def remote_url(self, local_path: str) -> Optional[str]:
+        """
+        Like url_for, but also checks the backend for objects uploaded by other
+        workers. May do network I/O: call it from a thread, not the event loop.
+        """
+        return self.url_for(local_path)
+
+
+class LocalStorageBackend(StorageBackend):
+    name = "local"
+
+    def upload(self, local_path: str, key: Optional[str] = None) -> str:
+        return os.path.abspath(local_path)
+
+
+class S3StorageBackend(StorageBackend):
+    name = "s3"
+
+    def __init__(self, bucket: str = S3_BUCKET, prefix: str = S3_PREFIX, endpoint_url: Optional[str] = S3_ENDPOINT_URL):
+        if not BOTO3_AVAILABLE:
+            raise ImportError("boto3 not installed. Run: pip install boto3")
+        if not bucket:
+            raise RuntimeError("S3 bucket not configured")
+        self.bucket = bucket
+        self.prefix = prefix
+        # boto3 clients are thread-safe; one client (and its connection pool) serves every upload
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=S3_REGION,
+            aws_access_key_id=AWS_ACCESS_KEY_ID or None,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY or None,
+            config=BotoConfig(max_pool_connections=S3_MAX_POOL_CONNECTIONS, retries={"max_attempts": 3, "mode": "standard"}),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            multipart_chunksize=S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            max_concurrency=S3_MULTIPART_CONCURRENCY,
+            use_threads=True,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_WORKERS, thread_name_prefix="s3-upload")
+        # Guards _pending, _uploaded and stats, which upload threads and request handlers share
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._uploaded = set()
+        self.stats = {"uploads": 0, "upload_errors": 0, "bytes_uploaded": 0, "skipped_existing": 0}
+
+    def key_for(self, local_path: str) -> str:
+        # Media-store paths are content addressed, so their relative path is a stable key
+        from app.api.utils import UPLOAD_DIR
+        path = os.path.abspath(local_path)
+        root = os.path.abspath(UPLOAD_DIR)
+        relative = os.path.relpath(path, root) if path.startswith(root + os.sep) else os.path.basename(path)
+        return f"{self.prefix}{relative.replace(os.sep, '/')}"
+
+    def upload(self, local_path: str, key: Optional[str] = None) -> str:
+        key = key or self.key_for(local_path)
+        with self._lock:
+            already_uploaded = key in self._uploaded
+            if already_uploaded:
+                self.stats["skipped_existing"] += 1
+        if not already_uploaded:
+            self.client.upload_file(local_path, self.bucket, key, Config=self.transfer_config)
+            size = os.path.getsize(local_path)
+            with self._lock:
+                self.stats["uploads"] += 1
+                self.stats["bytes_uploaded"] += size
+                self._uploaded.add(key)
+        return f"s3://{self.bucket}/{key}"
+
+    def offload(self, local_path: str, wait: float = 0.0) -> Optional[Future]:
+        key = self.key_for(local_path)
+        with self._lock:
+            if key in self._uploaded:
+                return None
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._upload_in_background, local_path, key)
+                self._pending[key] = future
+        if wait > 0:
+            try:
+                future.result(timeout=wait)
+            except FutureTimeout:
+                pass  # still uploading; served through the API until it lands
+        return future
+
+    def _upload_in_background(self, local_path: str, key: str):
+        try:
+            return self.upload(local_path, key)
+        except (BotoCoreError, ClientError, OSError) as e:
+            with self._lock:
+                self.stats["upload_errors"] += 1
+            logger.error("Background upload of %s to s3://%s/%s failed: %s", local_path, self.bucket, key, e)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _presign(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=S3_PRESIGN_EXPIRES
+        )
+
+    def url_for(self, local_path: str) -> Optional[str]:
+        key = self.key_for(local_path)
+        with self._lock:
+            uploaded = key in self._uploaded
+        return self._presign(key) if uploaded else None
+
+    def remote_url(self, local_path: str) -> Optional[str]:
+        url = self.url_for(local_path)
+        if url:
+            return url
+        key = self.key_for(local_path)
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except (BotoCoreError, ClientError):
+            return None
+        with self._lock:
+            self._uploaded.add(key)
+        return self._presign(key)
+
+
+_backend: Optional[StorageBackend] = None
+_s3_backend: Optional[S3StorageBackend] = None
+
+
+def get_storage_backend() -> StorageBackend:
+    """Get or create the configured storage backend singleton"""
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == "s3":
+            _backend = S3StorageBackend()
+        elif STORAGE_BACKEND == "local":
+            _backend = LocalStorageBackend()
+        else:
+            raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+    return _backend
+
 
 def upload_file_s3(local_path, key):
-    if not S3_BUCKET:
-        raise RuntimeError("S3 bucket not configured")
-    s3 = boto3.client("s3",
-                      aws_access_key_id=AWS_ACCESS_KEY_ID,
-                      aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-    try:
-        s3.upload_file(local_path, S3_BUCKET, key)
-        return f"s3://{S3_BUCKET}/{key}"
-    except BotoCoreError as e:
-        raise
+    """Upload one file to S3_BUCKET under `key` (kept for existing callers)."""
+    global _s3_backend
+    backend = get_storage_backend()
+    if not isinstance(backend, S3StorageBackend):
+        if _s3_backend is None:
+            _s3_backend = S3StorageBackend()
+        backend = _s3_backend
+    return backend.upload(local_path, key)
@@ -0,0 +1,129 @@
+"""
+Transcription cache.
+
+Mobile clients retry uploads on flaky networks, so /api/upload_audio often gets
+byte-identical audio. Transcripts (text, language and the VAD report) are cached
+by the audio's SHA-256, which is free for uploads since they are stored
+content addressed, and by the SHA-256 of the decoded 16 kHz PCM that VAD
+works on, which also matches re-encoded or remuxed copies of the same recording.
+A hit skips normalization, VAD and the STT call entirely. Entries expire after
+TRANSCRIPT_CACHE_TTL seconds and the least recently used are evicted beyond
+TRANSCRIPT_CACHE_SIZE. A retry that arrives while the original is still being
+transcribed waits for that result (up to TRANSCRIPT_CACHE_WAIT seconds) instead
+of starting a second transcription.
+
+The cache is per process; failed (empty) transcriptions are not cached.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRANSCRIPT_CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() == "true"
+TRANSCRIPT_CACHE_SIZE = int(os.getenv("TRANSCRIPT_CACHE_SIZE", 2048))
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", 6 * 3600))
+TRANSCRIPT_CACHE_WAIT = float(os.getenv("TRANSCRIPT_CACHE_WAIT", 60))
+
+
+class TranscriptCache:
+    """TTL + LRU cache of transcription results; one entry can have several keys."""
+
+    def __init__(self, max_size: int = TRANSCRIPT_CACHE_SIZE, ttl: float = TRANSCRIPT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "pcm_hits": 0, "coalesced": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(self, key: Optional[str], kind: str = "hits") -> Optional[dict]:
+        """Cached result for `key`, or None. `kind` is the stats counter for a hit."""
+        if not key:
+            return None
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, result = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats[kind] += 1
+            return result
+
+    def put(self, keys: Iterable[Optional[str]], result: dict):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key in filter(None, keys):
+                self._entries[key] = (expires, result)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def miss(self):
+        with self._lock:
+            self.stats["misses"] += 1
+
+    def claim(self, key: str) -> Optional[threading.Event]:
+        """
+        Mark `key` as being transcribed by the caller (returns None; call
+        release() when done), or return the Event of the transcription already
+        running for it.
+        """
+        with self._lock:
+            if key in self._in_flight:
+                return self._in_flight[key]
+            self._in_flight[key] = threading.Event()
+            return None
+
+    def release(self, key: str):
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def wait(self, key: str, event: threading.Event) -> Optional[dict]:
+        """Wait for the in-flight transcription of `key` and return its cached result."""
+        event.wait(TRANSCRIPT_CACHE_WAIT)
+        return self.get(key, kind="coalesced")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            entries = len(self._entries)
+            in_flight = len(self._in_flight)
+        hits = stats["hits"] + stats["pcm_hits"] + stats["coalesced"]
+        lookups = hits + stats["misses"]
+        return {
+            "enabled": True,
+            **stats,
+            "entries": entries,
+            "in_flight": in_flight,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
+
+
+_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> Optional[TranscriptCache]:
+    """The transcription cache singleton, or None when disabled"""
+    global _cache
+    if not TRANSCRIPT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = TranscriptCache()
+    return _cache
+
+
+def transcript_cache_snapshot() -> dict:
+    cache = get_transcript_cache()
+    return cache.snapshot() if cache is not None else {"enabled": False}
@@ -0,0 +1,113 @@
+"""
+Farmer external_id -> users.id resolution.
+
+Users are created with a single INSERT ... ON CONFLICT DO NOTHING RETURNING, so
+concurrent first requests for the same farmer (in any worker) can no longer race
+on the unique index. Resolved ids are kept in a bounded per-process LRU, which
+makes steady-state lookups free.
+"""
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models.db_models import User
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+
+
+class UserResolver:
+    """Bounded LRU cache in front of an idempotent user upsert."""
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE):
+        self.max_size = max_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "inserted": 0}
+
+    def cached(self, external_id: str) -> Optional[int]:
+        user_id = self._cache.get(external_id)
+        if user_id is not None:
+            self._cache.move_to_end(external_id)
+        return user_id
+
+    def _remember(self, external_id: str, user_id: int):
+        self._cache[external_id] = user_id
+        self._cache.move_to_end(external_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def forget(self, external_ids: Iterable[str]):
+        """Drop entries whose rows may have been rolled back with the caller's transaction."""
+        for external_id in external_ids:
+            self._cache.pop(external_id, None)
+
+    async def resolve_many(self, session, external_ids: Iterable[str]) -> Dict[str, int]:
+        """
+        Map every external id to its users.id, creating missing users.
+        Cache hits cost nothing; misses cost one upsert plus, only for users that
+        already existed but were not cached, one SELECT. The caller commits.
+        """
+        resolved = {}
+        missing = []
+        for external_id in dict.fromkeys(e for e in external_ids if e):
+            user_id = self.cached(external_id)
+            if user_id is not None:
+                resolved[external_id] = user_id
+                self.stats["hits"] += 1
+            else:
+                missing.append(external_id)
+        if not missing:
+            return resolved
+        self.stats["misses"] += len(missing)
+
+        values = [{"external_id": external_id} for external_id in missing]
+        dialect = session.bind.dialect.name
+        if dialect == "postgresql":
+            stmt = (
+                postgresql.insert(User)
+                .values(values)
+                .on_conflict_do_nothing(index_elements=[User.external_id])
+                .returning(User.external_id, User.id)
+            )
+            found = dict((await session.execute(stmt)).all())
+        else:
+            # SQLite under SQLAlchemy 1.4 has no INSERT ... RETURNING
+            stmt = sqlite.insert(User).values(values).on_conflict_do_nothing(index_elements=[User.external_id])
+            await session.execute(stmt)
+            found = {}
+        self.stats["inserted"] += len(found)
+
+        # Rows that already existed are skipped by DO NOTHING and not returned
+        existing = [external_id for external_id in missing if external_id not in found]
+        if existing:
+            result = await session.execute(
+                select(User.external_id, User.id).where(User.external_id.in_(existing))
+            )
+            found.update(result.all())
+
+        for external_id, user_id in found.items():
+            self._remember(external_id, user_id)
+        resolved.update(found)
+        return resolved
+
+    async def resolve(self, session, external_id: str) -> Optional[int]:
+        if not external_id:
+            return None
+        return (await self.resolve_many(session, [external_id])).get(external_id)
+
+
+# Process-wide resolver
+_resolver: Optional[UserResolver] = None
+
+
+def get_user_resolver() -> UserResolver:
+    """Get or create the user resolver singleton"""
+    global _resolver
+    if _resolver is None:
+        _resolver = UserResolver()
+    return _resolver
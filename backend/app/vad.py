@@ -0,0 +1,243 @@
+"""
+Voice activity detection before transcription.
+
+Voice notes often start and end with long silences, and contain pauses or
+background noise between sentences. Before STT the (normalized) recording is
+decoded to 16 kHz PCM and split into 30 ms frames. Speech frames are those
+whose energy is VAD_MARGIN_DB above the recording's own noise floor (or, when
+the optional `webrtcvad` package is installed and VAD_MODE=webrtc, those
+WebRTC's VAD accepts). Then:
+
+- recordings without speech are rejected without any upstream STT call,
+- leading/trailing silence is cut and long pauses are shortened,
+- recordings with more than VAD_CHUNK_SECONDS of speech are split at pauses into
+  chunks that are transcribed concurrently and merged in order.
+
+Everything runs on CPU with NumPy; VAD needs ffmpeg for decoding (see app.audio)
+and is skipped without it.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.audio import AUDIO_SAMPLE_RATE, FFMPEG_BIN, decode_pcm, encode_opus, normalized_store
+
+# webrtcvad is optional; the energy detector needs nothing beyond NumPy
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
+load_dotenv()
+
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+VAD_MODE = os.getenv("VAD_MODE", "energy").lower()  # energy | webrtc
+VAD_WEBRTC_AGGRESSIVENESS = int(os.getenv("VAD_WEBRTC_AGGRESSIVENESS", 2))
+VAD_FRAME_MS = 30
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", 10))  # speech must be this far above the noise floor
+VAD_MIN_DBFS = float(os.getenv("VAD_MIN_DBFS", -50))  # and at least this loud
+# Frames this loud always count (steady speech or noise leaves no quiet floor to compare with)
+VAD_SPEECH_DBFS = float(os.getenv("VAD_SPEECH_DBFS", -35))
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", 200))  # kept around every speech run
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", 250))  # shorter bursts are noise
+VAD_MAX_PAUSE_MS = int(os.getenv("VAD_MAX_PAUSE_MS", 600))  # longer pauses are cut down to this
+VAD_CHUNK_SECONDS = float(os.getenv("VAD_CHUNK_SECONDS", 45))  # split for concurrent STT above this
+VAD_CHUNK_CONCURRENCY = int(os.getenv("VAD_CHUNK_CONCURRENCY", 4))
+
+_stats_lock = threading.Lock()
+vad_stats = {
+    "recordings": 0,
+    "rejected_empty": 0,
+    "split": 0,
+    "chunks": 0,
+    "seconds_in": 0.0,
+    "seconds_kept": 0.0,
+}
+
+
+@dataclass
+class SpeechPlan:
+    """What to transcribe for one recording."""
+    duration: float
+    speech_seconds: float
+    chunks: List[str] = field(default_factory=list)  # audio files, in order
+    chunk_seconds: List[float] = field(default_factory=list)
+    temp_files: List[str] = field(default_factory=list)
+    pcm_digest: Optional[str] = None  # SHA-256 of the decoded PCM, same for re-encoded copies
+
+    @property
+    def empty(self) -> bool:
+        return not self.chunks
+
+    @property
+    def seconds_saved(self) -> float:
+        return max(0.0, self.duration - self.speech_seconds)
+
+    def report(self) -> dict:
+        return {
+            "duration_seconds": round(self.duration, 2),
+            "speech_seconds": round(self.speech_seconds, 2),
+            "seconds_saved": round(self.seconds_saved, 2),
+            "chunks": len(self.chunks),
+        }
+
+    def cleanup(self):
+        for path in self.temp_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _frame_energy_db(samples: np.ndarray, frame: int) -> np.ndarray:
+    frames = samples[: len(samples) // frame * frame].reshape(-1, frame).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+    return 20 * np.log10(rms)
+
+
+def speech_frames(samples: np.ndarray, sample_rate: int = AUDIO_SAMPLE_RATE) -> np.ndarray:
+    """Boolean speech mask, one entry per VAD_FRAME_MS frame."""
+    frame = sample_rate * VAD_FRAME_MS // 1000
+    if VAD_MODE == "webrtc" and WEBRTCVAD_AVAILABLE:
+        vad = webrtcvad.Vad(VAD_WEBRTC_AGGRESSIVENESS)
+        data = samples.astype("<i2").tobytes()
+        step = frame * 2
+        return np.array(
+            [vad.is_speech(data[i:i + step], sample_rate) for i in range(0, len(data) - step + 1, step)],
+            dtype=bool,
+        )
+    energy = _frame_energy_db(samples, frame)
+    if not len(energy):
+        return np.zeros(0, dtype=bool)
+    noise_floor = np.percentile(energy, 10)
+    return energy > max(min(noise_floor + VAD_MARGIN_DB, VAD_SPEECH_DBFS), VAD_MIN_DBFS)
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """[start, end) index pairs of the True runs in `mask`."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def speech_segments(samples: np.ndarray, sample_rate: int = AUDIO_SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """[start, end) sample ranges containing speech, padded and with short bursts dropped."""
+    mask = speech_frames(samples, sample_rate)
+    frame = sample_rate * VAD_FRAME_MS // 1000
+    min_frames = max(1, VAD_MIN_SPEECH_MS // VAD_FRAME_MS)
+    mask = mask.copy()
+    for start, end in _runs(mask):
+        if end - start < min_frames:
+            mask[start:end] = False
+    pad = VAD_PAD_MS // VAD_FRAME_MS
+    if pad and mask.any():
+        # Dilate by `pad` frames on both sides so word onsets/endings are kept
+        mask = np.convolve(mask.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode="same") > 0
+    return [(int(start) * frame, min(int(end) * frame, len(samples))) for start, end in _runs(mask)]
+
+
+def plan_chunks(segments: List[Tuple[int, int]], sample_rate: int = AUDIO_SAMPLE_RATE) -> List[List[Tuple[int, int]]]:
+    """Group speech segments, in order, into chunks of at most VAD_CHUNK_SECONDS of audio."""
+    limit = int(VAD_CHUNK_SECONDS * sample_rate)
+    chunks, current, size = [], [], 0
+    for start, end in segments:
+        # A single very long segment is hard-split
+        while end - start > limit:
+            if current:
+                chunks.append(current)
+                current, size = [], 0
+            chunks.append([(start, start + limit)])
+            start += limit
+        if current and size + (end - start) > limit:
+            chunks.append(current)
+            current, size = [], 0
+        current.append((start, end))
+        size += end - start
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _join(samples: np.ndarray, segments: List[Tuple[int, int]], sample_rate: int) -> np.ndarray:
+    """Concatenate segments, keeping at most VAD_MAX_PAUSE_MS of the pause between them."""
+    max_pause = sample_rate * VAD_MAX_PAUSE_MS // 1000
+    parts = []
+    for i, (start, end) in enumerate(segments):
+        if i:
+            gap_start = segments[i - 1][1]
+            parts.append(samples[gap_start:gap_start + min(start - gap_start, max_pause)])
+        parts.append(samples[start:end])
+    return np.concatenate(parts) if parts else samples[:0]
+
+
+def prepare_speech(audio_path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> Optional[SpeechPlan]:
+    """
+    Trim and split `audio_path` for transcription. Returns None when VAD is
+    unavailable (the file should then be transcribed as is).
+    """
+    if not VAD_ENABLED or not FFMPEG_BIN:
+        return None
+    pcm = decode_pcm(audio_path, sample_rate)
+    samples = np.frombuffer(pcm, dtype="<i2")
+    duration = len(samples) / sample_rate
+    segments = speech_segments(samples, sample_rate)
+    chunks = plan_chunks(segments, sample_rate)
+    kept = [_join(samples, chunk, sample_rate) for chunk in chunks]
+    plan = SpeechPlan(
+        duration=duration,
+        speech_seconds=sum(len(k) for k in kept) / sample_rate,
+        pcm_digest=hashlib.sha256(pcm).hexdigest(),
+    )
+    if len(chunks) == 1 and plan.seconds_saved < 0.5:
+        # Nothing worth trimming - transcribe the (normalized) file itself
+        plan.chunks = [audio_path]
+        plan.chunk_seconds = [duration]
+    else:
+        try:
+            for audio in kept:
+                path = normalized_store.temp_path(".ogg")
+                plan.temp_files.append(path)
+                encode_opus(audio.astype("<i2").tobytes(), path, sample_rate)
+                plan.chunks.append(path)
+                plan.chunk_seconds.append(len(audio) / sample_rate)
+        except BaseException:
+            plan.cleanup()
+            raise
+    with _stats_lock:
+        vad_stats["recordings"] += 1
+        vad_stats["rejected_empty"] += plan.empty
+        vad_stats["split"] += len(plan.chunks) > 1
+        vad_stats["chunks"] += len(plan.chunks)
+        vad_stats["seconds_in"] += duration
+        vad_stats["seconds_kept"] += plan.speech_seconds
+    return plan
+
+
+_chunk_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_chunk_executor() -> ThreadPoolExecutor:
+    """Shared pool for transcribing the chunks of split recordings concurrently"""
+    global _chunk_executor
+    if _chunk_executor is None:
+        _chunk_executor = ThreadPoolExecutor(max_workers=VAD_CHUNK_CONCURRENCY, thread_name_prefix="stt-chunk")
+    return _chunk_executor
+
+
+def vad_snapshot() -> dict:
+    with _stats_lock:
+        stats = dict(vad_stats)
+    return {
+        "enabled": VAD_ENABLED and bool(FFMPEG_BIN),
+        "mode": "webrtc" if VAD_MODE == "webrtc" and WEBRTCVAD_AVAILABLE else "energy",
+        **stats,
+        "seconds_in": round(stats["seconds_in"], 2),
+        "seconds_kept": round(stats["seconds_kept"], 2),
+        "seconds_saved": round(stats["seconds_in"] - stats["seconds_kept"], 2),
+    }
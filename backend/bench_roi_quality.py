@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Compare Gemini diagnoses from the full-resolution photo vs the detection-guided
+overview + crops (app.farm_agent.image_roi).
+
+Usage:
+    python bench_roi_quality.py photo1.jpg [photo2.jpg ...] [--prompt "..."]
+
+For each image: YOLO detections, bytes uploaded and Gemini latency for both
+inputs, both replies, and their word overlap (Jaccard) as a rough agreement
+score. Needs GEMINI_API_KEY; read the replies side by side before changing
+ROI_* defaults.
+"""
+import argparse
+import mimetypes
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_PROMPT = (
+    "You are an agricultural expert. Look at this crop photo and name the most likely "
+    "disease or pest, your confidence, and one treatment. Answer in three short lines."
+)
+
+
+def words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def ask(model, parts, prompt):
+    start = time.perf_counter()
+    response = model.generate_content([*parts, prompt])
+    return response.text.strip(), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    args = parser.parse_args()
+
+    from google.generativeai.types import Part
+    from app.farm_agent.image_roi import build_image_parts
+    from app.farm_agent.langgraph_app import gemini_model
+    from app.models.vision import run_vision_classifier
+
+    agreement = []
+    total_full = total_roi = 0
+    for path in args.images:
+        result = run_vision_classifier(path)
+        detections = len(result.get("raw_detections") or [])
+        with open(path, "rb") as f:
+            data = f.read()
+        mime_type = mimetypes.guess_type(path)[0] or "image/jpeg"
+        full_reply, full_s = ask(gemini_model, [Part.from_data(data=data, mime_type=mime_type)], args.prompt)
+
+        images, note = build_image_parts(path, result)
+        roi_parts = [Part.from_data(data=d, mime_type="image/jpeg") for d in images]
+        roi_reply, roi_s = ask(gemini_model, roi_parts, f"{note}\n\n{args.prompt}" if note else args.prompt)
+
+        roi_bytes = sum(len(d) for d in images)
+        total_full += len(data)
+        total_roi += roi_bytes
+        a, b = words(full_reply), words(roi_reply)
+        jaccard = len(a & b) / max(len(a | b), 1)
+        agreement.append(jaccard)
+        print(f"\n=== {path} ({detections} detections)")
+        print(f"full: {len(data):>9} bytes {full_s:6.2f}s | {full_reply}")
+        print(f"roi:  {roi_bytes:>9} bytes {roi_s:6.2f}s ({len(images)} images) | {roi_reply}")
+        print(f"word overlap: {jaccard:.2f}")
+
+    print(f"\nbytes: full {total_full}, roi {total_roi} ({100 * (1 - total_roi / max(total_full, 1)):.1f}% saved)")
+    print(f"mean word overlap: {sum(agreement) / len(agreement):.2f}")
+
+
+if __name__ == "__main__":
+    main()
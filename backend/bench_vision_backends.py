@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compare vision inference backends on CPU: PyTorch (ultralytics) vs ONNX Runtime
+(fp32 and dynamically quantized int8).
+
+Usage:
+    python bench_vision_backends.py [--images 32] [--batch 8] [--backends torch,onnx,onnx-int8] [--image path.jpg]
+
+Each backend runs in its own subprocess so resident memory is measured in
+isolation. Reported per backend: model load time, single-image latency
+(p50/p95), batched throughput, and RSS after load and at peak. The ONNX model
+is exported from the PyTorch weights on first use (VISION_ONNX_PATH).
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_vision_batch import make_images
+
+BACKEND_ENV = {
+    "torch": {"VISION_BACKEND": "torch"},
+    "onnx": {"VISION_BACKEND": "onnx", "VISION_ONNX_INT8": "false"},
+    "onnx-int8": {"VISION_BACKEND": "onnx", "VISION_ONNX_INT8": "true"},
+}
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_worker(paths, batch):
+    """Benchmark the backend selected by the environment; prints one JSON line."""
+    from app.models import vision
+
+    start = time.perf_counter()
+    vision.warmup(1)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    latencies = []
+    for path in paths:
+        t0 = time.perf_counter()
+        vision.predict_batch([path])
+        latencies.append(1000 * (time.perf_counter() - t0))
+
+    start = time.perf_counter()
+    detections = 0
+    for i in range(0, len(paths), batch):
+        detections += sum(len(r["raw_detections"]) for r in vision.predict_batch(paths[i:i + batch]))
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "load_s": load_seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "images_per_s": len(paths) / elapsed,
+        "detections": detections,
+        "rss_loaded_mb": rss_loaded,
+        "rss_peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--image", help="real image to replicate instead of synthetic noise")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--paths", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.paths.split(","), args.batch)
+        return
+
+    paths = make_images(args.images, args.image)
+    print(f"images: {len(paths)}, batch: {args.batch}, CPUs: {os.cpu_count()}")
+    print(f"\n{'backend':>10} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'images/s':>9} {'dets':>6} {'RSS MB':>8} {'peak MB':>8}")
+    for backend in args.backends.split(","):
+        env = {**os.environ, **BACKEND_ENV[backend], "VISION_BATCHING": "false", "VISION_WORKERS": "0"}
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", "--batch", str(args.batch), "--paths", ",".join(paths)],
+            env=env, capture_output=True, text=True,
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            print(f"{backend:>10} ❌ failed: {(proc.stderr or proc.stdout).strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(lines[-1])
+        print(
+            f"{backend:>10} {r['load_s']:>8.2f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['images_per_s']:>9.2f} "
+            f"{r['detections']:>6} {r['rss_loaded_mb']:>8.0f} {r['rss_peak_mb']:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
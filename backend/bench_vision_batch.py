@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark batched YOLO inference on CPU: images/second per batch size.
+
+Usage:
+    python bench_vision_batch.py [--images 64] [--batch-sizes 1,2,4,8,16] [--image path.jpg]
+
+Without --image, synthetic 1280x960 JPEGs are generated. The second table drives
+run_vision_classifier() from concurrent threads to show what the in-process
+micro-batcher (VISION_MAX_BATCH / VISION_MAX_WAIT_MS) achieves end to end.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# --image copies differ only in JPEG quality, so the perceptual-hash vision cache
+# would answer most run_vision_classifier() calls; measure inference instead.
+# Set before app imports (load_dotenv does not override existing variables).
+os.environ["VISION_CACHE_ENABLED"] = "false"
+
+
+def make_images(count, source=None):
+    from PIL import Image
+    tmpdir = tempfile.mkdtemp(prefix="bench_vision_")
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(tmpdir, f"img_{i}.jpg")
+        if source:
+            Image.open(source).convert("RGB").save(path, quality=90 - i % 5)
+        else:
+            Image.fromarray(rng.integers(0, 255, (960, 1280, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--image", help="real image to replicate instead of synthetic noise")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent callers for the batcher run")
+    args = parser.parse_args()
+
+    import torch
+    from app.models import vision
+
+    model, error = vision._get_model()
+    if model is None:
+        print(f"❌ Model not available: {error}")
+        sys.exit(1)
+
+    paths = make_images(args.images, args.image)
+    print(f"CPU threads: {torch.get_num_threads()}, images: {len(paths)}")
+    vision.predict_batch(paths[:2])  # warmup
+
+    print("\nDirect predict_batch")
+    print(f"{'batch':>6} {'images/s':>10} {'ms/image':>10}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        start = time.perf_counter()
+        for i in range(0, len(paths), batch_size):
+            vision.predict_batch(paths[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>6} {len(paths) / elapsed:>10.2f} {1000 * elapsed / len(paths):>10.1f}")
+
+    print(f"\nrun_vision_classifier from {args.threads} threads (micro-batcher)")
+    print(f"{'max_batch':>9} {'images/s':>10} {'avg batch':>10}")
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        vision._batcher = vision.VisionBatcher(max_batch=batch_size)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(vision.run_vision_classifier, paths))
+        elapsed = time.perf_counter() - start
+        stats = vision._batcher.stats
+        print(f"{batch_size:>9} {len(paths) / elapsed:>10.2f} {stats['requests'] / max(stats['batches'], 1):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory of a running gunicorn deployment.
+
+Usage:
+    python bench_worker_memory.py <master pid>
+
+For the master and each worker, prints RSS, PSS and USS (unique memory). USS
+is what one more worker costs. Compare PREFORK_PRELOAD=true vs false at the same
+WEB_CONCURRENCY (send one image request per worker first so lazily loaded
+models are in memory in the non-preloaded case).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.prefork import memory_usage
+
+
+def children(pid):
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    return pids
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    master = int(sys.argv[1])
+    workers = children(master)
+    print(f"{'process':>10} {'pid':>8} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8} {'shared MB':>10}")
+    total_pss = 0.0
+    for role, pid in [("master", master)] + [("worker", w) for w in workers]:
+        m = memory_usage(pid)
+        total_pss += m["pss_mb"]
+        print(f"{role:>10} {pid:>8} {m['rss_mb']:>8} {m['pss_mb']:>8} {m['uss_mb']:>8} {m['shared_mb']:>10}")
+    if workers:
+        avg_uss = sum(memory_usage(w)["uss_mb"] for w in workers) / len(workers)
+        print(f"\n{len(workers)} workers, avg unique per worker: {avg_uss:.1f} MB, total (PSS): {total_pss:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
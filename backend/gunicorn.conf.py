@@ -0,0 +1,43 @@
+"""
+Gunicorn config for multi-worker deployments:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+With PREFORK_PRELOAD=true the app and the vision model are loaded once in the
+master and shared copy-on-write by all workers (see app.prefork). Check the
+per-worker memory with `python bench_worker_memory.py <master pid>`.
+
+Set PROMETHEUS_MULTIPROC_DIR (an empty directory) so /metrics aggregates the
+samples of all workers.
+"""
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+preload_app = os.getenv("PREFORK_PRELOAD", "false").lower() == "true"
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before workers are forked
+    if preload_app:
+        from app.prefork import preload_before_fork
+        preload_before_fork()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.prefork import after_fork
+        after_fork(workers)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
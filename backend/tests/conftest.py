@@ -0,0 +1,32 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Settings are read at import time, so point the app at a throwaway SQLite
+# database (and keep it off Postgres/S3) before anything under app/ is imported.
+_tmpdir = tempfile.mkdtemp(prefix="krishibondhu-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["DATABASE_READ_URL"] = ""
+os.environ["UPLOAD_DIR"] = os.path.join(_tmpdir, "uploads")
+os.environ["STORAGE_BACKEND"] = "local"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def db_engine():
+    """The app's engine with a fresh schema for each test."""
+    from app.db import engine
+    from app.models.db_models import Base
+
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(reset())
+    yield engine
+    asyncio.run(engine.dispose())
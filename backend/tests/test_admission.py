@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, Form
+from fastapi.testclient import TestClient
+
+from app import admission
+from app.admission import Admission, AdmissionController, Overloaded, admission_middleware, admit
+
+
+def test_queue_full_is_rejected_with_retry_after():
+    controller = AdmissionController(max_concurrent=1, max_queue=0, max_wait=5, degrade_at=10)
+
+    async def run():
+        first = await controller.acquire()
+        with pytest.raises(Overloaded) as excinfo:
+            await controller.acquire()
+        controller.release(first)
+        return excinfo.value
+
+    exc = asyncio.run(run())
+    assert exc.reason == "queue_full"
+    assert exc.retry_after >= 1
+    assert controller.snapshot()["rejected"] == 1
+
+
+def test_waiter_times_out_after_max_wait():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait=0.05, degrade_at=10)
+    controller.avg_run_seconds = 0.01  # estimated wait stays under max_wait
+
+    async def run():
+        await controller.acquire()
+        with pytest.raises(Overloaded) as excinfo:
+            await controller.acquire()
+        return excinfo.value
+
+    assert asyncio.run(run()).reason == "timeout"
+    assert controller.waiting == 0
+
+
+def test_runs_beyond_degrade_at_are_degraded():
+    controller = AdmissionController(max_concurrent=4, max_queue=0, max_wait=5, degrade_at=2)
+
+    async def run():
+        return [(await controller.acquire()).degraded for _ in range(3)]
+
+    assert asyncio.run(run()) == [False, False, True]
+
+
+@pytest.fixture
+def app_with(monkeypatch):
+    """A pipeline-shaped endpoint behind the admission middleware, with the given controller."""
+    calls = []
+
+    def make(controller):
+        monkeypatch.setattr(admission, "_controller", controller)
+        app = FastAPI()
+        app.middleware("http")(admission_middleware)
+
+        def dependency():
+            calls.append("dependency")
+
+        @app.post("/api/chat")
+        async def chat(message: str = Form(...), granted: Admission = Depends(admit), _=Depends(dependency)):
+            return {"message": message, "degraded": granted.degraded}
+
+        @app.post("/api/other")
+        async def other():
+            return {"ok": True}
+
+        return TestClient(app), calls
+
+    return make
+
+
+def test_overloaded_request_gets_503_before_dependencies_run(app_with):
+    controller = AdmissionController(max_concurrent=1, max_queue=0, max_wait=5, degrade_at=10)
+    controller._slots = asyncio.Semaphore(0)  # every slot taken
+    client, calls = app_with(controller)
+    response = client.post("/api/chat", data={"message": "hi"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["error"] == "overloaded"
+    assert response.json()["retry_after"] == int(response.headers["Retry-After"])
+    assert calls == []
+    # Paths outside the pipeline are not subject to admission
+    assert client.post("/api/other").status_code == 200
+
+
+def test_admitted_request_releases_its_slot(app_with):
+    controller = AdmissionController(max_concurrent=1, max_queue=0, max_wait=5, degrade_at=10)
+    client, calls = app_with(controller)
+    for _ in range(2):
+        response = client.post("/api/chat", data={"message": "hi"})
+        assert response.status_code == 200
+        assert response.json() == {"message": "hi", "degraded": False}
+    assert calls == ["dependency", "dependency"]
+    assert controller.running == 0
+    assert controller.snapshot()["completed"] == 2
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from app.bulkhead import Bulkhead, BulkheadFull, get_bulkhead
+
+
+def test_saturated_bulkhead_with_no_queue_fails_fast():
+    bulkhead = Bulkhead("llm", concurrency=1, queue=0, timeout=5)
+    with bulkhead:
+        with pytest.raises(BulkheadFull) as excinfo:
+            bulkhead.acquire()
+    assert excinfo.value.name == "llm"
+    assert "queue full" in str(excinfo.value)
+    snapshot = bulkhead.snapshot()
+    assert snapshot["rejected"] == 1 and snapshot["active"] == 0 and snapshot["calls"] == 1
+
+
+def test_queued_call_times_out_when_no_slot_frees():
+    bulkhead = Bulkhead("tts", concurrency=1, queue=1, timeout=0.05)
+    with bulkhead:
+        with pytest.raises(BulkheadFull) as excinfo:
+            bulkhead.acquire()
+    assert "no slot within" in str(excinfo.value)
+    snapshot = bulkhead.snapshot()
+    assert snapshot["timeouts"] == 1 and snapshot["waiting"] == 0
+
+
+def test_queued_call_runs_once_a_slot_frees():
+    bulkhead = Bulkhead("stt", concurrency=1, queue=1, timeout=5)
+    bulkhead.acquire()
+    waiting = threading.Event()
+    done = threading.Event()
+
+    def waiter():
+        waiting.set()
+        with bulkhead:
+            done.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    waiting.wait(1)
+    # Queue is now occupied by the waiter: a third caller is turned away
+    deadline = time.monotonic() + 1
+    while bulkhead.snapshot()["waiting"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    with pytest.raises(BulkheadFull):
+        bulkhead.acquire()
+    bulkhead.release()
+    thread.join(1)
+    assert done.is_set()
+    snapshot = bulkhead.snapshot()
+    assert snapshot["calls"] == 2 and snapshot["rejected"] == 1 and snapshot["active"] == 0
+
+
+def test_slot_is_released_when_the_call_raises():
+    bulkhead = Bulkhead("weather", concurrency=1, queue=0, timeout=5)
+    with pytest.raises(ValueError):
+        with bulkhead:
+            raise ValueError("upstream error")
+    with bulkhead:
+        pass
+    assert bulkhead.snapshot()["active"] == 0
+
+
+def test_bulkheads_are_sized_from_env(monkeypatch):
+    monkeypatch.setenv("BULKHEAD_TESTDEP_CONCURRENCY", "3")
+    monkeypatch.setenv("BULKHEAD_TESTDEP_QUEUE", "0")
+    bulkhead = get_bulkhead("testdep")
+    assert (bulkhead.concurrency, bulkhead.queue) == (3, 0)
+    assert get_bulkhead("testdep") is bulkhead
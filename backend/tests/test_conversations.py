@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from app.api import routes
+from app.api.routes import _decode_cursor, _encode_cursor
+from app.db import AsyncSessionLocal
+from app.models.db_models import Conversation
+
+BASE_TIME = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 5, 7, 8, 9, 123456)
+    cursor = _encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert _decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", _encode_cursor(BASE_TIME, 1)[:-3]])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        _decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+
+
+@pytest.fixture
+def client(db_engine):
+    # Seven rows, two of which share a created_at so the id tie-break matters
+    rows = [
+        {"transcript": f"t{i}", "crop": "rice", "language": "bn" if i % 2 else "en",
+         "created_at": BASE_TIME + timedelta(minutes=min(i, 5))}
+        for i in range(1, 8)
+    ]
+
+    async def seed():
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(Conversation), rows)
+            await session.commit()
+
+    asyncio.run(seed())
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_default_request_is_one_page_without_metadata(client):
+    async def add_rows():
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(Conversation), [
+                {"transcript": "old", "meta_data": {"weather_forecast": {}}, "created_at": BASE_TIME - timedelta(days=1)}
+            ] * routes.DEFAULT_PAGE_SIZE)
+            await session.commit()
+
+    asyncio.run(add_rows())
+    response = client.get("/api/conversations")
+    assert response.status_code == 200
+    page = response.json()
+    assert len(page) == routes.DEFAULT_PAGE_SIZE
+    assert [row["id"] for row in page[:3]] == [7, 6, 5]
+    assert "X-Next-Cursor" in response.headers
+    assert "metadata" not in page[0] and page[0]["crop"] == "rice"
+
+
+def test_metadata_is_returned_when_asked_for(client):
+    response = client.get("/api/conversations", params={"limit": 1, "fields": "id,metadata"})
+    assert list(response.json()[0]) == ["id", "metadata"]
+
+
+def test_pages_follow_the_cursor_without_gaps_or_repeats(client):
+    seen, params = [], {"limit": 3, "fields": "id,created_at"}
+    while True:
+        response = client.get("/api/conversations", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 3
+        seen.extend(row["id"] for row in page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 3, "cursor": cursor, "fields": "id,created_at"}
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_filters_are_case_insensitive(client):
+    response = client.get("/api/conversations", params={"crop": " Rice ", "language": "EN", "fields": "id,language"})
+    assert [row["id"] for row in response.json()] == [6, 4, 2]
+    assert {row["language"] for row in response.json()} == {"en"}
+
+
+def test_unknown_field_is_rejected(client):
+    response = client.get("/api/conversations", params={"fields": "id,password"})
+    assert response.status_code == 400
+
+
+def test_query_errors_are_not_reported_as_an_empty_history(client, monkeypatch):
+    async def broken(session, statement):
+        raise RuntimeError("query bug")
+
+    monkeypatch.setattr(routes, "execute_read", broken)
+    with pytest.raises(RuntimeError):
+        client.get("/api/conversations")
+
+
+def test_unreachable_database_returns_an_empty_history(client, monkeypatch):
+    async def unreachable(session, statement):
+        raise ConnectionRefusedError("db down")
+
+    monkeypatch.setattr(routes, "execute_read", unreachable)
+    response = client.get("/api/conversations")
+    assert response.status_code == 200 and response.json() == []
@@ -0,0 +1,64 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app import db
+from app.db import get_db, pool_stats
+
+
+def test_session_checks_out_a_connection_only_when_queried(db_engine):
+    async def run():
+        sessions = get_db()
+        session = await sessions.__anext__()
+        before_query = dict(db._pool_counters)
+        await session.execute(text("SELECT 1"))
+        during_query = dict(db._pool_counters)
+        await sessions.aclose()
+        return before_query, during_query
+
+    start = dict(db._pool_counters)
+    before_query, during_query = asyncio.run(run())
+    assert before_query == start
+    assert during_query["checkouts"] == start["checkouts"] + 1
+    assert during_query["in_use"] == start["in_use"] + 1
+    assert db._pool_counters["in_use"] == start["in_use"]  # returned when the request ends
+
+
+def test_unused_session_never_connects(db_engine):
+    async def run():
+        sessions = get_db()
+        await sessions.__anext__()
+        await sessions.aclose()
+
+    checkouts = db._pool_counters["checkouts"]
+    asyncio.run(run())
+    assert db._pool_counters["checkouts"] == checkouts
+
+
+def test_pool_stats_without_a_sized_pool(db_engine):
+    stats = pool_stats()
+    assert stats["pool_class"] == "NullPool"  # SQLite
+    assert {"checkouts", "in_use", "peak_in_use"} <= set(stats)
+    assert "utilization" not in stats
+
+
+def test_pool_stats_report_queue_pool_utilization(tmp_path, monkeypatch):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pooled.db'}", poolclass=AsyncAdaptedQueuePool, pool_size=2, max_overflow=2,
+    )
+    monkeypatch.setattr(db, "engine", engine)
+    monkeypatch.setattr(db, "DB_MAX_OVERFLOW", 2)
+
+    async def run():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            in_use = pool_stats()
+        await engine.dispose()
+        return in_use
+
+    stats = asyncio.run(run())
+    assert stats["pool_class"] == "AsyncAdaptedQueuePool"
+    assert stats["size"] == 2 and stats["checkedout"] == 1 and stats["max_overflow"] == 2
+    assert stats["utilization"] == 0.25
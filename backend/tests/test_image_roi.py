@@ -0,0 +1,61 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.farm_agent import image_roi
+from app.farm_agent.image_roi import build_image_parts, merge_regions
+from app.models.vision_result import VisionResult
+
+WIDTH, HEIGHT = 2000, 1500
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.jpg"
+    Image.new("RGB", (WIDTH, HEIGHT), (40, 120, 40)).save(path, quality=95)
+    return str(path)
+
+
+def detections(*boxes):
+    return VisionResult.from_detections(
+        xyxy=boxes, confidences=[0.9 - 0.1 * i for i in range(len(boxes))], classes=[0] * len(boxes),
+        image_size=(WIDTH, HEIGHT),
+    )
+
+
+def sizes(parts):
+    return [Image.open(io.BytesIO(part)).size for part in parts]
+
+
+def test_without_detections_only_a_downscaled_photo_is_sent(photo):
+    for result in (None, VisionResult.failure("busy"), detections()):
+        parts, note = build_image_parts(photo, result)
+        assert note == ""
+        assert sizes(parts) == [(image_roi.ROI_FALLBACK_MAX, image_roi.ROI_FALLBACK_MAX * HEIGHT // WIDTH)]
+
+
+def test_detected_regions_are_sent_as_crops_next_to_an_overview(photo):
+    parts, note = build_image_parts(photo, detections((100, 100, 300, 250), (1500, 1000, 1700, 1200)))
+    assert len(parts) == 3
+    assert max(sizes(parts)[0]) == image_roi.ROI_OVERVIEW_MAX
+    # Crops keep full detail (small regions are not downscaled)
+    assert all(max(size) <= image_roi.ROI_CROP_MAX for size in sizes(parts)[1:])
+    assert "2 image(s)" in note
+    assert "regions of interest" in note and "together with the overview" in note
+    assert "disease or pest damage was detected" not in note
+
+
+def test_overlapping_regions_become_one_crop(photo):
+    parts, _ = build_image_parts(photo, detections((100, 100, 300, 300), (250, 250, 450, 450)))
+    assert len(parts) == 2
+
+
+def test_regions_covering_most_of_the_photo_fall_back_to_the_full_image(photo):
+    parts, note = build_image_parts(photo, detections((0, 0, WIDTH, HEIGHT)))
+    assert note == "" and len(parts) == 1
+
+
+def test_merge_regions():
+    assert merge_regions([(0, 0, 10, 10), (5, 5, 15, 15), (20, 20, 30, 30)]) == [(0, 0, 15, 15), (20, 20, 30, 30)]
+    assert merge_regions([(0, 0, 10, 10), (10, 0, 20, 10)]) == [(0, 0, 10, 10), (10, 0, 20, 10)]  # touching only
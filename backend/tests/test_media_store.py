@@ -0,0 +1,57 @@
+import asyncio
+import io
+import os
+import threading
+
+from app import media_store as media_store_module
+from app.media_store import MediaStore
+
+
+class Upload:
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    async def read(self, size):
+        return self._data.read(size)
+
+
+def test_identical_uploads_are_stored_once(tmp_path):
+    store = MediaStore(str(tmp_path))
+
+    async def put_twice():
+        return [await store.put_upload(Upload(b"leaf photo"), ".jpg") for _ in range(2)]
+
+    first, second = asyncio.run(put_twice())
+    assert first == second and open(first, "rb").read() == b"leaf photo"
+    assert store.stats["stored"] == 1 and store.stats["deduplicated"] == 1
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(media_store_module.TEMP_PREFIX)]
+
+
+def test_upload_commit_runs_off_the_event_loop(tmp_path, monkeypatch):
+    store = MediaStore(str(tmp_path))
+    commit = store._commit
+    threads = []
+
+    def recording_commit(*args):
+        threads.append(threading.current_thread())
+        return commit(*args)
+
+    monkeypatch.setattr(store, "_commit", recording_commit)
+    asyncio.run(store.put_upload(Upload(b"clip"), ".ogg"))
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_nested_store_refreshes_under_the_outer_lock(tmp_path):
+    outer = MediaStore(str(tmp_path))
+    nested = MediaStore(str(tmp_path / "normalized"), lock_root=outer.root)
+    path = nested.put_file(_write(nested.temp_path(".ogg"), b"pcm"), ".ogg")
+    nested.put_file(_write(nested.temp_path(".ogg"), b"pcm"), ".ogg")
+    assert nested.stats["deduplicated"] == 1 and os.path.exists(path)
+    assert os.path.exists(tmp_path / media_store_module.LOCK_NAME)
+    assert not os.path.exists(tmp_path / "normalized" / media_store_module.LOCK_NAME)
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
@@ -0,0 +1,25 @@
+import os
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from app.metrics import METRICS_PREFIX, SnapshotCollector
+
+
+def scrape(collector):
+    registry = CollectorRegistry()
+    registry.register(collector)
+    return generate_latest(registry).decode()
+
+
+def test_snapshot_counters_are_counters_in_single_process_mode():
+    body = scrape(SnapshotCollector())
+    assert f"# TYPE {METRICS_PREFIX}_bulkhead_rejected_total counter" in body
+    assert 'pid="' not in body
+
+
+def test_per_process_snapshots_are_pid_labelled_gauges():
+    body = scrape(SnapshotCollector(per_process=True))
+    assert f"# TYPE {METRICS_PREFIX}_bulkhead_rejected_total gauge" in body
+    assert f'{METRICS_PREFIX}_bulkhead_rejected_total{{dependency="llm",pid="{os.getpid()}"}}' in body
+    samples = [line for line in body.splitlines() if line and not line.startswith("#")]
+    assert samples and all(f'pid="{os.getpid()}"' in line for line in samples)
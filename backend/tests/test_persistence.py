@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app import persistence
+from app.db import AsyncSessionLocal
+from app.models.db_models import Conversation, User
+from app.persistence import ConversationWriter
+
+
+def record(i, **extra):
+    return {"external_id": f"farmer-{i % 2}", "created_at": datetime.now(timezone.utc), "transcript": f"t{i}", **extra}
+
+
+def run_writer(writer, records, timeout=5):
+    async def run():
+        for r in records:
+            assert writer.enqueue(r)
+        await writer.stop(timeout=timeout)
+
+    asyncio.run(run())
+
+
+def test_queued_records_are_written_in_one_batch():
+    writer = ConversationWriter(batch_size=10, max_delay=0.05)
+    batches = []
+
+    async def write_batch(batch):
+        batches.append([r["transcript"] for r in batch])
+
+    writer._write_batch = write_batch
+    run_writer(writer, [record(i) for i in range(5)])
+    assert batches == [["t0", "t1", "t2", "t3", "t4"]]
+    assert writer.stats["written"] == 5 and writer.stats["batches"] == 1
+
+
+def test_batches_are_capped_at_batch_size():
+    writer = ConversationWriter(batch_size=2, max_delay=0.05)
+    sizes = []
+
+    async def write_batch(batch):
+        sizes.append(len(batch))
+
+    writer._write_batch = write_batch
+    run_writer(writer, [record(i) for i in range(5)])
+    assert sizes == [2, 2, 1]
+
+
+def test_unreachable_database_is_retried(monkeypatch):
+    writer = ConversationWriter(batch_size=10, max_delay=0.05)
+    calls = []
+
+    async def write_batch(batch):
+        calls.append(len(batch))
+        if len(calls) < 3:
+            raise OperationalError("INSERT", {}, ConnectionRefusedError("db down"))
+
+    async def no_sleep(delay):
+        pass
+
+    writer._write_batch = write_batch
+    monkeypatch.setattr(persistence.asyncio, "sleep", no_sleep)
+    run_writer(writer, [record(i) for i in range(3)])
+    assert calls == [3, 3, 3]
+    assert writer.stats["retries"] == 2
+    assert writer.stats["written"] == 3 and writer.stats["dropped"] == 0
+
+
+def test_rejected_batch_drops_only_the_bad_record():
+    writer = ConversationWriter(batch_size=10, max_delay=0.05)
+    written = []
+
+    async def write_batch(batch):
+        if any(r.get("bad") for r in batch):
+            raise ValueError("bad row")
+        written.extend(r["transcript"] for r in batch)
+
+    writer._write_batch = write_batch
+    run_writer(writer, [record(0), record(1), record(2, bad=True), record(3), record(4)])
+    assert written == ["t0", "t1", "t3", "t4"]
+    assert writer.stats["written"] == 4 and writer.stats["dropped"] == 1
+
+
+def test_full_queue_drops_instead_of_blocking():
+    writer = ConversationWriter(queue_size=1)
+
+    async def run():
+        writer.start()
+        accepted = [writer.enqueue(record(i)) for i in range(3)]
+        writer._task.cancel()
+        return accepted
+
+    assert asyncio.run(run()) == [True, False, False]
+    assert writer.stats["dropped"] == 2
+
+
+def test_records_reach_the_database_with_resolved_users(db_engine):
+    writer = ConversationWriter(batch_size=10, max_delay=0.05)
+    run_writer(writer, [record(i, language="bn") for i in range(4)])
+
+    async def load():
+        async with AsyncSessionLocal() as session:
+            users = dict((await session.execute(select(User.external_id, User.id))).all())
+            rows = (await session.execute(
+                select(Conversation.transcript, Conversation.user_id).order_by(Conversation.id)
+            )).all()
+        return users, rows
+
+    users, rows = asyncio.run(load())
+    assert set(users) == {"farmer-0", "farmer-1"}
+    assert rows == [(f"t{i}", users[f"farmer-{i % 2}"]) for i in range(4)]
+
+
+def test_database_outage_is_retried_with_metrics_enabled(tmp_path, monkeypatch):
+    # Regression: the statement-metrics error listener used to raise on failed
+    # connects, masking the OperationalError so outages dropped records
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app import metrics
+
+    assert metrics.METRICS_ENABLED
+    dead = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'db.sqlite'}")
+    metrics.instrument_engine(dead, "dead")
+    monkeypatch.setattr(persistence, "AsyncSessionLocal", sessionmaker(dead, expire_on_commit=False, class_=AsyncSession))
+
+    writer = ConversationWriter(batch_size=10, max_delay=0.05)
+    run_writer(writer, [record(0)], timeout=1)
+    assert writer.stats["retries"] >= 1
+    assert writer.stats["written"] == 0 and writer.stats["dropped"] == 1  # only given up at shutdown
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app import db
+from app.db import AsyncSessionLocal, execute_read, get_read_db, probe_replica, replica_usable
+from app.models.db_models import Base, Conversation
+
+TRANSCRIPTS = select(Conversation.transcript)
+
+
+@pytest.fixture
+def replica(db_engine, tmp_path, monkeypatch):
+    """A second SQLite file standing in for the read replica, with its own rows."""
+    return use_replica(monkeypatch, f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}", seed=True)
+
+
+@pytest.fixture
+def dead_replica(db_engine, tmp_path, monkeypatch):
+    # Its directory does not exist, so every connect fails with OperationalError
+    return use_replica(monkeypatch, f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}", seed=False)
+
+
+def run(coro):
+    async def settled():
+        try:
+            return await coro
+        finally:
+            # Let aiosqlite's worker thread report a failed connect before the loop closes
+            await asyncio.sleep(0.05)
+
+    return asyncio.run(settled())
+
+
+def use_replica(monkeypatch, url, seed):
+    # No pooling: each run() below has its own event loop
+    read_engine = create_async_engine(url, poolclass=NullPool)
+
+    async def setup():
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(Conversation), [{"transcript": "primary"}])
+            await session.commit()
+        if seed:
+            async with read_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.execute(insert(Conversation), [{"transcript": "replica"}])
+
+    run(setup())
+    monkeypatch.setattr(db, "read_engine", read_engine)
+    monkeypatch.setattr(db, "AsyncReadSessionLocal", sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession))
+    monkeypatch.setattr(db, "_replica_state", {"usable": False, "lag": None, "checked_at": 0.0, "fallbacks": 0, "last_error": None})
+    return read_engine
+
+
+def read_transcripts():
+    async def read():
+        sessions = get_read_db()
+        session = await sessions.__anext__()
+        try:
+            return [row[0] for row in (await execute_read(session, TRANSCRIPTS)).all()]
+        finally:
+            await sessions.aclose()
+
+    return run(read())
+
+
+def test_reads_use_the_primary_without_a_replica(db_engine):
+    assert db.read_engine is None and not replica_usable()
+
+    async def add():
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(Conversation), [{"transcript": "primary"}])
+            await session.commit()
+
+    run(add())
+    assert read_transcripts() == ["primary"]
+
+
+def test_reads_stay_on_the_primary_until_the_replica_is_checked(replica):
+    assert not replica_usable()
+    assert read_transcripts() == ["primary"]
+
+
+def test_healthy_replica_serves_reads(replica):
+    assert run(probe_replica()) is True
+    assert replica_usable() and db._replica_state["lag"] == 0.0
+    assert read_transcripts() == ["replica"]
+
+
+def test_unreachable_replica_is_skipped(dead_replica):
+    assert run(probe_replica()) is False
+    assert not replica_usable()
+    assert db._replica_state["fallbacks"] == 1 and db._replica_state["last_error"]
+    assert read_transcripts() == ["primary"]
+
+
+def test_replica_failing_mid_request_falls_back_to_the_primary(dead_replica):
+    # Healthy at the last check, gone by the time the query runs
+    db._replica_state["usable"] = True
+    assert read_transcripts() == ["primary"]
+    assert not replica_usable()
+    assert db._replica_state["fallbacks"] == 1
+
+
+def test_lagging_replica_is_not_usable(replica, monkeypatch):
+    monkeypatch.setattr(db, "DB_READ_MAX_LAG", -1.0)
+    assert run(probe_replica()) is False
+    assert not replica_usable() and db._replica_state["last_error"] is None
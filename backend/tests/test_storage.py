@@ -0,0 +1,75 @@
+import os
+from urllib.parse import urlparse
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from moto import mock_aws
+
+from app.api.utils import UPLOAD_DIR
+from app.storage import S3StorageBackend
+
+BUCKET = "krishibondhu-test"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        backend = S3StorageBackend(bucket=BUCKET, prefix="media/", endpoint_url=None)
+        yield backend
+        backend._executor.shutdown(wait=True)
+
+
+def media_file(name, size):
+    path = os.path.join(UPLOAD_DIR, "ab", name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def stored_bytes(backend, key):
+    return backend.client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_put_uses_the_media_store_path_as_key(s3):
+    path = media_file("reply.mp3", 1024)
+    assert s3.upload(path) == f"s3://{BUCKET}/media/ab/reply.mp3"
+    assert s3.upload(path) == f"s3://{BUCKET}/media/ab/reply.mp3"
+    with open(path, "rb") as f:
+        assert stored_bytes(s3, "media/ab/reply.mp3") == f.read()
+    assert s3.stats["uploads"] == 1 and s3.stats["skipped_existing"] == 1
+    assert s3.stats["bytes_uploaded"] == 1024
+
+
+def test_large_files_use_multipart_upload(s3):
+    # S3 requires multipart parts of at least 5 MiB (except the last)
+    part = 5 * 1024 * 1024
+    s3.transfer_config = TransferConfig(multipart_threshold=part, multipart_chunksize=part, max_concurrency=2)
+    path = media_file("photo.jpg", 2 * part + 100)
+    s3.upload(path)
+    head = s3.client.head_object(Bucket=BUCKET, Key="media/ab/photo.jpg")
+    assert head["ContentLength"] == 2 * part + 100
+    assert head["ETag"].strip('"').endswith("-3")  # multipart ETags carry the part count
+
+
+def test_offload_then_presign(s3):
+    path = media_file("later.mp3", 256)
+    assert s3.url_for(path) is None
+    s3.offload(path).result(timeout=10)
+    url = urlparse(s3.url_for(path))
+    assert url.netloc.startswith(BUCKET) and url.path == "/media/ab/later.mp3"
+    assert "Signature=" in url.query and "Expires=" in url.query
+    assert s3.offload(path) is None  # already in the bucket
+
+
+def test_remote_url_finds_objects_uploaded_by_another_worker(s3):
+    path = media_file("other.mp3", 64)
+    assert s3.remote_url(path) is None
+    s3.client.upload_file(path, BUCKET, "media/ab/other.mp3")
+    assert s3.remote_url(path) is not None
+    assert s3.url_for(path) is not None
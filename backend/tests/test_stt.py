@@ -0,0 +1,101 @@
+import pytest
+
+from app.llm import stt
+from app.llm.stt import BaseSTTBackend, StubSTTBackend, parse_routes, select_backend
+
+
+@pytest.fixture(autouse=True)
+def isolated_registry(monkeypatch):
+    # Fresh instances, routes and stats per test; the stub hashes raw bytes (no ffmpeg)
+    monkeypatch.setattr(stt, "STT_BACKENDS", dict(stt.STT_BACKENDS))
+    monkeypatch.setattr(stt, "_backends", {})
+    monkeypatch.setattr(stt, "_unusable", set())
+    monkeypatch.setattr(stt, "_routes", [])
+    monkeypatch.setattr(stt, "stt_stats", {})
+    monkeypatch.setattr(stt, "FFMPEG_BIN", None)
+    monkeypatch.setattr(stt, "STT_STUB_LANGUAGE", "")
+    monkeypatch.setattr(stt, "default_stt_provider", lambda: "stub")
+
+
+class FailingBackend(BaseSTTBackend):
+    name = "failing"
+
+    def transcribe(self, audio_path, language_hint=None):
+        raise RuntimeError("upstream down")
+
+
+class UnavailableBackend(BaseSTTBackend):
+    name = "unavailable"
+
+    def available(self):
+        return False
+
+
+def clip(tmp_path, data=b"\x00\x01" * 100, name="clip.ogg"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_parse_routes():
+    assert parse_routes("bn:20=whisper_cpp, *:5=stub") == [("bn", 20.0, "whisper_cpp"), ("*", 5.0, "stub")]
+    assert parse_routes("bn=stub,:*=openai") == [("bn", None, "stub"), ("*", None, "openai")]
+    assert parse_routes("") == [] and parse_routes(" , ") == []
+
+
+@pytest.mark.parametrize("spec", ["bn:20", "bn:twenty=stub"])
+def test_invalid_routes_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_routes(spec)
+
+
+def test_first_matching_route_wins(monkeypatch):
+    stt.register_stt_backend("failing", FailingBackend)
+    monkeypatch.setattr(stt, "_routes", parse_routes("bn:20=failing,*:5=stub"))
+    assert select_backend(10, "bn") == "failing"
+    assert select_backend(3, "bn") == "failing"
+    assert select_backend(30, "bn") == "stub"  # too long for any rule: default
+    assert select_backend(3, "en") == "stub"
+    assert select_backend(None, "bn") == "stub"  # unknown duration never matches a length limit
+
+
+def test_unknown_or_unavailable_backends_are_not_routed_to(monkeypatch):
+    stt.register_stt_backend("unavailable", UnavailableBackend)
+    monkeypatch.setattr(stt, "_routes", parse_routes("*=missing,*=unavailable"))
+    monkeypatch.setattr(stt, "default_stt_provider", lambda: "gemini")
+    assert select_backend(1, "bn") == "gemini"
+    assert stt._unusable == {"missing"}
+
+
+def test_registry_returns_one_instance_per_backend():
+    assert isinstance(stt.get_stt_backend("stub"), StubSTTBackend)
+    assert stt.get_stt_backend("stub") is stt.get_stt_backend("stub")
+    with pytest.raises(ValueError):
+        stt.get_stt_backend("missing")
+
+
+def test_stub_transcripts_are_deterministic(tmp_path):
+    backend = StubSTTBackend()
+    first = backend.transcribe(clip(tmp_path, name="a.ogg"))
+    assert first == backend.transcribe(clip(tmp_path, name="b.ogg"))
+    assert first["text"].startswith("stub transcript ") and first["language"] == "en"
+    assert backend.transcribe(clip(tmp_path, b"other", name="c.ogg")) != first
+    assert backend.transcribe(clip(tmp_path, name="d.ogg"), language_hint="bn")["language"] == "bn"
+
+
+def test_stub_reads_a_sidecar_transcript(tmp_path):
+    path = clip(tmp_path)
+    (tmp_path / "clip.ogg.txt").write_text("ধানের পাতায় দাগ\n", encoding="utf-8")
+    assert StubSTTBackend().transcribe(path) == {"text": "ধানের পাতায় দাগ", "language": "bn"}
+
+
+def test_failed_route_falls_back_to_the_default_provider(tmp_path, monkeypatch):
+    stt.register_stt_backend("failing", FailingBackend)
+    monkeypatch.setattr(stt, "_routes", parse_routes("*=failing"))
+    result = stt.transcribe(clip(tmp_path), duration=2.0)
+    assert result["backend"] == "stub" and result["text"].startswith("stub transcript")
+    snapshot = stt.stt_snapshot()
+    assert snapshot["backends"]["failing"]["failures"] == 1
+    assert snapshot["backends"]["stub"]["requests"] == 1 and snapshot["backends"]["stub"]["failures"] == 0
+    assert snapshot["routes"] == [{"language": "*", "max_seconds": None, "backend": "failing"}]
+    assert "failing" in snapshot["registered"]
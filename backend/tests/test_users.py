@@ -0,0 +1,56 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from app.db import AsyncSessionLocal
+from app.models.db_models import User
+from app.users import UserResolver
+
+
+def resolve(resolver, external_ids):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            resolved = await resolver.resolve_many(session, external_ids)
+            await session.commit()
+            count = (await session.execute(select(func.count()).select_from(User))).scalar()
+        return resolved, count
+
+    return asyncio.run(run())
+
+
+def test_creates_missing_users_once(db_engine):
+    resolver = UserResolver()
+    resolved, count = resolve(resolver, ["farmer-a", "farmer-b", "farmer-a", None, ""])
+    assert set(resolved) == {"farmer-a", "farmer-b"}
+    assert resolved["farmer-a"] != resolved["farmer-b"]
+    assert count == 2
+    assert resolver.stats["misses"] == 2
+
+
+def test_cached_ids_skip_the_database(db_engine):
+    resolver = UserResolver()
+    first, _ = resolve(resolver, ["farmer-a"])
+    again, count = resolve(resolver, ["farmer-a"])
+    assert again == first
+    assert count == 1
+    assert resolver.stats["hits"] == 1
+
+
+def test_existing_users_are_found_by_another_worker(db_engine):
+    # A second resolver has an empty cache, like another worker process:
+    # the upsert does nothing and the ids come from the follow-up SELECT
+    first, _ = resolve(UserResolver(), ["farmer-a", "farmer-b"])
+    other = UserResolver()
+    resolved, count = resolve(other, ["farmer-b", "farmer-c", "farmer-a"])
+    assert resolved["farmer-a"] == first["farmer-a"]
+    assert resolved["farmer-b"] == first["farmer-b"]
+    assert count == 3
+
+
+def test_forget_and_bounded_cache(db_engine):
+    resolver = UserResolver(max_size=2)
+    resolve(resolver, ["a", "b", "c"])
+    assert resolver.cached("a") is None  # least recently used, evicted
+    assert resolver.cached("c") is not None
+    resolver.forget(["c"])
+    assert resolver.cached("c") is None
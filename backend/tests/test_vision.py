@@ -0,0 +1,60 @@
+from concurrent.futures import Future
+
+import pytest
+from PIL import Image
+
+from app.models import vision, vision_cache
+from app.models.vision import VisionBatcher, predict_batch, run_vision_classifier
+from app.models.vision_cache import VisionResultCache, image_hash
+
+
+class NoResultsModel:
+    def predict(self, source, **kwargs):
+        return []
+
+
+class HungBatcher:
+    def submit(self, image_path):
+        return Future()
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "leaf.jpg"
+    Image.new("RGB", (64, 48), (40, 120, 40)).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = VisionResultCache()
+    monkeypatch.setattr(vision_cache, "get_vision_cache", lambda: cache)
+    return cache
+
+
+def test_missing_detector_results_are_errors_and_never_cached(photo, cache, monkeypatch):
+    monkeypatch.setattr(vision, "VISION_BACKEND", "torch")
+    monkeypatch.setattr(vision, "_get_model", lambda: (NoResultsModel(), None))
+    results = predict_batch([photo, photo])
+    assert len(results) == 2
+    assert all(result.error and result.disease == "unknown" for result in results)
+    key, size = image_hash(photo)
+    cache.put(key, size, results[0])
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_short_batch_results_still_answer_every_request():
+    futures = [Future(), Future()]
+    VisionBatcher._fan_out(futures, [vision._error_result("boom")])
+    assert [future.result(timeout=0).error for future in futures] == ["boom", vision.MISSING_RESULT_ERROR]
+
+
+def test_timed_out_analysis_is_not_cached(photo, cache, monkeypatch):
+    monkeypatch.setattr(vision, "ULTRALYTICS_AVAILABLE", True)
+    monkeypatch.setattr(vision, "VISION_BACKEND", "torch")
+    monkeypatch.setattr(vision, "VISION_BATCHING", True)
+    monkeypatch.setattr(vision, "VISION_RESULT_TIMEOUT", 0.01)
+    monkeypatch.setattr(vision, "get_vision_batcher", lambda: HungBatcher())
+    result = run_vision_classifier(photo)
+    assert "timed out" in result.error
+    assert cache.snapshot()["entries"] == 0
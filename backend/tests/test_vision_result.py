@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from app.models.vision_result import VisionResult, to_json
+
+
+def make_result(top_k=2):
+    # Three detections in a 200x100 image, given out of confidence order
+    return VisionResult.from_detections(
+        xyxy=[[0, 0, 20, 10], [100, 50, 200, 100], [50, 25, 150, 75]],
+        confidences=[0.2, 0.9, 0.5],
+        classes=[1, 2, 3],
+        image_size=(200, 100),
+        top_k=top_k,
+    )
+
+
+def test_keeps_top_k_by_confidence_but_averages_all():
+    result = make_result()
+    assert result.classes.tolist() == [2, 3]
+    assert np.allclose(result.confidences, [0.9, 0.5])
+    assert result.total == 3
+    assert result.confidence == pytest.approx((0.2 + 0.9 + 0.5) / 3, abs=1e-3)
+    assert result.disease == "pest_or_damage_detected"
+
+
+def test_raw_detections_are_in_pixels_of_the_detected_image():
+    detections = make_result().get("raw_detections")
+    assert len(detections) == 2
+    assert detections[0] == {"box": [100.0, 50.0, 200.0, 100.0], "confidence": 0.9, "class": 2}
+    assert detections[1]["box"] == [50.0, 25.0, 150.0, 75.0]
+
+
+def test_pixel_boxes_scale_to_a_resized_image():
+    boxes = make_result().pixel_boxes((400, 200))
+    assert np.allclose(boxes[0], [200, 100, 400, 200], atol=0.5)
+
+
+def test_dict_access_and_json():
+    result = make_result()
+    assert result["disease"] == result.get("disease")
+    assert result.get("detections_total") == 3
+    assert result.get("error", "none") == "none"
+    with pytest.raises(KeyError):
+        result["missing"]
+    data = to_json(result)
+    assert data["detections_total"] == 3  # only present when detections were dropped
+    assert set(result.keys()) == set(data)
+    assert to_json({"disease": "x"}) == {"disease": "x"} and to_json(None) is None
+
+
+def test_failure_has_no_detections():
+    result = VisionResult.failure("model not loaded")
+    assert result.get("raw_detections") == []
+    assert result.confidence == 0.0
+    assert result.to_dict() == {"disease": "error", "confidence": 0.0, "raw_detections": [], "error": "model not loaded"}
+
+
+def test_no_detections():
+    result = VisionResult.from_detections(np.zeros((0, 4)), [], [], image_size=(64, 64))
+    assert result.disease == "no_detection"
+    assert "detections_total" not in result.to_dict()
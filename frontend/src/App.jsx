@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import Recorder from './components/Recorder'
 import CameraCapture from './components/CameraCapture'
 import Chatbot from './components/Chatbot'
@@ -6,20 +6,38 @@ import ConversationHistory from './components/ConversationHistory'
 import './App.css'
 
 const API_BASE = 'http://localhost:8000/api'
+const PAGE_SIZE = 20
 
 export default function App() {
   const [activeTab, setActiveTab] = useState('voice') // voice, image, camera, chat
   const [conversations, setConversations] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(false)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [error, setError] = useState(null)
+  const olderPagesLoaded = useRef(false)
+
+  // One page of history; the API pages by the X-Next-Cursor response header
+  const fetchPage = async (cursor) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) })
+    if (cursor) params.set('cursor', cursor)
+    const response = await fetch(`${API_BASE}/conversations?${params}`)
+    if (!response.ok) throw new Error('Failed to fetch conversations')
+    return { page: await response.json(), cursor: response.headers.get('X-Next-Cursor') }
+  }
 
   const fetchConversations = async () => {
     try {
       setLoading(true)
-      const response = await fetch(`${API_BASE}/conversations`)
-      if (!response.ok) throw new Error('Failed to fetch conversations')
-      const data = await response.json()
-      setConversations(data)
+      const { page, cursor } = await fetchPage(null)
+      if (!olderPagesLoaded.current) {
+        setConversations(page)
+        setNextCursor(cursor)
+      } else {
+        // Older pages are already loaded: refresh the newest page, keep the rest
+        const ids = new Set(page.map(conv => conv.id))
+        setConversations(prev => [...page, ...prev.slice(page.length).filter(conv => !ids.has(conv.id))])
+      }
       setError(null)
     } catch (err) {
       console.error('Error fetching conversations:', err)
@@ -29,6 +47,25 @@ export default function App() {
     }
   }
 
+  const loadMoreConversations = async () => {
+    if (!nextCursor || loadingMore) return
+    try {
+      setLoadingMore(true)
+      const { page, cursor } = await fetchPage(nextCursor)
+      setConversations(prev => {
+        const ids = new Set(prev.map(conv => conv.id))
+        return [...prev, ...page.filter(conv => !ids.has(conv.id))]
+      })
+      setNextCursor(cursor)
+      olderPagesLoaded.current = true
+    } catch (err) {
+      console.error('Error fetching more conversations:', err)
+      setError(err.message)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   useEffect(() => {
     fetchConversations()
     // Refresh conversations every 10 seconds
@@ -136,6 +173,9 @@ export default function App() {
                   conversations={conversations} 
                   loading={loading}
                   onDelete={fetchConversations}
+                  hasMore={Boolean(nextCursor)}
+                  loadingMore={loadingMore}
+                  onLoadMore={loadMoreConversations}
                 />
               </div>
             </section>
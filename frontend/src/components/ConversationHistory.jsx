@@ -2,9 +2,9 @@ import React, { useState } from 'react'
 
 const API_BASE = 'http://localhost:8000/api'
 
-export default function ConversationHistory({ conversations, loading, onDelete }) {
+export default function ConversationHistory({ conversations, loading, onDelete, hasMore, loadingMore, onLoadMore }) {
   const [deletingId, setDeletingId] = useState(null)
-  if (loading) {
+  if (loading && conversations.length === 0) {
     return (
       <div className="loading-state">
         <div className="spinner"></div>
@@ -99,62 +99,57 @@ export default function ConversationHistory({ conversations, loading, onDelete }
             </div>
           )}
 
-          {conv.metadata && (
-            <>
-              {conv.metadata.crop && (
-                <div className="conversation-item">
-                  <div className="item-label">🌾 Crop:</div>
-                  <div className="item-content">
-                    <span className="badge">{conv.metadata.crop}</span>
-                  </div>
-                </div>
-              )}
+          {conv.crop && (
+            <div className="conversation-item">
+              <div className="item-label">🌾 Crop:</div>
+              <div className="item-content">
+                <span className="badge">{conv.crop}</span>
+              </div>
+            </div>
+          )}
 
-              {conv.metadata.language && (
-                <div className="conversation-item">
-                  <div className="item-label">🌐 Language:</div>
-                  <div className="item-content">
-                    <span className="badge">
-                      {conv.metadata.language === 'bn' ? 'Bengali' : 'English'}
-                    </span>
-                  </div>
-                </div>
-              )}
+          {conv.language && (
+            <div className="conversation-item">
+              <div className="item-label">🌐 Language:</div>
+              <div className="item-content">
+                <span className="badge">
+                  {conv.language === 'bn' ? 'Bengali' : 'English'}
+                </span>
+              </div>
+            </div>
+          )}
 
-              {conv.metadata.vision_result && conv.metadata.vision_result.disease && (
-                <div className="conversation-item">
-                  <div className="item-label">🔍 Vision Analysis:</div>
-                  <div className="item-content">
-                    {conv.metadata.vision_result.disease}
-                    {conv.metadata.vision_result.confidence && (
-                      <span className="confidence">
-                        ({(conv.metadata.vision_result.confidence * 100).toFixed(1)}%)
-                      </span>
-                    )}
-                  </div>
-                </div>
-              )}
+          {conv.disease && (
+            <div className="conversation-item">
+              <div className="item-label">🔍 Vision Analysis:</div>
+              <div className="item-content">
+                {conv.disease}
+                {conv.confidence && (
+                  <span className="confidence">
+                    ({(conv.confidence * 100).toFixed(1)}%)
+                  </span>
+                )}
+              </div>
+            </div>
+          )}
 
-              {conv.metadata.weather_forecast && (
-                <div className="conversation-item">
-                  <div className="item-label">🌤️ Weather:</div>
-                  <div className="item-content">
-                    {conv.metadata.weather_forecast.hourly?.temperature_2m?.[0] && (
-                      <span>Temperature: {conv.metadata.weather_forecast.hourly.temperature_2m[0]}°C</span>
-                    )}
-                  </div>
-                </div>
-              )}
+          {/* Only present when requested with ?fields=...,metadata */}
+          {conv.metadata?.weather_forecast?.hourly?.temperature_2m?.[0] && (
+            <div className="conversation-item">
+              <div className="item-label">🌤️ Weather:</div>
+              <div className="item-content">
+                <span>Temperature: {conv.metadata.weather_forecast.hourly.temperature_2m[0]}°C</span>
+              </div>
+            </div>
+          )}
 
-              {conv.metadata.gps && conv.metadata.gps.lat && (
-                <div className="conversation-item">
-                  <div className="item-label">📍 Location:</div>
-                  <div className="item-content">
-                    {conv.metadata.gps.lat.toFixed(4)}, {conv.metadata.gps.lon.toFixed(4)}
-                  </div>
-                </div>
-              )}
-            </>
+          {conv.lat != null && conv.lon != null && (
+            <div className="conversation-item">
+              <div className="item-label">📍 Location:</div>
+              <div className="item-content">
+                {conv.lat.toFixed(4)}, {conv.lon.toFixed(4)}
+              </div>
+            </div>
           )}
 
           {conv.media_url && (
@@ -187,6 +182,11 @@ export default function ConversationHistory({ conversations, loading, onDelete }
           )}
         </div>
       ))}
+      {hasMore && (
+        <button className="load-more-btn" onClick={onLoadMore} disabled={loadingMore}>
+          {loadingMore ? '⏳ Loading...' : 'Load older conversations'}
+        </button>
+      )}
     </div>
   )
 }